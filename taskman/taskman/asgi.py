@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'taskman.settings')
 
 application = get_asgi_application()
+
+# Поток событий задач (Server-Sent Events) обслуживается мимо Django
+# views: ответ держится открытым. Импорт - после настройки Django
+from tmapp.events import with_event_stream  # noqa: E402
+
+application = with_event_stream(application)
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import sys
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,10 +54,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Чтение с реплик (TMAPP_READ_REPLICAS), до сессий и пользователя
+    'tmapp.replicas.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Замеры SQL и шаблонов, по умолчанию выключены (TMAPP_PERF_ENABLED)
+    'tmapp.perf.RequestTimingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -96,6 +102,93 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: запросы GET/HEAD/OPTIONS читают с них (tmapp/replicas.py),
+# запись и команды работают с 'default'. Реплику добавить в DATABASES,
+# например 'replica': {..., 'TEST': {'MIRROR': 'default'}}, и перечислить здесь
+DATABASE_ROUTERS = ['tmapp.replicas.ReplicaRouter']
+TMAPP_READ_REPLICAS = []
+# Сколько секунд после изменения клиент читает из основной базы
+TMAPP_REPLICA_PIN_SECONDS = 5
+# Проверка реплик: интервал и допустимое отставание, секунд
+TMAPP_REPLICA_CHECK_INTERVAL = 10
+TMAPP_REPLICA_MAX_LAG = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Метки версий для ETag (TMAPP_VERSION_CACHE) должны быть общими для всех
+# процессов сервера: при нескольких воркерах нужен файловый кеш,
+# memcached или redis, а не locmem
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+TMAPP_VERSION_CACHE = 'default'
+
+# Кеш списков выбора в формах (tmapp/choices.py): подходит locmem
+# или файловый кеш; списки длиннее лимита заменяются полем поиска
+TMAPP_CHOICES_CACHE = 'default'
+TMAPP_CHOICES_INLINE_LIMIT = 200
+
+# Кеш разметки карточек задач и проектов (tmapp/fragments.py), None -
+# без кеша. Подойдет любой кеш из CACHES: locmem (в пределах процесса),
+# файловый, общий для воркеров, или Redis, например
+# 'fragments': {
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR / 'cache' / 'fragments',
+# },
+# 'fragments': {
+#     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#     'LOCATION': 'redis://127.0.0.1:6379/1',
+# },
+TMAPP_FRAGMENT_CACHE = 'default'
+TMAPP_FRAGMENT_TIMEOUT = 7 * 24 * 3600
+
+# Карточек в колонке канбан-доски (tmapp/kanban.py), остальные задачи
+# статуса открываются ссылкой на список задач
+TMAPP_KANBAN_CARDS = 50
+
+# Поток изменений задач для открытых страниц (tmapp/events.py), работает
+# под ASGI. Брокер InProcessBroker - для одного воркера, для нескольких -
+# tmapp.events.DatabaseBroker (LISTEN/NOTIFY в PostgreSQL, в остальных
+# базах - опрос таблицы раз в TMAPP_EVENTS_POLL_INTERVAL секунд).
+# Клиент, отставший на TMAPP_EVENTS_QUEUE_SIZE событий, перечитывает
+# страницу; для продолжения после переподключения хранятся последние
+# TMAPP_EVENTS_BUFFER событий (в таблице - TMAPP_EVENTS_RETENTION секунд)
+TMAPP_EVENTS_ENABLED = False
+TMAPP_EVENTS_BROKER = 'tmapp.events.InProcessBroker'
+TMAPP_EVENTS_PATH = '/events/'
+TMAPP_EVENTS_QUEUE_SIZE = 100
+TMAPP_EVENTS_BUFFER = 1000
+TMAPP_EVENTS_HEARTBEAT = 15
+TMAPP_EVENTS_POLL_INTERVAL = 1
+TMAPP_EVENTS_RETENTION = 3600
+# DatabaseBroker перечитывает события за столько секунд: в PostgreSQL
+# транзакция с меньшим id события может закоммититься позже
+TMAPP_EVENTS_RESCAN = 10
+
+# Полнотекстовый поиск (tmapp/search.py): словарь PostgreSQL и
+# поиск по прежним версиям задач из истории
+TMAPP_SEARCH_CONFIG = 'russian'
+TMAPP_SEARCH_HISTORY = False
+
+# Замеры запросов (tmapp/perf.py): доля замеряемых запросов; сотрудник
+# может замерить любой запрос заголовком X-Perf: 1 или ?_perf=1
+TMAPP_PERF_ENABLED = False
+TMAPP_PERF_SAMPLE_RATE = 0.01
+
+# Обслуживание истории задач (команда compact_history): окно объединения
+# серии правок, секунд, и срок хранения записей до переноса в архив, дней
+TMAPP_HISTORY_BURST_WINDOW = 300
+TMAPP_HISTORY_RETENTION_DAYS = 365
+
+# Асинхронные версии страниц на чтение (tmapp/async_views.py) - включать
+# при запуске под ASGI (uvicorn taskman.asgi:application)
+TMAPP_ASYNC_VIEWS = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -140,19 +233,52 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "tmapp.pagination.ApiCursorPagination",
     "PAGE_SIZE": 5,
 }
 
 
+# Сколько задач можно создать, изменить или удалить одним запросом
+# массового API (/api/task/bulk/, tmapp/bulk.py)
+TMAPP_BULK_MAX_ITEMS = 5000
+
+# Денормализованные счетчики проектов (модель ProjectStats).
+# После включения заполнить таблицу: manage.py rebuild_project_stats
+TMAPP_PROJECT_STATS = False
+
+
+# Каталог логов. manage.py test пишет их во временный каталог,
+# чтобы прогон тестов не оставлял файлов в дереве исходников
+LOG_DIR = BASE_DIR
+if sys.argv[1:2] == ['test']:
+    LOG_DIR = Path(tempfile.gettempdir()) / 'taskman-test-logs'
+    LOG_DIR.mkdir(exist_ok=True)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
+        # Запись в файл идет в фоновом потоке через очередь (tmapp/log.py).
+        # rotation: 'size' (max_bytes) или 'time' (when),
+        # json_lines: True - одна строка JSON на запись
         'file': {
             'level': 'WARNING',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'warning.log',
+            '()': 'tmapp.log.queue_file_handler',
+            'filename': LOG_DIR / 'warning.log',
+            'rotation': 'size',
+            'max_bytes': 10 * 1024 * 1024,
+            'backup_count': 5,
+            'json_lines': False,
+        },
+        # Замеры запросов из tmapp.perf - JSON lines, по строке на запрос
+        'perf': {
+            'level': 'INFO',
+            '()': 'tmapp.log.queue_file_handler',
+            'filename': LOG_DIR / 'perf.log',
+            'rotation': 'size',
+            'max_bytes': 10 * 1024 * 1024,
+            'backup_count': 5,
+            'json_lines': True,
         },
     },
     'loggers': {
@@ -161,6 +287,11 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': True,
         },
+        'tmapp.perf': {
+            'handlers': ['perf'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -172,3 +303,4 @@ EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
 EMAIL_HOST_USER = 'tessio@list.ru'
 EMAIL_HOST_PASSWORD = 'xxxxxxxxx'
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
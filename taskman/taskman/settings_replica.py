@@ -0,0 +1,28 @@
+"""
+Основная база и реплика на двух локальных SQLite - для проверки
+чтения с реплик (tmapp/replicas.py):
+
+    python manage.py migrate --settings=taskman.settings_replica
+    python manage.py test --settings=taskman.settings_replica
+
+Реплику здесь никто не обновляет: для ручной проверки файл основной
+базы копируется в replica.sqlite3. В тестах реплика - зеркало основной
+тестовой базы.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'primary.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+TMAPP_READ_REPLICAS = ['replica']
@@ -5,13 +5,15 @@ from django.urls import include, path
 from tmapp.views import task_list, task_detail, task_new, task_edit, task_delete
 from tmapp.views import project_new, project_list, project_detail
 from tmapp.views import project_delete, project_edit
-from tmapp.views import sprint_edit, sprint_delete
+from tmapp.views import sprint_edit, sprint_delete, sprint_analytics
 from tmapp.views import status_list, status_new, status_edit, status_delete
-from tmapp.views import signup, sprint_new
+from tmapp.views import signup, sprint_new, choice_search, task_search
+from tmapp.views import task_export, kanban_board, task_move
 from tmapp.forms import LoginForm
 from django.conf import settings
 from tmapp.views import TaskDRFViewSet, ProjectDRFViewSet
 from tmapp.views import SprintDRFViewSet, StatusDRFViewSet
+from tmapp import async_views
 
 
 
@@ -22,6 +24,14 @@ router.register(prefix="project",viewset=ProjectDRFViewSet,)
 router.register(prefix="sprint",viewset=SprintDRFViewSet,)
 router.register(prefix="status",viewset=StatusDRFViewSet,)
 
+# Под ASGI страницы на чтение обслуживают асинхронные вьюхи
+if getattr(settings, 'TMAPP_ASYNC_VIEWS', False):
+    task_list = async_views.task_list
+    task_detail = async_views.task_detail
+    project_list = async_views.project_list
+    project_detail = async_views.project_detail
+    status_list = async_views.status_list
+
 
 urlpatterns = [
     path('', task_list, name = 'tasklist'),
@@ -29,6 +39,10 @@ urlpatterns = [
     path('task/del/<int:id>/', task_delete, name = 'taskdelete'),    
     path('task/edit/<int:id>/', task_edit, name = 'taskedit'),    
     path('task/', task_new, name='tasknew'),
+    path('search/', task_search, name='tasksearch'),
+    path('export/<str:kind>.<str:fmt>', task_export, name='export'),
+    path('board/', kanban_board, name='kanban'),
+    path('board/move/<int:id>/', task_move, name='taskmove'),
 
     path('project/list/', project_list, name = 'projectlist'),    
     path('project/', project_new, name='projectnew'),
@@ -38,13 +52,16 @@ urlpatterns = [
 
     path('sprint/', sprint_new, name='sprintnew'),
     path('sprint/edit/<int:id>/', sprint_edit, name = 'sprintedit'),    
-    path('sprint/del/<int:id>/', sprint_delete, name = 'sprintdelete'),       
+    path('sprint/del/<int:id>/', sprint_delete, name = 'sprintdelete'),
+    path('sprint/<int:id>/analytics/', sprint_analytics, name='sprintanalytics'),       
     
     path('status/list/', status_list, name='statuslist'),            
     path('status/', status_new, name='statusnew'),
     path('status/edit/<int:id>/', status_edit, name='statusedit'),    
     path('status/delete/<int:id>/', status_delete, name='statusdelete'),        
 
+    path('choices/<str:source>/', choice_search, name='choicesearch'),
+
     path('signup/', signup, name = 'signup'),
     path('login/', auth_views.LoginView.as_view(
                 template_name='login.html',
@@ -59,6 +76,9 @@ urlpatterns = [
     
     path('admin/', admin.site.urls),
 
+    path('api/async/<str:resource>/', async_views.api_list, name='asyncapilist'),
+    path('api/async/<str:resource>/<int:pk>/', async_views.api_detail,
+         name='asyncapidetail'),
     path('api/', include(router.urls)),
     path('api-auth/', include('rest_framework.urls'))
 ]
@@ -1,8 +1,14 @@
+import datetime
+
 from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
 from simple_history.admin import SimpleHistoryAdmin
 
-from .models import Project, Sprint, Status, Task
+from .models import (Notification, Project, ProjectStats, RequestSample,
+                     Sprint, Status, Task, TaskHistoryArchive)
 
 
 class TaskHistoryAdmin(SimpleHistoryAdmin):
@@ -18,26 +24,68 @@ class TaskHistoryAdmin(SimpleHistoryAdmin):
     history_list_display = ["changed_fields", "list_changes"]
 
     def changed_fields(self, obj):
-        if obj.prev_record:
-            delta = obj.diff_against(obj.prev_record)
-            return delta.changed_fields
-        return None
+        return [change.field for change in obj.get_changes()] or None
 
     def list_changes(self, obj):
         fields = ""
-        if obj.prev_record:
-            delta = obj.diff_against(obj.prev_record)
-
-            for change in delta.changes:
-                fields += str(
-                    """<strong>{}</strong> changed from """
-                    """<span style='background-color:#ffb5ad'>{}</span> to """
-                    """ <span style='background-color:#b3f7ab'>{}</span>"""
-                    """ . <br/>""".format(change.field, change.old, change.new)
-                )
-            return format_html(fields)
-        return None
+        for change in obj.get_changes():
+            fields += str(
+                """<strong>{}</strong> changed from """
+                """<span style='background-color:#ffb5ad'>{}</span> to """
+                """ <span style='background-color:#b3f7ab'>{}</span>"""
+                """ . <br/>""".format(change.field, change.old, change.new)
+            )
+        return format_html(fields) if fields else None
 
 
 admin.site.register(Task, TaskHistoryAdmin)
-admin.site.register([Project, Sprint, Status])
+admin.site.register([Project, Sprint, Status, ProjectStats])
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ["id", "recipient", "subject", "state", "attempts", "timestamp_sent"]
+    list_filter = ["state"]
+
+
+@admin.register(TaskHistoryArchive)
+class TaskHistoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ["task_id", "date_from", "date_to", "revisions", "timestamp_create"]
+    search_fields = ["task_id"]
+    exclude = ["data"]
+
+
+@admin.register(RequestSample)
+class RequestSampleAdmin(admin.ModelAdmin):
+    list_display = [
+        "timestamp", "method", "route", "status_code", "total_ms",
+        "sql_ms", "template_ms", "queries", "duplicate_queries",
+    ]
+    list_filter = ["method", "status_code"]
+    search_fields = ["route"]
+    change_list_template = "admin/tmapp/requestsample/change_list.html"
+
+    def get_urls(self):
+        return [
+            path(
+                "report/",
+                self.admin_site.admin_view(self.report_view),
+                name="tmapp_requestsample_report",
+            ),
+        ] + super().get_urls()
+
+    def report_view(self, request):
+        """Самые медленные адреса за последние ?days= дней (по умолчанию 7)"""
+        days = request.GET.get("days", "7")
+        days = int(days) if days.isdigit() else 7
+        since = timezone.now() - datetime.timedelta(days=days)
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Самые медленные адреса",
+            "days": days,
+            "endpoints": RequestSample.slowest_endpoints(since=since),
+        }
+        return TemplateResponse(
+            request, "admin/tmapp/requestsample/report.html", context
+        )
@@ -0,0 +1,179 @@
+"""
+Аналитика спринтов: burndown, скорость и перенос задач.
+
+Состояние задачи на любой момент берется из истории (HistoricalTask):
+каждая запись истории действует с history_date до следующей записи той же
+задачи (оконная функция LEAD), поэтому количество открытых задач спринта
+на концы всех нужных дней считается одним SQL-запросом, без перебора
+истории в Python. Итоги прошедших дней сохраняются в SprintDailyStat
+и больше не пересчитываются, заново считается только текущий день.
+"""
+
+import datetime
+
+from django.db import connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Sprint, SprintDailyStat
+
+OPEN_TASKS_SQL = """
+WITH points (idx, sprint_id, moment) AS (VALUES {points}),
+states AS (
+    SELECT
+        h.id,
+        h.sprint_id,
+        h.is_complete,
+        h.history_type,
+        h.history_date AS valid_from,
+        LEAD(h.history_date) OVER (
+            PARTITION BY h.id ORDER BY h.history_date, h.history_id
+        ) AS valid_to
+    FROM tmapp_historicaltask h
+    WHERE h.id IN (
+        SELECT id FROM tmapp_historicaltask
+        WHERE sprint_id IN (SELECT sprint_id FROM points)
+    )
+)
+SELECT
+    p.idx,
+    COUNT(s.id),
+    COUNT(CASE WHEN NOT s.is_complete THEN 1 END)
+FROM points p
+LEFT JOIN states s
+    ON s.sprint_id = p.sprint_id
+    AND s.valid_from < p.moment
+    AND (s.valid_to IS NULL OR s.valid_to >= p.moment)
+    AND s.history_type <> '-'
+GROUP BY p.idx
+ORDER BY p.idx
+"""
+
+
+def end_of_day(day):
+    """Начало следующего дня в текущем часовом поясе"""
+    return timezone.make_aware(
+        datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time())
+    )
+
+
+def count_tasks_at(points):
+    """
+    Задачи спринтов на заданные моменты.
+    points - список (id спринта, момент), результат в том же порядке -
+    пары (всего задач в спринте, из них незавершенных)
+    """
+    if not points:
+        return []
+
+    # В PostgreSQL тип параметра в VALUES надо указать явно
+    moment = "%s::timestamptz" if connection.vendor == "postgresql" else "%s"
+    sql = OPEN_TASKS_SQL.format(
+        points=", ".join([f"(%s, %s, {moment})"] * len(points))
+    )
+    params = []
+    for idx, (sprint_id, point) in enumerate(points):
+        params += [idx, sprint_id, connection.ops.adapt_datetimefield_value(point)]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        counts = {idx: (total, open_) for idx, total, open_ in cursor.fetchall()}
+    return [counts.get(idx, (0, 0)) for idx in range(len(points))]
+
+
+def sprint_days(sprint, today=None):
+    """Дни спринта, которые уже начались"""
+    today = today or timezone.localdate()
+    day, last = sprint.date_start, min(sprint.date_end, today)
+    days = []
+    while day <= last:
+        days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def ensure_daily_stats(points, today=None):
+    """
+    Итоги на конец дня для пар (спринт, день): сохраненные читаем,
+    недостающие прошедшие дни считаем одним запросом и сохраняем.
+    Возвращает {(id спринта, день): (всего, незавершенных)}
+    """
+    today = today or timezone.localdate()
+    stats = {
+        (stat.sprint_id, stat.day): (stat.total_tasks, stat.open_tasks)
+        for stat in SprintDailyStat.objects.filter(
+            sprint__in={sprint_id for sprint_id, _ in points},
+            day__in={day for _, day in points},
+        )
+    }
+
+    missing = [point for point in points if point not in stats]
+    counts = count_tasks_at([(sprint_id, end_of_day(day)) for sprint_id, day in missing])
+    SprintDailyStat.objects.bulk_create(
+        [
+            SprintDailyStat(
+                sprint_id=sprint_id, day=day, total_tasks=total, open_tasks=open_
+            )
+            for (sprint_id, day), (total, open_) in zip(missing, counts)
+            if day < today
+        ],
+        ignore_conflicts=True,
+    )
+    stats.update(zip(missing, counts))
+    return stats
+
+
+def burndown(sprint, today=None):
+    """Незавершенные задачи спринта на конец каждого дня"""
+    days = sprint_days(sprint, today)
+    stats = ensure_daily_stats([(sprint.pk, day) for day in days], today)
+    return [
+        {
+            "day": day,
+            "total": stats[(sprint.pk, day)][0],
+            "open": stats[(sprint.pk, day)][1],
+        }
+        for day in days
+    ]
+
+
+def velocity(project_id, today=None):
+    """
+    По спринтам проекта: сколько задач закрыто за время спринта
+    и сколько осталось открытыми на его конец (перенос)
+    """
+    today = today or timezone.localdate()
+    sprints = list(
+        Sprint.objects.filter(project_id=project_id)
+        .annotate(
+            completed=Count(
+                "tasks",
+                filter=Q(
+                    tasks__is_complete=True,
+                    tasks__timestamp_done__date__gte=F("date_start"),
+                    tasks__timestamp_done__date__lte=F("date_end"),
+                ),
+            )
+        )
+        .order_by("date_start", "id")
+    )
+
+    finished = [sprint for sprint in sprints if sprint.date_end < today]
+    stats = ensure_daily_stats(
+        [(sprint.pk, sprint.date_end) for sprint in finished], today
+    )
+
+    result = []
+    for sprint in sprints:
+        carried_over = None
+        if sprint.date_end < today:
+            carried_over = stats[(sprint.pk, sprint.date_end)][1]
+        result.append({
+            "sprint": sprint.pk,
+            "name": sprint.name,
+            "date_start": sprint.date_start,
+            "date_end": sprint.date_end,
+            "completed": sprint.completed,
+            "carried_over": carried_over,
+        })
+    return result
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TmappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tmapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
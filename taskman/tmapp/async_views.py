@@ -0,0 +1,266 @@
+"""
+Асинхронные версии страниц и API на чтение - для запуска под ASGI.
+
+Под ASGI синхронная вьюха занимает поток на все время запроса, а
+асинхронная отдает его, пока ждет базу и кеш: так один воркер держит
+много клиентов, которые часто опрашивают список задач (обычно с
+ответом 304). Данные читаются асинхронным ORM, шаблон рендерится через
+sync_to_async (в шаблонах остались ленивые связи, например
+sprint.tasks.count). Изменяющие запросы передаются синхронным вьюхам.
+
+Страницы подключаются вместо синхронных настройкой TMAPP_ASYNC_VIEWS,
+API на чтение всегда доступно по /api/async/<ресурс>/.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import fragments, views
+from .filters import filter_tasks
+from .models import Project, Sprint, Status, Task
+from .pagination import ApiCursorPagination, akeyset_paginate_tasks
+from .versions import conditional
+
+# Ресурсы API на чтение: те же queryset, фильтры и сериализаторы,
+# что у синхронных viewset
+API_VIEWSETS = {
+    "task": views.TaskDRFViewSet,
+    "project": views.ProjectDRFViewSet,
+    "sprint": views.SprintDRFViewSet,
+    "status": views.StatusDRFViewSet,
+}
+
+
+def is_authenticated(request):
+    # request.user - ленивый объект, первое обращение идет в сессию и базу
+    return request.user.is_authenticated
+
+
+def async_login_required(view):
+    """login_required для асинхронной вьюхи"""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(is_authenticated)(request):
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def read_only(sync_view):
+    """Запросы, кроме GET и HEAD, обрабатывает синхронная вьюха"""
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    obj = await queryset.filter(**kwargs).afirst()
+    if obj is None:
+        raise Http404
+    return obj
+
+
+async def arender(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+# Задачи
+@async_login_required
+@conditional(lambda request: [Task, Status, get_user_model()])
+async def task_list(request):
+
+    tasks = filter_tasks(
+        Task.objects.select_related('status', 'executor'), request.GET
+    )
+
+    page = await akeyset_paginate_tasks(tasks, request.GET.get('after'))
+
+    return await arender(
+        request, 'tasklist.html', views.task_list_context(request, page)
+    )
+
+
+@read_only(views.task_detail)
+@async_login_required
+@conditional(lambda request, id: [
+    (Task, id), Status, Project, Sprint, get_user_model()
+])
+async def task_detail(request, id):
+
+    task = await aget_object_or_404(
+        Task.objects.select_related('status', 'executor', 'project', 'sprint'),
+        id=id,
+    )
+    history = [row async for row in views.task_history_queryset(id)]
+    transitions = await sync_to_async(views.task_transitions)(task)
+
+    return await arender(request, 'taskdetail.html', {
+        'task': task,
+        'tasks_history': views.task_detail_history(history),
+        **transitions,
+    })
+
+
+# Проекты
+@async_login_required
+@conditional(
+    lambda request: [Project, Sprint, Task],
+    lambda request: [timezone.localdate()],
+)
+async def project_list(request):
+
+    projects = [project async for project in Project.objects.with_counts()]
+
+    return await arender(request, 'projectlist.html', {
+        'projects': projects,
+        'cards': fragments.prefetch('project_card', projects),
+        'sprints': [sprint async for sprint in views.active_sprints()],
+    })
+
+
+@async_login_required
+@conditional(
+    lambda request, id: [(Project, id), Sprint, Task, get_user_model()],
+    lambda request, id: [timezone.localdate()],
+)
+async def project_detail(request, id):
+
+    project = await aget_object_or_404(Project.objects.all(), id=id)
+
+    sprints = [sprint async for sprint in Sprint.objects.filter(project=id)]
+
+    tasks = [
+        task async for task in
+        Task.objects.filter(project=id).order_by('is_complete', '-id')
+    ]
+
+    return await arender(request, 'projectdetail.html', {
+        'project': project,
+        'tasks': tasks,
+        'sprints': sprints,
+    })
+
+
+# Статусы
+@async_login_required
+@conditional(lambda request: [Status])
+async def status_list(request):
+
+    statuses = [
+        status async for status in
+        Status.objects.select_related('parent_status').order_by('path')
+    ]
+
+    return await arender(request, 'statuslist.html', {
+        'statuses': statuses,
+    })
+
+
+# API на чтение
+def get_api_view(request, resource, action):
+    """
+    Экземпляр синхронного viewset: от него берутся queryset с фильтрами
+    и сериализатор, сам он запросов к базе не делает
+    """
+    viewset = API_VIEWSETS.get(resource)
+    if viewset is None:
+        raise Http404
+    return viewset(
+        request=Request(request), format_kwarg=None, action=action, kwargs={}
+    )
+
+
+def api_error(detail, status):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def api_login_required(view):
+    """Как IsAuthenticated в DRF: без входа - 403"""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await sync_to_async(is_authenticated)(request):
+            return api_error('Учетные данные не были предоставлены.', 403)
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def get_page_size(request):
+    page_size = request.GET.get('page_size')
+    if page_size and page_size.isdigit() and int(page_size) > 0:
+        return min(int(page_size), ApiCursorPagination.max_page_size)
+    return api_settings.PAGE_SIZE
+
+
+@api_login_required
+@conditional(lambda request, resource: [
+    API_VIEWSETS[resource].queryset.model,
+    *API_VIEWSETS[resource].list_version_keys,
+] if resource in API_VIEWSETS else [])
+async def api_list(request, resource):
+    """
+    Список в порядке id, страницы - по ?after=<последний id> и ?page_size=.
+    Фильтры задач и ?fields= - как в /api/task/, ?ordering= не поддерживается.
+    """
+    if request.method != 'GET':
+        return api_error(f'Метод "{request.method}" не разрешен.', 405)
+
+    view = get_api_view(request, resource, 'list')
+    queryset = view.filter_queryset(view.get_queryset()).order_by('id')
+    after = request.GET.get('after', '')
+    if after.isdigit():
+        queryset = queryset.filter(id__gt=int(after))
+
+    page_size = get_page_size(request)
+    objects = [obj async for obj in queryset[:page_size + 1]]
+
+    next_url = None
+    if len(objects) > page_size:
+        objects = objects[:page_size]
+        query = request.GET.copy()
+        query['after'] = objects[-1].id
+        next_url = request.build_absolute_uri(
+            f'{request.path}?{query.urlencode()}'
+        )
+
+    return JsonResponse({
+        'next': next_url,
+        'results': view.get_serializer(objects, many=True).data,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@api_login_required
+@conditional(lambda request, resource, pk: [
+    (API_VIEWSETS[resource].queryset.model, pk)
+] if resource in API_VIEWSETS else [])
+async def api_detail(request, resource, pk):
+    if request.method != 'GET':
+        return api_error(f'Метод "{request.method}" не разрешен.', 405)
+
+    view = get_api_view(request, resource, 'retrieve')
+    obj = await view.get_queryset().filter(pk=pk).afirst()
+    if obj is None:
+        return api_error('Не найдено.', 404)
+
+    return JsonResponse(
+        view.get_serializer(obj).data, json_dumps_params={'ensure_ascii': False}
+    )
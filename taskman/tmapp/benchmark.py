@@ -0,0 +1,393 @@
+"""
+Замеры производительности основных страниц и API.
+
+Набор данных нужного размера строится массовыми операциями, затем
+каждая страница запрашивается через тестовый клиент: время ответа
+(перцентили), количество SQL-запросов и пиковая память на запрос.
+Результат можно сохранить как базовый (JSON) и сравнивать с ним
+следующие замеры. Запускается командой benchmark.
+
+Нагрузочное сравнение ASGI и WSGI (команда compare_asgi_wsgi): много
+одновременных запросов к обработчику Django напрямую, без сети - WSGI
+из пула потоков (как gunicorn с потоками), ASGI из одного цикла asyncio
+(как uvicorn). Синхронные вьюхи сравниваются с асинхронными
+(tmapp/async_views.py).
+"""
+
+import asyncio
+import datetime
+import json
+import math
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import search
+from .models import Project, ProjectStats, Sprint, Status, Task
+
+# Размеры наборов данных: количество задач, глубина дерева статусов
+# и длина истории у "долгоживущих" задач
+SCALES = {
+    "1k": {"tasks": 1000, "status_depth": 5, "history_length": 50},
+    "10k": {"tasks": 10000, "status_depth": 10, "history_length": 200},
+    "100k": {"tasks": 100000, "status_depth": 20, "history_length": 500},
+}
+
+# Страницы и запросы API: имя -> функция, строящая url по набору данных
+SCENARIOS = {
+    "task_list": lambda data: "/",
+    "task_list_filtered": lambda data: f"/?executor={data['executor_id']}",
+    "task_detail": lambda data: f"/task/{data['long_history_task_id']}/",
+    "project_list": lambda data: "/project/list/",
+    "status_list": lambda data: "/status/list/",
+    "api_task_list": lambda data: "/api/task/",
+    "api_task_filtered": lambda data: (
+        f"/api/task/?executor={data['executor_id']}&is_complete=0"
+    ),
+}
+
+BATCH_SIZE = 2000
+
+
+def parse_scale(value):
+    """Имя из SCALES или просто количество задач"""
+    if value in SCALES:
+        return dict(SCALES[value])
+    return {"tasks": int(value), "status_depth": 3, "history_length": 10}
+
+
+def build_dataset(tasks, status_depth, history_length):
+    """
+    Пользователи, проекты со спринтами, дерево статусов, задачи и история.
+    Возвращает id объектов, которые нужны сценариям.
+    """
+    User = get_user_model()
+    HistoricalTask = Task.history.model
+    now = timezone.now()
+
+    with transaction.atomic():
+        users = User.objects.bulk_create(
+            User(username=f"bench{i}", email=f"bench{i}@example.com")
+            for i in range(max(5, tasks // 200))
+        )
+        projects = Project.objects.bulk_create(
+            Project(name=f"Проект {i}", content="Описание")
+            for i in range(max(3, tasks // 500))
+        )
+        sprints = Sprint.objects.bulk_create(
+            Sprint(
+                name=f"Спринт {i}",
+                project=project,
+                date_start=now.date() - datetime.timedelta(days=14 * (i + 1)),
+                date_end=now.date() - datetime.timedelta(days=14 * i),
+            )
+            for project in projects
+            for i in range(4)
+        )
+
+        # Несколько цепочек вложенных статусов заданной глубины
+        statuses = []
+        for root in range(5):
+            parent = None
+            for level in range(status_depth):
+                parent = Status(name=f"Статус {root}.{level}", parent_status=parent)
+                parent.save()
+                statuses.append(parent)
+
+        long_lived = []
+        for start in range(0, tasks, BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + BATCH_SIZE, tasks)):
+                sprint = sprints[i % len(sprints)]
+                batch.append(Task(
+                    name=f"Задача {i}",
+                    content=f"Описание задачи {i}",
+                    is_complete=i % 3 == 0,
+                    timestamp_done=now if i % 3 == 0 else None,
+                    status=statuses[i % len(statuses)],
+                    executor=users[i % len(users)],
+                    project_id=sprint.project_id,
+                    sprint=sprint,
+                ))
+            created = Task.objects.bulk_create(batch)
+            # У каждой сотой задачи будет длинная история переименований
+            long_lived.extend(created[::100])
+            HistoricalTask.objects.bulk_create(
+                HistoricalTask(
+                    history_date=now,
+                    history_type="+",
+                    changes=[],
+                    **{
+                        field.attname: getattr(task, field.attname)
+                        for field in HistoricalTask.tracked_fields
+                    },
+                )
+                for task in created
+            )
+
+        rows = []
+        for task in long_lived:
+            for revision in range(history_length):
+                rows.append(HistoricalTask(
+                    history_date=now + datetime.timedelta(seconds=revision + 1),
+                    history_type="~",
+                    changes=[["name", f"{task.name} ({revision})", task.name]],
+                    **{
+                        field.attname: getattr(task, field.attname)
+                        for field in HistoricalTask.tracked_fields
+                    },
+                ))
+            if len(rows) >= BATCH_SIZE:
+                HistoricalTask.objects.bulk_create(rows)
+                rows = []
+        HistoricalTask.objects.bulk_create(rows)
+
+        if ProjectStats.is_enabled():
+            ProjectStats.rebuild()
+        search.index_tasks()
+
+    return {
+        "executor_id": users[0].pk,
+        "long_history_task_id": long_lived[0].pk,
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = max(0, math.ceil(fraction * len(values)) - 1)
+    return values[index]
+
+
+def measure(client, url, repeat):
+    """Время ответа по repeat запросам, затем один запрос с подсчетом SQL и памяти"""
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"{url}: код ответа {response.status_code}")
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(timings, 0.5), 2),
+        "p90_ms": round(percentile(timings, 0.9), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "mean_ms": round(sum(timings) / len(timings), 2),
+        "queries": len(queries),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_scenarios(data, repeat=20, scenarios=None):
+    """Замеры всех сценариев на уже построенном наборе данных"""
+    user = get_user_model().objects.get(pk=data["executor_id"])
+    client = Client()
+    client.force_login(user)
+    return {
+        name: measure(client, SCENARIOS[name](data), repeat)
+        for name in scenarios or SCENARIOS
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Список регрессий: сценарий стал медленнее базового больше чем на
+    threshold (доля, по p90) или делает больше SQL-запросов
+    """
+    regressions = []
+    for scale, scenarios in results.items():
+        for name, result in scenarios.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None:
+                continue
+            if result["p90_ms"] > base["p90_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{scale} {name}: p90 {result['p90_ms']} мс, "
+                    f"было {base['p90_ms']} мс"
+                )
+            if result["queries"] > base["queries"]:
+                regressions.append(
+                    f"{scale} {name}: {result['queries']} запросов, "
+                    f"было {base['queries']}"
+                )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+# Сценарии нагрузки: имя -> функция, строящая пару url
+# (синхронная вьюха, асинхронная вьюха) по набору данных
+LOAD_SCENARIOS = {
+    "api_task_list": lambda data: ("/api/task/", "/api/async/task/"),
+    "api_task_filtered": lambda data: (
+        f"/api/task/?executor={data['executor_id']}&is_complete=0",
+        f"/api/async/task/?executor={data['executor_id']}&is_complete=0",
+    ),
+    "api_task_detail": lambda data: (
+        f"/api/task/{data['long_history_task_id']}/",
+        f"/api/async/task/{data['long_history_task_id']}/",
+    ),
+}
+
+
+def session_cookie(user_id):
+    """Cookie сессии вошедшего пользователя для запросов в обход клиента"""
+    client = Client()
+    client.force_login(get_user_model().objects.get(pk=user_id))
+    name = settings.SESSION_COOKIE_NAME
+    return f"{name}={client.cookies[name].value}"
+
+
+def load_summary(results, seconds):
+    """results - пары (время ответа, код ответа)"""
+    timings = [duration for duration, _ in results]
+    return {
+        "requests": len(results),
+        "rps": round(len(results) / seconds, 1),
+        "p50_ms": round(percentile(timings, 0.5), 2),
+        "p90_ms": round(percentile(timings, 0.9), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "errors": sum(1 for _, status in results if status >= 400),
+    }
+
+
+def wsgi_load(url, headers, concurrency, total):
+    """total запросов из concurrency потоков к WSGI-обработчику"""
+    handler = WSGIHandler()
+    path, _, query = url.partition("?")
+
+    def request(_):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SCRIPT_NAME": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.input": BytesIO(),
+            "wsgi.errors": BytesIO(),
+            "wsgi.url_scheme": "http",
+            "wsgi.version": (1, 0),
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+        statuses = []
+        start = time.perf_counter()
+        response = handler(
+            environ, lambda status, headers, exc_info=None: statuses.append(status)
+        )
+        for _ in response:
+            pass
+        response.close()
+        return (time.perf_counter() - start) * 1000, int(statuses[0].split()[0])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(request, range(total)))
+    return load_summary(results, time.perf_counter() - start)
+
+
+async def asgi_load(url, headers, concurrency, total):
+    """total запросов, не больше concurrency одновременно, к ASGI-обработчику"""
+    application = ASGIHandler()
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver")] + [
+            (name.lower().encode(), value.encode()) for name, value in headers.items()
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def request():
+        async with semaphore:
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            start = time.perf_counter()
+            await application(dict(scope), receive, send)
+            return (time.perf_counter() - start) * 1000, messages[0]["status"]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(request() for _ in range(total)))
+    return load_summary(results, time.perf_counter() - start)
+
+
+def run_load(data, concurrency=50, total=500, scenarios=None, conditional=False):
+    """
+    Каждый сценарий: синхронная вьюха под WSGI и под ASGI,
+    асинхронная - под ASGI. conditional - запросы с If-None-Match,
+    как у клиента, который опрашивает неизменившиеся данные
+    """
+    headers = {"Cookie": session_cookie(data["executor_id"])}
+    client = Client(HTTP_COOKIE=headers["Cookie"])
+
+    results = {}
+    for name in scenarios or LOAD_SCENARIOS:
+        sync_url, async_url = LOAD_SCENARIOS[name](data)
+        runs = {}
+        for label, server, url in (
+            ("wsgi_sync", "wsgi", sync_url),
+            ("asgi_sync", "asgi", sync_url),
+            ("asgi_async", "asgi", async_url),
+        ):
+            request_headers = dict(headers)
+            if conditional:
+                request_headers["If-None-Match"] = client.get(url)["ETag"]
+            if server == "wsgi":
+                runs[label] = wsgi_load(url, request_headers, concurrency, total)
+            else:
+                runs[label] = asyncio.run(
+                    asgi_load(url, request_headers, concurrency, total)
+                )
+        results[name] = runs
+    return results
@@ -0,0 +1,215 @@
+"""
+Массовые операции с задачами.
+
+Пишут одним bulk_create/bulk_update в одной транзакции и сами создают
+записи истории (тоже одним запросом), поэтому Task.save и сигналы
+simple_history здесь не вызываются.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+from . import events, search, versions
+from .models import Notification, ProjectStats, Task, get_task_changes
+from .serializers import TaskSerializer
+
+# Внешние ключи задачи, которые можно загрузить заранее одним запросом
+TASK_RELATED_FIELDS = ("status", "executor", "project", "sprint")
+
+
+def get_max_items():
+    return getattr(settings, "TMAPP_BULK_MAX_ITEMS", 5000)
+
+
+def build_task_history(tasks, history_type, user=None, history_date=None):
+    """Несохраненные записи истории для пачки задач"""
+    HistoricalTask = Task.history.model
+    history_date = history_date or timezone.now()
+    rows = []
+    for task in tasks:
+        changes = []
+        if history_type == "~":
+            changes = get_task_changes(
+                task.get_history_values(previous=True), task.get_history_values()
+            )
+        rows.append(
+            HistoricalTask(
+                history_date=history_date,
+                history_type=history_type,
+                history_user=user,
+                changes=changes,
+                **{
+                    field.attname: getattr(task, field.attname)
+                    for field in HistoricalTask.tracked_fields
+                },
+            )
+        )
+    return rows
+
+
+def bulk_task_history(tasks, history_type, user=None, history_date=None):
+    """Записи истории для пачки задач одним запросом"""
+    return Task.history.model.objects.bulk_create(
+        build_task_history(tasks, history_type, user, history_date),
+        batch_size=1000,
+    )
+
+
+def rebuild_project_stats(project_ids):
+    project_ids = {project_id for project_id in project_ids if project_id}
+    if project_ids and ProjectStats.is_enabled():
+        ProjectStats.rebuild(project_ids)
+
+
+def item_error(index, field, message):
+    return {"index": index, "errors": {field: [message]}}
+
+
+def preload_related(items):
+    """Все упомянутые в пачке связанные объекты - один запрос на модель"""
+    preloaded = {}
+    for name in TASK_RELATED_FIELDS:
+        model = Task._meta.get_field(name).related_model
+        ids = set()
+        for item in items:
+            value = item.get(name) if isinstance(item, dict) else None
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                ids.add(int(value))
+        preloaded[model] = model.objects.in_bulk(ids)
+    return preloaded
+
+
+def validate_items(items, instances=None, partial=False):
+    """
+    Проверяем все элементы пачки.
+    Возвращает список (индекс, объект, validated_data) для корректных
+    и список ошибок вида {"index": ..., "errors": ...}.
+    """
+    context = {"preloaded": preload_related(items)}
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(item_error(index, "non_field_errors", "Ожидался объект."))
+            continue
+
+        instance = None
+        if instances is not None:
+            instance = instances.get(item.get("id"))
+            if instance is None:
+                errors.append(item_error(index, "id", "Задача не найдена."))
+                continue
+
+        serializer = TaskSerializer(
+            instance, data=item, partial=partial, context=context
+        )
+        if serializer.is_valid():
+            valid.append((index, instance, serializer.validated_data))
+        else:
+            errors.append({"index": index, "errors": serializer.errors})
+    return valid, errors
+
+
+def bulk_create_tasks(items, user=None, atomic=False):
+    """Создание пачки задач, возвращает (созданные задачи, ошибки)"""
+    valid, errors = validate_items(items)
+    if errors and atomic:
+        return [], errors
+
+    tasks = []
+    for _, _, validated_data in valid:
+        task = Task(**validated_data)
+        task.update_timestamp_done()
+        tasks.append(task)
+
+    with transaction.atomic():
+        Task.objects.bulk_create(tasks, batch_size=1000)
+        bulk_task_history(tasks, "+", user)
+        rebuild_project_stats(task.project_id for task in tasks)
+        search.index_tasks([task.pk for task in tasks], created=True)
+        events.publish_tasks("task.created", tasks)
+    versions.bump(Task, [task.pk for task in tasks])
+    return tasks, errors
+
+
+def bulk_update_tasks(items, user=None, atomic=False):
+    """
+    Частичное изменение пачки задач, каждый элемент содержит id.
+    Возвращает (измененные задачи, ошибки).
+    """
+    ids = {item.get("id") for item in items if isinstance(item, dict)}
+    instances = Task.objects.in_bulk(
+        [task_id for task_id in ids if isinstance(task_id, int)]
+    )
+    valid, errors = validate_items(items, instances=instances, partial=True)
+    if errors and atomic:
+        return [], errors
+
+    tasks, fields = [], set()
+    for _, task, validated_data in valid:
+        for name, value in validated_data.items():
+            setattr(task, name, value)
+        task.update_timestamp_done()
+        if task.changed_fields:
+            tasks.append(task)
+            fields.update(task.changed_fields)
+
+    if not tasks:
+        return [], errors
+
+    status_changed = [
+        task for task in tasks if task.previous("status") != task.status_id
+    ]
+    project_ids = {task.previous("project") for task in tasks}
+    project_ids.update(task.project_id for task in tasks)
+
+    with transaction.atomic():
+        Task.objects.bulk_update(tasks, sorted(fields), batch_size=1000)
+        bulk_task_history(tasks, "~", user)
+        rebuild_project_stats(project_ids)
+        if search.history_enabled() or fields & {"name", "content"}:
+            search.index_tasks([task.pk for task in tasks])
+        Notification.enqueue_status_changes(status_changed)
+        events.publish([events.task_change(task) for task in tasks])
+    versions.bump(Task, [task.pk for task in tasks])
+
+    for task in tasks:
+        task._snapshot_fields()
+    return tasks, errors
+
+
+def bulk_delete_tasks(ids, user=None, atomic=False):
+    """Удаление пачки задач по id, возвращает (id удаленных, ошибки)"""
+    errors = []
+    valid_ids = []
+    for index, task_id in enumerate(ids):
+        if isinstance(task_id, int):
+            valid_ids.append(task_id)
+        else:
+            errors.append(item_error(index, "id", "Ожидался id задачи."))
+
+    tasks = list(Task.objects.filter(id__in=valid_ids))
+    found = {task.id for task in tasks}
+    for index, task_id in enumerate(ids):
+        if isinstance(task_id, int) and task_id not in found:
+            errors.append(item_error(index, "id", "Задача не найдена."))
+    if errors and atomic:
+        return [], errors
+
+    with transaction.atomic():
+        bulk_task_history(tasks, "-", user)
+        # Связанные объекты удаляет Collector Django по on_delete моделей,
+        # а построчные обработчики post_delete (история, индекс, события,
+        # метки версий) пропускают задачи с отметкой - все это пишется
+        # здесь одним запросом
+        for task in tasks:
+            task._bulk_deleted = True
+        collector = Collector(using=Task.objects.db, origin=tasks)
+        collector.collect(tasks)
+        collector.delete()
+        search.remove_tasks(found)
+        rebuild_project_stats(task.project_id for task in tasks)
+        events.publish([("task.deleted", {"id": task_id}) for task_id in found])
+    versions.bump(Task, found)
+    return sorted(found), errors
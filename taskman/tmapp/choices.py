@@ -0,0 +1,228 @@
+"""
+Кешированные списки выбора для форм.
+
+Поля выбора статуса, исполнителя, проекта и спринта не читают таблицу
+при каждом показе и проверке формы: список (id, название) лежит в кеше
+под меткой версии модели (tmapp/versions.py), поэтому сбрасывается сам
+при любом изменении. Если записей больше TMAPP_CHOICES_INLINE_LIMIT,
+список целиком не выводится - вместо <select> поле поиска, варианты
+подгружает choice_search.
+"""
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.urls import reverse
+from django.utils.html import format_html
+
+from . import replicas, versions
+from .models import Project, Sprint, Status
+
+
+class ChoiceSource:
+    """Модель, поле с названием и поля, нужные формам после выбора"""
+
+    def __init__(self, model, label_field, fields=()):
+        self.model = model
+        self.label_field = label_field
+        self.fields = ("pk", label_field) + tuple(fields)
+
+    def stub(self, values):
+        """Объект из сохраненных значений, без запроса к базе"""
+        return self.model(**values)
+
+
+CHOICE_SOURCES = {
+    "status": ChoiceSource(Status, "name", ("path",)),
+    "executor": ChoiceSource(get_user_model(), "username"),
+    "project": ChoiceSource(Project, "name"),
+    "sprint": ChoiceSource(Sprint, "name", ("project_id",)),
+}
+
+
+def get_cache():
+    return caches[getattr(settings, "TMAPP_CHOICES_CACHE", "default")]
+
+
+def get_inline_limit():
+    return getattr(settings, "TMAPP_CHOICES_INLINE_LIMIT", 200)
+
+
+def get_choices(name):
+    """
+    Значения вариантов выбора [{"pk": ..., "name": ...}, ...]
+    или None, если вариантов слишком много для вывода целиком
+    """
+    source = CHOICE_SOURCES[name]
+    (version,) = versions.get_versions(source.model)
+    key = f"tmapp:choices:{name}:{version}"
+    cache = get_cache()
+
+    entry = cache.get(key)
+    if entry is None:
+        limit = get_inline_limit()
+        values = list(
+            source.model.objects.order_by("pk").values(*source.fields)[:limit + 1]
+        )
+        entry = {"values": values if len(values) <= limit else None}
+        if replicas.may_be_stale(version):
+            # Список прочитан с реплики, которая могла еще не получить
+            # изменение с этой версией: в кеш его не кладем
+            return entry["values"]
+        cache.set(key, entry)
+    return entry["values"]
+
+
+def find_choice(name, pk):
+    """Объект по id: из кешированного списка или одним запросом"""
+    source = CHOICE_SOURCES[name]
+    values = get_choices(name)
+    if values is None:
+        values = source.model.objects.filter(pk=pk).values(*source.fields)
+    for item in values:
+        if item["pk"] == pk:
+            return source.stub(item)
+    return None
+
+
+class ChoiceSearchInput(forms.Widget):
+    """Поле поиска вместо <select> для больших списков (static/js/choices.js)"""
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def format_value(self, value):
+        if isinstance(value, CHOICE_SOURCES[self.source].model):
+            return value.pk
+        return value
+
+    def render(self, name, value, attrs=None, renderer=None):
+        value = self.format_value(value)
+        label = ""
+        if value not in (None, ""):
+            try:
+                choice = find_choice(self.source, int(value))
+            except (TypeError, ValueError):
+                choice = None
+            if choice is not None:
+                label = getattr(choice, CHOICE_SOURCES[self.source].label_field)
+
+        input_id = (attrs or {}).get("id") or f"id_{name}"
+        return format_html(
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="search" class="{}" list="{}_list" value="{}"'
+            ' data-choice-url="{}" data-choice-target="{}" autocomplete="off">'
+            '<datalist id="{}_list"></datalist>',
+            name,
+            input_id,
+            "" if value is None else value,
+            self.attrs.get("class", "form-control"),
+            input_id,
+            label,
+            reverse("choicesearch", args=[self.source]),
+            input_id,
+            input_id,
+        )
+
+
+class CachedChoiceIterator:
+    """
+    Ленивый список вариантов, как ModelChoiceIterator:
+    кеш читается при выводе формы, а не при объявлении поля
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        label_field = CHOICE_SOURCES[self.field.source].label_field
+        for item in get_choices(self.field.source) or ():
+            yield (item["pk"], item[label_field])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(
+            get_choices(self.field.source)
+        )
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField, который берет варианты из кеша, а не из queryset"""
+
+    def __init__(self, source, **kwargs):
+        self.source = source
+        super().__init__(
+            queryset=CHOICE_SOURCES[source].model.objects.all(), **kwargs
+        )
+
+    def _get_choices(self):
+        if hasattr(self, "_choices"):
+            return self._choices
+        return CachedChoiceIterator(self)
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    @property
+    def is_large(self):
+        return get_choices(self.source) is None
+
+    def invalid_choice(self, value):
+        return forms.ValidationError(
+            self.error_messages["invalid_choice"],
+            code="invalid_choice",
+            params={"value": value},
+        )
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            return value
+        try:
+            choice = find_choice(self.source, int(value))
+        except (TypeError, ValueError):
+            choice = None
+        if choice is None:
+            raise self.invalid_choice(value)
+        return choice
+
+    def validate(self, value):
+        """
+        Кеш мог отстать от базы: выбранная запись уже удалена.
+        Проверяем одним запросом, чтобы вместо ошибки целостности
+        при сохранении показать ошибку поля
+        """
+        super().validate(value)
+        if value is not None and not self.queryset.filter(pk=value.pk).exists():
+            raise self.invalid_choice(value.pk)
+
+
+class CachedChoicesFormMixin:
+    """
+    Для больших списков подменяем <select> полем поиска.
+    Выбор уже проверен полем (CachedModelChoiceField.validate), поэтому
+    при проверке модели внешние ключи повторно не проверяем.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            if isinstance(field, CachedModelChoiceField) and field.is_large:
+                field.widget = ChoiceSearchInput(
+                    field.source, attrs={"class": "form-control"}
+                )
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        cached = {
+            name
+            for name, field in self.fields.items()
+            if isinstance(field, CachedModelChoiceField)
+        }
+        return set(exclude) | cached
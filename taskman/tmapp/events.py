@@ -0,0 +1,570 @@
+"""
+Поток изменений задач для открытых страниц (Server-Sent Events).
+
+Страницы списка и карточки задачи подписываются на /events/ (?task=<id> -
+только события одной задачи) и показывают предложение обновиться, а не
+перечитывают страницу по таймеру. Поток отдает ASGI-приложение из
+taskman/asgi.py: ответ держится открытым, под WSGI он занимал бы поток
+на все время.
+
+События: task.created, task.updated, task.status (смена статуса,
+old_status - прежний), task.deleted и task.bulk (массовый импорт, только
+число задач). Публикует их tmapp/signals.py и массовые операции, после
+коммита транзакции.
+
+Брокер (TMAPP_EVENTS_BROKER) доставляет события всем клиентам воркера:
+- InProcessBroker - в памяти процесса, подходит для одного воркера;
+- DatabaseBroker - через таблицу TaskEvent, общую для всех воркеров,
+  о новых событиях воркеры узнают по LISTEN/NOTIFY в PostgreSQL или
+  опросом таблицы в остальных базах.
+
+У каждого клиента своя очередь на TMAPP_EVENTS_QUEUE_SIZE событий: если
+клиент не успевает читать, очередь не растет, а клиент получает событие
+reset и перечитывает страницу. Переподключившийся клиент присылает
+Last-Event-ID и получает пропущенные события, если они еще хранятся,
+иначе тоже reset.
+"""
+
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import select
+import threading
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import TaskEvent
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY в PostgreSQL
+CHANNEL = "tmapp_events"
+
+# Задержка переподключения клиента, мс
+RETRY = 3000
+
+
+def is_enabled():
+    return getattr(settings, "TMAPP_EVENTS_ENABLED", False)
+
+
+def get_path():
+    return getattr(settings, "TMAPP_EVENTS_PATH", "/events/")
+
+
+def get_queue_size():
+    return getattr(settings, "TMAPP_EVENTS_QUEUE_SIZE", 100)
+
+
+def get_buffer_size():
+    return getattr(settings, "TMAPP_EVENTS_BUFFER", 1000)
+
+
+def get_heartbeat():
+    return getattr(settings, "TMAPP_EVENTS_HEARTBEAT", 15)
+
+
+def get_poll_interval():
+    return getattr(settings, "TMAPP_EVENTS_POLL_INTERVAL", 1)
+
+
+def get_retention():
+    return getattr(settings, "TMAPP_EVENTS_RETENTION", 3600)
+
+
+def get_rescan():
+    return getattr(settings, "TMAPP_EVENTS_RESCAN", 10)
+
+
+class Event:
+    def __init__(self, id, event_type, data):
+        self.id = id
+        self.event_type = event_type
+        self.data = data
+
+    def encode(self):
+        data = json.dumps(self.data, cls=DjangoJSONEncoder, ensure_ascii=False)
+        return f"id: {self.id}\nevent: {self.event_type}\ndata: {data}\n\n".encode()
+
+    def matches(self, task_id):
+        """Событие касается задачи task_id (None - всех задач)"""
+        return task_id is None or self.data.get("id") in (task_id, None)
+
+
+class Subscription:
+    """
+    Очередь событий одного клиента. События кладутся из любого потока,
+    читаются в цикле событий клиента
+    """
+
+    def __init__(self, loop, task_id=None, maxsize=None):
+        self.loop = loop
+        self.task_id = task_id
+        self.maxsize = maxsize or get_queue_size()
+        self.pending = collections.deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        # id отданных событий: повторы при продолжении потока (пропущенные
+        # события и новые могут пересечься) отбрасываются. События могут
+        # прийти не по порядку id (DatabaseBroker), поэтому храним id, а не
+        # последний из них
+        self.seen = set()
+        self.seen_order = collections.deque()
+
+    def offer(self, events):
+        self.loop.call_soon_threadsafe(self.put, events)
+
+    def put(self, events):
+        events = [event for event in events if event.matches(self.task_id)]
+        if not events or self.overflowed:
+            return
+        if len(self.pending) + len(events) > self.maxsize:
+            # Клиент не успевает: копить не будем, пусть перечитает страницу
+            self.overflowed = True
+            self.pending.clear()
+        else:
+            self.pending.extend(events)
+        self.ready.set()
+
+    async def get(self, timeout):
+        """События из очереди, пустой список - за timeout ничего нет"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        events = []
+        for event in sorted(self.pending, key=lambda event: event.id):
+            if event.id not in self.seen:
+                self.remember(event.id)
+                events.append(event)
+        self.pending.clear()
+        return events
+
+    def remember(self, event_id):
+        self.seen.add(event_id)
+        self.seen_order.append(event_id)
+        if len(self.seen_order) > get_buffer_size():
+            self.seen.discard(self.seen_order.popleft())
+
+
+class Hub:
+    """Клиенты, подключенные к этому воркеру"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def add(self, subscription):
+        with self.lock:
+            self.subscriptions.add(subscription)
+
+    def remove(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def dispatch(self, events):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.offer(events)
+            except RuntimeError:
+                # Цикл событий клиента уже закрыт
+                self.remove(subscription)
+
+
+class Broker:
+    """
+    Доставка событий клиентам.
+    publish вызывается в транзакции изменения, клиенты получают события
+    после коммита. history(last_id) - события после last_id, None - их
+    уже нет (или id из другого запуска), клиенту нужно перечитать страницу.
+    """
+
+    def __init__(self):
+        self.hub = Hub()
+
+    def publish(self, items):
+        """items - пары (тип события, данные)"""
+        raise NotImplementedError
+
+    def history(self, last_id):
+        raise NotImplementedError
+
+    def subscribe(self, subscription):
+        self.hub.add(subscription)
+
+    def unsubscribe(self, subscription):
+        self.hub.remove(subscription)
+
+    def stop(self):
+        pass
+
+
+class InProcessBroker(Broker):
+    """События в памяти процесса: последние TMAPP_EVENTS_BUFFER для продолжения"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self.buffer = collections.deque(maxlen=get_buffer_size())
+
+    def publish(self, items):
+        transaction.on_commit(lambda: self.emit(items))
+
+    def emit(self, items):
+        with self.lock:
+            events = []
+            for event_type, data in items:
+                self.last_id += 1
+                events.append(Event(self.last_id, event_type, data))
+            self.buffer.extend(events)
+        self.hub.dispatch(events)
+
+    def history(self, last_id):
+        with self.lock:
+            if last_id > self.last_id:
+                return None
+            if self.buffer and last_id < self.buffer[0].id - 1:
+                return None
+            return [event for event in self.buffer if event.id > last_id]
+
+
+class DatabaseBroker(Broker):
+    """
+    События в таблице TaskEvent. Пишутся в транзакции изменения, поэтому
+    откат не оставляет лишних событий; NOTIFY в PostgreSQL тоже уходит
+    при коммите. Каждый воркер читает новые записи в отдельном потоке и
+    раздает своим клиентам, заодно удаляет события старше
+    TMAPP_EVENTS_RETENTION секунд.
+
+    В PostgreSQL id выдается при вставке, а не при коммите: транзакция
+    с меньшим id может закоммититься позже соседней. Поэтому кроме событий
+    после последнего id перечитываются события за TMAPP_EVENTS_RESCAN
+    секунд, уже отданные отбрасываются по id.
+    """
+
+    PRUNE_INTERVAL = 60
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.last_id = None
+        # id отданных событий окна перечитывания -> время события
+        self.seen = {}
+        self.pruned = 0.0
+
+    def publish(self, items):
+        TaskEvent.objects.bulk_create(
+            [TaskEvent(event_type=event_type, data=data) for event_type, data in items]
+        )
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, '')", [CHANNEL])
+
+    @staticmethod
+    def rescan_since():
+        return timezone.now() - datetime.timedelta(seconds=get_rescan())
+
+    @staticmethod
+    def recent(last_id, since):
+        """События после last_id и недавние с меньшими id"""
+        return TaskEvent.objects.filter(
+            Q(id__gt=last_id) | Q(timestamp_create__gte=since)
+        ).order_by("id")
+
+    def history(self, last_id):
+        """
+        Недавние события с id меньше last_id тоже отдаются: клиент мог их
+        не получить, повтор только предложит обновить страницу
+        """
+        ids = TaskEvent.objects.order_by("id").values_list("id", flat=True)
+        oldest, newest = ids.first(), ids.last()
+        if newest is None or last_id > newest:
+            return None if last_id else []
+        if last_id < oldest - 1:
+            return None
+        rows = self.recent(last_id, self.rescan_since())[:get_buffer_size() + 1]
+        events = [Event(row.id, row.event_type, row.data) for row in rows]
+        return events if len(events) <= get_buffer_size() else None
+
+    def subscribe(self, subscription):
+        super().subscribe(subscription)
+        with self.lock:
+            if self.thread is None:
+                self.stopped.clear()
+                self.thread = threading.Thread(
+                    target=self.listen, name="tmapp-events", daemon=True
+                )
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def fetch(self):
+        """Новые события из таблицы - клиентам воркера"""
+        since = self.rescan_since()
+        if self.last_id is None:
+            # События до запуска клиентам не нужны
+            self.last_id = (
+                TaskEvent.objects.order_by("-id").values_list("id", flat=True).first()
+                or 0
+            )
+            self.seen = dict(
+                self.recent(self.last_id, since).values_list("id", "timestamp_create")
+            )
+            return
+        self.seen = {
+            event_id: moment for event_id, moment in self.seen.items() if moment >= since
+        }
+        events = []
+        for row in self.recent(self.last_id, since):
+            if row.id in self.seen:
+                continue
+            self.seen[row.id] = row.timestamp_create
+            events.append(Event(row.id, row.event_type, row.data))
+        if events:
+            self.last_id = max(self.last_id, events[-1].id)
+            self.hub.dispatch(events)
+
+    def prune(self):
+        if time.monotonic() - self.pruned < self.PRUNE_INTERVAL:
+            return
+        self.pruned = time.monotonic()
+        TaskEvent.objects.filter(
+            timestamp_create__lt=timezone.now()
+            - datetime.timedelta(seconds=get_retention())
+        ).delete()
+
+    def wait(self, listening):
+        """Ждем NOTIFY или интервал опроса"""
+        interval = get_poll_interval()
+        if not listening:
+            self.stopped.wait(interval)
+            return
+        raw = connection.connection
+        if select.select([raw], [], [], interval)[0]:
+            raw.poll()
+            raw.notifies.clear()
+
+    def listen(self):
+        listening = False
+        while not self.stopped.is_set():
+            try:
+                if connection.vendor == "postgresql" and not listening:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"LISTEN {CHANNEL}")
+                    listening = True
+                self.fetch()
+                self.prune()
+                self.wait(listening)
+            except Exception:
+                logger.exception("Ошибка чтения событий задач")
+                connection.close()
+                listening = False
+                self.stopped.wait(get_poll_interval())
+        connection.close()
+
+
+broker = None
+broker_lock = threading.Lock()
+
+
+def get_broker():
+    global broker
+    with broker_lock:
+        if broker is None:
+            broker = import_string(
+                getattr(settings, "TMAPP_EVENTS_BROKER", "tmapp.events.InProcessBroker")
+            )()
+        return broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global broker
+    if setting.startswith("TMAPP_EVENTS"):
+        with broker_lock:
+            if broker is not None:
+                broker.stop()
+            broker = None
+
+
+def task_data(task, **extra):
+    return {
+        "id": task.pk,
+        "name": task.name,
+        "status": task.status_id,
+        "executor": task.executor_id,
+        "project": task.project_id,
+        "sprint": task.sprint_id,
+        "is_complete": task.is_complete,
+        **extra,
+    }
+
+
+def publish(items):
+    """Публикуем события (тип, данные) после коммита текущей транзакции"""
+    if is_enabled() and items:
+        get_broker().publish(items)
+
+
+def publish_tasks(event_type, tasks):
+    publish([(event_type, task_data(task)) for task in tasks])
+
+
+def task_change(task):
+    """Событие изменения задачи, пока у нее есть загруженные значения"""
+    old_status = task.previous("status")
+    if old_status != task.status_id:
+        return "task.status", task_data(task, old_status=old_status)
+    return "task.updated", task_data(task)
+
+
+def publish_task_saved(task, created):
+    publish([("task.created", task_data(task)) if created else task_change(task)])
+
+
+# Поток событий (ASGI)
+def load_user(cookies):
+    """Пользователь по cookie сессии - как SessionMiddleware и AuthenticationMiddleware"""
+    close_old_connections()
+    try:
+        engine = import_module(settings.SESSION_ENGINE)
+        session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+        return get_user(SimpleNamespace(session=session))
+    finally:
+        close_old_connections()
+
+
+def parse_scope(scope):
+    """Cookie, id задачи и Last-Event-ID из запроса"""
+    headers = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in scope["headers"]
+    }
+    cookies = SimpleCookie()
+    cookies.load(headers.get("cookie", ""))
+    params = parse_qs(scope.get("query_string", b"").decode())
+
+    task_id = params.get("task", [""])[0]
+    last_id = headers.get("last-event-id") or params.get("last_event_id", [""])[0]
+    return (
+        {name: morsel.value for name, morsel in cookies.items()},
+        int(task_id) if task_id.isdigit() else None,
+        int(last_id) if last_id.isdigit() else None,
+    )
+
+
+async def respond(send, status, text):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+    })
+    await send({"type": "http.response.body", "body": text.encode()})
+
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+RESET = b"event: reset\ndata: {}\n\n"
+
+
+async def stream(scope, receive, send):
+    """ASGI-приложение потока событий"""
+    if not is_enabled():
+        return await respond(send, 404, "Not Found")
+    if scope["method"] != "GET":
+        return await respond(send, 405, "Method Not Allowed")
+
+    cookies, task_id, last_id = parse_scope(scope)
+    user = await sync_to_async(load_user)(cookies)
+    if not user.is_authenticated:
+        return await respond(send, 403, "Forbidden")
+
+    broker = get_broker()
+    subscription = Subscription(asyncio.get_running_loop(), task_id)
+    # Подписываемся до чтения пропущенных событий, чтобы не потерять
+    # события между ними; повторы отбросит Subscription
+    broker.subscribe(subscription)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                # Буферизация в nginx задержала бы события
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": f"retry: {RETRY}\n\n".encode(),
+            "more_body": True,
+        })
+
+        if last_id is not None:
+            missed = await sync_to_async(broker.history)(last_id)
+            if missed is None:
+                subscription.overflowed = True
+            else:
+                subscription.put(missed)
+
+        while not disconnect.done():
+            if subscription.overflowed:
+                await send({
+                    "type": "http.response.body", "body": RESET, "more_body": True,
+                })
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            events = asyncio.ensure_future(subscription.get(get_heartbeat()))
+            await asyncio.wait([events, disconnect], return_when=asyncio.FIRST_COMPLETED)
+            if disconnect.done():
+                events.cancel()
+                break
+            body = b"".join(event.encode() for event in events.result())
+            await send({
+                "type": "http.response.body",
+                # Комментарий держит соединение через прокси
+                "body": body or b": ping\n\n",
+                "more_body": True,
+            })
+    finally:
+        broker.unsubscribe(subscription)
+        disconnect.cancel()
+
+
+def with_event_stream(application):
+    """Приложение Django с потоком событий по пути TMAPP_EVENTS_PATH"""
+
+    async def router(scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == get_path():
+            return await stream(scope, receive, send)
+        return await application(scope, receive, send)
+
+    return router
@@ -0,0 +1,111 @@
+"""
+Потоковая выгрузка задач, проектов, спринтов и истории в CSV или NDJSON.
+
+Строки читаются из базы порциями (iterator(chunk_size), в PostgreSQL -
+серверный курсор) и сразу отдаются клиенту, поэтому память не зависит
+от объема выгрузки. Используется вьюхой task_export и командой export.
+"""
+
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Subquery
+
+from .filters import filter_tasks
+from .models import Project, Sprint, Task
+
+CHUNK_SIZE = 2000
+
+# Сколько текста накапливать перед отправкой клиенту
+BUFFER_SIZE = 64 * 1024
+
+TASK_FIELDS = (
+    "id", "name", "content", "is_complete", "timestamp_create",
+    "timestamp_done", "status_id", "executor_id", "project_id", "sprint_id",
+)
+
+FORMATS = ("csv", "ndjson")
+
+
+def task_rows(params):
+    return filter_tasks(Task.objects.all(), params).order_by("id")
+
+
+def history_rows(params):
+    history = Task.history.model.objects.order_by("history_id")
+    if params:
+        # История только тех задач, что проходят фильтры
+        history = history.filter(
+            id__in=Subquery(task_rows(params).values("id"))
+        )
+    return history
+
+
+EXPORTS = {
+    "tasks": (task_rows, TASK_FIELDS),
+    "projects": (
+        lambda params: Project.objects.order_by("id"),
+        ("id", "name", "content", "is_complete", "timestamp_create", "timestamp_done"),
+    ),
+    "sprints": (
+        lambda params: Sprint.objects.order_by("id"),
+        ("id", "name", "date_start", "date_end", "project_id"),
+    ),
+    "history": (
+        history_rows,
+        ("history_id", "history_date", "history_type", "history_user_id", "changes")
+        + TASK_FIELDS,
+    ),
+}
+
+
+def iter_values(kind, params=None):
+    """Заголовок и строки выгрузки (кортежи значений)"""
+    get_queryset, fields = EXPORTS[kind]
+    rows = get_queryset(params or {}).values_list(*fields)
+    return fields, rows.iterator(chunk_size=CHUNK_SIZE)
+
+
+def csv_lines(fields, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict))
+            else value
+            for value in row
+        ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_lines(fields, rows):
+    for row in rows:
+        yield json.dumps(
+            dict(zip(fields, row)), ensure_ascii=False, cls=DjangoJSONEncoder
+        ) + "\n"
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Склеиваем короткие строки в куски, кусок - bytes в utf-8"""
+    parts, length = [], 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(parts).encode()
+            parts, length = [], 0
+    if parts:
+        yield "".join(parts).encode()
+
+
+def export(kind, fmt, params=None):
+    """Выгрузка кусками bytes"""
+    fields, rows = iter_values(kind, params)
+    lines = csv_lines(fields, rows) if fmt == "csv" else ndjson_lines(fields, rows)
+    return buffered(lines)
@@ -0,0 +1,96 @@
+import datetime
+import re
+
+from django.db.models import Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.filters import BaseFilterBackend
+
+from tmapp.models import Status
+
+# Параметры строки запроса, по которым можно отфильтровать задачи,
+# и соответствующие им поля модели Task
+TASK_FILTER_FIELDS = {
+    'status': 'status_id',
+    'executor': 'executor_id',
+    'project': 'project_id',
+    'sprint': 'sprint_id',
+}
+
+# Границы периодов: параметр -> (поле, включать ли начало периода)
+TASK_DATE_FILTER_FIELDS = {
+    'created_after': ('timestamp_create', True),
+    'created_before': ('timestamp_create', False),
+    'done_after': ('timestamp_done', True),
+    'done_before': ('timestamp_done', False),
+}
+
+# Поля, по которым API разрешает сортировку (?ordering=)
+TASK_ORDERING_FIELDS = ('id', 'name', 'timestamp_create')
+
+
+def parse_bound(value, is_start):
+    """
+    Граница периода из даты или даты со временем.
+    Дата без времени включается целиком: начало периода - ее полночь,
+    конец - полночь следующего дня
+    """
+    try:
+        date = parse_date(value)
+        if date is not None:
+            if not is_start:
+                date += datetime.timedelta(days=1)
+            moment = datetime.datetime.combine(date, datetime.time())
+        else:
+            moment = parse_datetime(value)
+            if moment is None:
+                return None
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        # Граница должна переводиться в UTC для запроса к базе
+        moment.astimezone(datetime.timezone.utc)
+    except (ValueError, OverflowError):
+        # Дата вне допустимого диапазона, например следующий день после 9999-12-31
+        return None
+    return moment
+
+
+def get_task_filters(params):
+    """Достаем из строки запроса фильтры по задачам,
+    некорректные значения молча игнорируем"""
+
+    filters = {}
+    for param, field in TASK_FILTER_FIELDS.items():
+        value = params.get(param, '')
+        if re.fullmatch('[0-9]+', value):
+            filters[field] = int(value)
+
+    # Статус вместе со всеми вложенными - по материализованному пути
+    value = params.get('status_tree', '')
+    if re.fullmatch('[0-9]+', value):
+        filters['status__path__startswith'] = Subquery(
+            Status.objects.filter(pk=int(value)).values('path')[:1]
+        )
+
+    value = params.get('is_complete', '').lower()
+    if value in ('1', 'true', '0', 'false'):
+        filters['is_complete'] = value in ('1', 'true')
+
+    for param, (field, is_start) in TASK_DATE_FILTER_FIELDS.items():
+        moment = parse_bound(params.get(param, ''), is_start)
+        if moment is not None:
+            lookup = 'gte' if is_start else 'lt'
+            filters[f'{field}__{lookup}'] = moment
+    return filters
+
+
+def filter_tasks(queryset, params):
+    """Применяем фильтры из строки запроса к выборке задач"""
+    return queryset.filter(**get_task_filters(params))
+
+
+class TaskFilterBackend(BaseFilterBackend):
+    """Те же фильтры из строки запроса для API"""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_tasks(queryset, request.query_params)
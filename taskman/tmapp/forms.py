@@ -6,8 +6,10 @@ from django.forms.widgets import NumberInput
 
 from tmapp.models import Project, Sprint, Status, Task
 
+from .choices import CachedChoicesFormMixin, CachedModelChoiceField
 
-class NewSprintForm(forms.ModelForm):
+
+class NewSprintForm(CachedChoicesFormMixin, forms.ModelForm):
     def clean(self):
         cleaned_data = super().clean()
         date_start = cleaned_data.get("date_start")
@@ -35,8 +37,8 @@ class NewSprintForm(forms.ModelForm):
         )
     )
 
-    project = forms.ModelChoiceField(
-        queryset=Project.objects.all(),
+    project = CachedModelChoiceField(
+        "project",
         widget=forms.Select(
             attrs={
                 "class": "form-select",
@@ -136,7 +138,12 @@ class ProjectForm(forms.ModelForm):
     )
 
 
-class StatusForm(forms.ModelForm):
+class StatusForm(CachedChoicesFormMixin, forms.ModelForm):
+    def clean_parent_status(self):
+        parent_status = self.cleaned_data.get("parent_status")
+        self.instance.check_parent(parent_status)
+        return parent_status
+
     class Meta:
         model = Status
         fields = (
@@ -152,8 +159,8 @@ class StatusForm(forms.ModelForm):
         )
     )
 
-    parent_status = forms.ModelChoiceField(
-        queryset=Status.objects.all(),
+    parent_status = CachedModelChoiceField(
+        "status",
         required=False,
         widget=forms.Select(
             attrs={
@@ -163,7 +170,7 @@ class StatusForm(forms.ModelForm):
     )
 
 
-class TaskForm(forms.ModelForm):
+class TaskForm(CachedChoicesFormMixin, forms.ModelForm):
     class Meta:
         model = Task
         fields = (
@@ -193,8 +200,8 @@ class TaskForm(forms.ModelForm):
         )
     )
 
-    status = forms.ModelChoiceField(
-        queryset=Status.objects.all(),
+    status = CachedModelChoiceField(
+        "status",
         required=False,
         widget=forms.Select(
             attrs={
@@ -212,8 +219,8 @@ class TaskForm(forms.ModelForm):
         ),
     )
 
-    executor = forms.ModelChoiceField(
-        queryset=User.objects.all(),
+    executor = CachedModelChoiceField(
+        "executor",
         required=False,
         widget=forms.Select(
             attrs={
@@ -222,8 +229,8 @@ class TaskForm(forms.ModelForm):
         ),
     )
 
-    project = forms.ModelChoiceField(
-        queryset=Project.objects.all(),
+    project = CachedModelChoiceField(
+        "project",
         required=False,
         widget=forms.Select(
             attrs={
@@ -232,8 +239,8 @@ class TaskForm(forms.ModelForm):
         ),
     )
 
-    sprint = forms.ModelChoiceField(
-        queryset=Sprint.objects.all(),
+    sprint = CachedModelChoiceField(
+        "sprint",
         required=False,
         widget=forms.Select(
             attrs={
@@ -0,0 +1,195 @@
+"""
+Кеш разметки карточек задач и проектов.
+
+Карточка в списке задач или проектов сохраняется в кеше
+settings.TMAPP_FRAGMENT_CACHE под ключом из меток версий
+(tmapp/versions.py) самого объекта и связанных объектов, которые в ней
+выводятся (статус, исполнитель), и значений, посчитанных запросом
+(счетчики проекта). Изменение любого из них дает новый ключ, старая
+запись просто истекает через TMAPP_FRAGMENT_TIMEOUT секунд. В ключ
+входит и текст шаблона карточки, поэтому правка разметки не покажет
+старые карточки.
+
+Вьюха передает в шаблон пачку (prefetch): метки версий всех карточек
+читаются одним get_many, разметка - еще одним на всю страницу.
+Попадания и промахи считаются в том же кеше (get_stats).
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+from . import replicas, versions
+from .models import Project, Status, Task
+
+STATS_KEY = "tmapp:fragment-stats"
+
+
+class Card:
+    """
+    Модель карточки, связанные объекты (поле id -> модель), от которых
+    зависит разметка, и посчитанные запросом значения
+    """
+
+    def __init__(self, model, related=(), extra=()):
+        self.model = model
+        self.related = related
+        self.extra = extra
+
+    def version_keys(self, obj):
+        keys = [(self.model, obj.pk)]
+        for attname, model in self.related:
+            pk = getattr(obj, attname)
+            if pk is not None:
+                keys.append((model, pk))
+        return keys
+
+    def extra_values(self, obj):
+        return tuple(getattr(obj, name, None) for name in self.extra)
+
+
+CARDS = {
+    "task_card": Card(
+        Task,
+        related=(("status_id", Status), ("executor_id", get_user_model())),
+    ),
+    "project_card": Card(
+        Project,
+        extra=("tasks_total", "tasks_open", "tasks_complete",
+               "sprints_total", "active_sprints"),
+    ),
+}
+
+
+def get_cache():
+    """Кеш карточек, None - карточки не кешируются"""
+    alias = getattr(settings, "TMAPP_FRAGMENT_CACHE", "default")
+    return caches[alias] if alias else None
+
+
+def get_timeout():
+    return getattr(settings, "TMAPP_FRAGMENT_TIMEOUT", 7 * 24 * 3600)
+
+
+def stats_key(name, kind):
+    return f"{STATS_KEY}:{name}:{kind}"
+
+
+def record(name, hits, misses):
+    """Счетчики попаданий и промахов: один incr на страницу"""
+    cache = get_cache()
+    for kind, count in (("hits", hits), ("misses", misses)):
+        if not count:
+            continue
+        key = stats_key(name, kind)
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # Счетчик успели удалить между add и incr
+            cache.set(key, count, timeout=None)
+
+
+def get_stats():
+    """{карточка: {"hits": ..., "misses": ..., "ratio": ...}}"""
+    cache = get_cache()
+    keys = [stats_key(name, kind) for name in CARDS for kind in ("hits", "misses")]
+    values = cache.get_many(keys) if cache else {}
+    stats = {}
+    for name in CARDS:
+        hits = values.get(stats_key(name, "hits"), 0)
+        misses = values.get(stats_key(name, "misses"), 0)
+        total = hits + misses
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "ratio": hits / total if total else 0.0,
+        }
+    return stats
+
+
+def reset_stats():
+    cache = get_cache()
+    if cache:
+        cache.delete_many(
+            [stats_key(name, kind) for name in CARDS for kind in ("hits", "misses")]
+        )
+
+
+class FragmentBatch:
+    """
+    Карточки одной страницы. Кеш читается при первом выводе карточки
+    в шаблоне (для асинхронных вьюх - уже в потоке рендеринга)
+    """
+
+    def __init__(self, name, objects):
+        self.name = name
+        self.card = CARDS[name]
+        self.objects = list(objects)
+        self.pks = {obj.pk for obj in self.objects}
+        self.stamps = None
+        self.found = {}
+
+    def load_stamps(self, objects):
+        """Метки версий карточек одним запросом к кешу"""
+        keys = [self.card.version_keys(obj) for obj in objects]
+        unique = list(dict.fromkeys(key for card_keys in keys for key in card_keys))
+        values = dict(zip(unique, versions.get_versions(*unique)))
+        return {
+            obj.pk: (
+                tuple(values[key] for key in card_keys),
+                self.card.extra_values(obj),
+            )
+            for obj, card_keys in zip(objects, keys)
+        }
+
+    def stamp(self, obj):
+        if self.stamps is None:
+            self.stamps = self.load_stamps(self.objects)
+        stamp = self.stamps.get(obj.pk)
+        if stamp is None:
+            # Объекта нет в пачке - метки читаем отдельно
+            stamp = self.load_stamps([obj])[obj.pk]
+        return stamp
+
+    def key(self, signature, obj):
+        stamp = self.stamp(obj)
+        digest = hashlib.md5(repr((signature, stamp)).encode()).hexdigest()
+        return f"tmapp:fragment:{self.name}:{obj.pk}:{digest}"
+
+    def get(self, signature, obj):
+        """Разметка из кеша или None"""
+        cache = get_cache()
+        if cache is None:
+            return None
+        if signature not in self.found:
+            keys = [self.key(signature, item) for item in self.objects]
+            self.found[signature] = cache.get_many(keys)
+            hits = len(self.found[signature])
+            record(self.name, hits, len(keys) - hits)
+
+        key = self.key(signature, obj)
+        if key in self.found[signature]:
+            return self.found[signature][key]
+        if obj.pk not in self.pks:
+            html = cache.get(key)
+            record(self.name, int(html is not None), int(html is None))
+            return html
+        return None
+
+    def set(self, signature, obj, html):
+        cache = get_cache()
+        if cache is None:
+            return
+        if replicas.may_be_stale(*self.stamp(obj)[0]):
+            # Карточка выведена по данным реплики, которые могут быть
+            # старше меток ключа
+            return
+        cache.set(self.key(signature, obj), html, timeout=get_timeout())
+
+
+def prefetch(name, objects):
+    """Пачка карточек страницы для тега {% fragment %}"""
+    return FragmentBatch(name, objects)
@@ -0,0 +1,379 @@
+"""
+Обслуживание истории задач (HistoricalTask): сжатие и архив.
+
+simple_history пишет запись на каждое сохранение, поэтому таблица
+истории растет без ограничений. Команда compact_history:
+- объединяет серии правок одного пользователя в пределах окна
+  TMAPP_HISTORY_BURST_WINDOW секунд в одну запись (остается последняя,
+  снимок в ней и так итоговый, изменения пересчитываются);
+- удаляет записи без изменений ("Сохранение без изменений" на странице
+  задачи), оставшиеся от прежних версий и массовых операций;
+- переносит записи старше TMAPP_HISTORY_RETENTION_DAYS дней в сжатый
+  архив (TaskHistoryArchive или файл NDJSON.gz). Последняя запись до
+  границы остается: по ней аналитика знает состояние задачи на тот момент,
+  а итоги спринтов за более ранние дни перед архивацией сохраняются
+  в SprintDailyStat (tmapp/analytics.py).
+Каждый шаг умеет только посчитать, что было бы сделано (dry_run).
+
+Для PostgreSQL есть DDL перевода таблицы на секционирование по месяцам
+(partition_sql) и создание секций на следующие месяцы (create_partitions).
+"""
+
+import datetime
+import gzip
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import analytics, search, versions
+from .models import Sprint, Task, TaskHistoryArchive
+
+BATCH_SIZE = 2000
+
+# Сколько пар (спринт, день) считаем одним запросом перед архивацией
+ROLLUP_BATCH_SIZE = 300
+
+
+def get_burst_window():
+    return datetime.timedelta(
+        seconds=getattr(settings, "TMAPP_HISTORY_BURST_WINDOW", 300)
+    )
+
+
+def get_retention_days():
+    return getattr(settings, "TMAPP_HISTORY_RETENTION_DAYS", 365)
+
+
+class Report:
+    """Что сделано (или было бы сделано при dry_run)"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.noop = 0
+        self.collapsed = 0
+        self.archived = 0
+        self.task_ids = set()
+
+    def __str__(self):
+        prefix = "Будет" if self.dry_run else "Сделано"
+        return (
+            f"{prefix}: без изменений - {self.noop}, объединено в серии - "
+            f"{self.collapsed}, в архив - {self.archived} "
+            f"(задач: {len(self.task_ids)})"
+        )
+
+
+def merge_changes(series):
+    """
+    Изменения серии правок одним списком: было - из первой правки поля,
+    стало - из последней; поля, вернувшиеся к прежнему значению, не нужны
+    """
+    merged = {}
+    for changes in series:
+        for field, old, new in changes:
+            merged[field] = [field, merged[field][1] if field in merged else old, new]
+    return [change for change in merged.values() if change[1] != change[2]]
+
+
+def iter_task_history(queryset, fields):
+    """История по задачам: пары (id задачи, список записей по времени)"""
+    rows = (
+        queryset.order_by("id", "history_date", "history_id")
+        .values(*fields)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    task_id, history = None, []
+    for row in rows:
+        if row["id"] != task_id:
+            if history:
+                yield task_id, history
+            task_id, history = row["id"], []
+        history.append(row)
+    if history:
+        yield task_id, history
+
+
+def collapse_bursts(report, window=None):
+    """
+    Серии правок ("~") одного пользователя, уложившиеся в window от
+    первой правки, заменяем последней правкой серии
+    """
+    HistoricalTask = Task.history.model
+    window = window or get_burst_window()
+    fields = ("history_id", "id", "history_date", "history_type",
+              "history_user_id", "changes")
+
+    to_delete, to_update = [], []
+
+    def close(series):
+        if len(series) < 2:
+            return
+        report.collapsed += len(series) - 1
+        report.task_ids.add(series[-1]["id"])
+        if report.dry_run:
+            return
+        to_delete.extend(row["history_id"] for row in series[:-1])
+        to_update.append(HistoricalTask(
+            history_id=series[-1]["history_id"],
+            changes=merge_changes(row["changes"] for row in series),
+        ))
+
+    for task_id, history in iter_task_history(
+        HistoricalTask.objects.filter(history_type="~"), fields
+    ):
+        series = []
+        for row in history:
+            if series and (
+                row["history_user_id"] != series[0]["history_user_id"]
+                or row["history_date"] - series[0]["history_date"] > window
+            ):
+                close(series)
+                series = []
+            series.append(row)
+        close(series)
+
+        if len(to_delete) >= BATCH_SIZE:
+            flush_collapsed(to_delete, to_update)
+            to_delete, to_update = [], []
+
+    if not report.dry_run:
+        flush_collapsed(to_delete, to_update)
+
+
+def flush_collapsed(to_delete, to_update):
+    HistoricalTask = Task.history.model
+    with transaction.atomic():
+        HistoricalTask.objects.bulk_update(to_update, ["changes"], batch_size=500)
+        for start in range(0, len(to_delete), 500):
+            HistoricalTask.objects.filter(
+                history_id__in=to_delete[start:start + 500]
+            ).delete()
+
+
+def drop_noop(report):
+    """Удаляем правки без изменений"""
+    revisions = Task.history.model.objects.filter(history_type="~", changes=[])
+    report.task_ids.update(revisions.values_list("id", flat=True).distinct())
+    if report.dry_run:
+        report.noop += revisions.count()
+    else:
+        report.noop += revisions.delete()[0]
+
+
+class TableArchive:
+    """Архив в TaskHistoryArchive: одна строка на задачу за один проход"""
+
+    def __init__(self):
+        self.batch = []
+
+    def write(self, task_id, rows):
+        data = json.dumps(rows, cls=DjangoJSONEncoder, ensure_ascii=False)
+        self.batch.append(TaskHistoryArchive(
+            task_id=task_id,
+            date_from=rows[0]["history_date"],
+            date_to=rows[-1]["history_date"],
+            revisions=len(rows),
+            data=zlib.compress(data.encode(), 9),
+        ))
+
+    def flush(self):
+        TaskHistoryArchive.objects.bulk_create(self.batch)
+        self.batch = []
+
+    def close(self):
+        self.flush()
+
+
+class FileArchive:
+    """Архив в файл NDJSON.gz: одна строка на запись истории"""
+
+    def __init__(self, path):
+        self.file = gzip.open(path, "at", encoding="utf-8")
+
+    def write(self, task_id, rows):
+        for row in rows:
+            self.file.write(
+                json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+            )
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def rollup_sprints(cutoff):
+    """
+    Итоги спринтов на конец дней до границы архива: после архивации
+    по истории их уже не посчитать, сохраненные analytics берет готовыми
+    """
+    last_day = timezone.localdate(cutoff)
+    points = []
+    for sprint in Sprint.objects.filter(date_start__lte=last_day).only(
+        "id", "date_start", "date_end"
+    ):
+        points += [(sprint.pk, day) for day in analytics.sprint_days(sprint, last_day)]
+    for start in range(0, len(points), ROLLUP_BATCH_SIZE):
+        analytics.ensure_daily_stats(points[start:start + ROLLUP_BATCH_SIZE])
+
+
+def archive_old(report, archive, days=None):
+    """
+    Переносим в архив записи старше days дней, кроме последней записи
+    каждой задачи до границы. Историю удаленных задач - целиком.
+    """
+    HistoricalTask = Task.history.model
+    days = get_retention_days() if days is None else days
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    fields = [field.attname for field in HistoricalTask._meta.concrete_fields]
+    if not report.dry_run:
+        rollup_sprints(cutoff)
+
+    to_delete = []
+    for task_id, history in iter_task_history(
+        HistoricalTask.objects.filter(history_date__lt=cutoff), fields
+    ):
+        if history[-1]["history_type"] != "-":
+            history = history[:-1]
+        if not history:
+            continue
+        report.archived += len(history)
+        report.task_ids.add(task_id)
+        if report.dry_run:
+            continue
+
+        archive.write(task_id, history)
+        to_delete.extend(row["history_id"] for row in history)
+        if len(to_delete) >= BATCH_SIZE:
+            flush_archived(archive, to_delete)
+            to_delete = []
+
+    if not report.dry_run:
+        flush_archived(archive, to_delete)
+
+
+def flush_archived(archive, to_delete):
+    # Записи удаляются в той же транзакции, в которой сохраняется архив;
+    # у файла транзакции нет, он дописывается до удаления
+    with transaction.atomic():
+        archive.flush()
+        for start in range(0, len(to_delete), 500):
+            Task.history.model.objects.filter(
+                history_id__in=to_delete[start:start + 500]
+            ).delete()
+
+
+def compact(dry_run=False, window=None, days=None, archive=None,
+            collapse=True, noop=True):
+    """
+    Все шаги обслуживания истории.
+    archive - TableArchive или FileArchive, None - без архивации
+    """
+    report = Report(dry_run)
+    if collapse:
+        collapse_bursts(report, window)
+    if noop:
+        # После объединения серия могла вернуть задачу к исходному состоянию
+        drop_noop(report)
+    if archive is not None:
+        archive_old(report, archive, days)
+
+    if not dry_run and report.task_ids:
+        with transaction.atomic():
+            # История видна на странице задачи (ETag) и в поиске
+            versions.bump(Task, report.task_ids)
+            if search.history_enabled():
+                search.index_tasks(list(report.task_ids))
+    return report
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_ddl(table, start, months):
+    """Секции по месяцам начиная с месяца start"""
+    statements = []
+    day = month_start(start)
+    for _ in range(months):
+        end = next_month(day)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {table}_{day:%Y%m} "
+            f"PARTITION OF {table} "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{end.isoformat()}');"
+        )
+        day = end
+    return statements
+
+
+def partition_sql(months_ahead=3):
+    """
+    DDL перевода таблицы истории на секционирование по history_date.
+    Выполняется вручную в окно обслуживания: данные копируются в новую
+    таблицу, старая остается под именем *_old до проверки.
+    Первичный ключ секционированной таблицы обязан включать history_date.
+    """
+    table = Task.history.model._meta.db_table
+    first = Task.history.model.objects.order_by("history_date").first()
+    today = timezone.localdate()
+    start = timezone.localdate(first.history_date) if first else today
+    months = 0
+    day = month_start(start)
+    while day <= month_start(today):
+        day = next_month(day)
+        months += 1
+
+    return "\n".join([
+        "BEGIN;",
+        f"ALTER TABLE {table} RENAME TO {table}_old;",
+        f"CREATE SEQUENCE {table}_part_id_seq;",
+        f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (history_date);",
+        f"ALTER TABLE {table} ALTER COLUMN history_id "
+        f"SET DEFAULT nextval('{table}_part_id_seq');",
+        f"ALTER SEQUENCE {table}_part_id_seq OWNED BY {table}.history_id;",
+        f"ALTER TABLE {table} ADD PRIMARY KEY (history_id, history_date);",
+        f"CREATE INDEX ON {table} (history_date);",
+        f"CREATE INDEX ON {table} (id);",
+        f"CREATE INDEX ON {table} (history_user_id);",
+        *partition_ddl(table, start, months + months_ahead),
+        f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;",
+        f"INSERT INTO {table} SELECT * FROM {table}_old;",
+        f"SELECT setval('{table}_part_id_seq', "
+        f"(SELECT COALESCE(MAX(history_id), 0) + 1 FROM {table}), false);",
+        "COMMIT;",
+        f"-- после проверки: DROP TABLE {table}_old;",
+    ])
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [Task.history.model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def create_partitions(months_ahead=3):
+    """Секции на текущий и следующие месяцы, если таблица секционирована"""
+    if not is_partitioned():
+        return []
+    statements = partition_ddl(
+        Task.history.model._meta.db_table, timezone.localdate(), months_ahead + 1
+    )
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+    return statements
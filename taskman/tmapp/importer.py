@@ -0,0 +1,381 @@
+"""
+Массовый импорт задач, проектов и спринтов из CSV или NDJSON.
+
+Связи задаются названиями: статус и проект - по name, исполнитель -
+по username, спринт - по name (внутри проекта задачи, если он указан).
+Все названия один раз загружаются в словари, строки проверяются без
+запросов к базе и пишутся пачками: в PostgreSQL через COPY, в остальных
+базах через bulk_create. История задач пишется так же, пачкой.
+Ошибочные строки не прерывают импорт, а собираются в отчет.
+"""
+
+import csv
+import datetime
+import io
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import bulk, events, search, versions
+from .models import Project, Sprint, Status, Task
+
+BATCH_SIZE = 5000
+
+TRUE_VALUES = ("1", "true", "yes", "да", "t")
+FALSE_VALUES = ("", "0", "false", "no", "нет", "f")
+
+# Значение-метка: по названию найдено несколько объектов
+AMBIGUOUS = object()
+
+
+class ImportResult:
+    """Итоги импорта: сколько прочитано и записано, ошибки по строкам"""
+
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def add_error(self, line, errors):
+        self.errors.append({"line": line, "errors": errors})
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.imported / self.seconds if self.seconds else 0.0
+
+
+def read_rows(file, fmt):
+    """Пары (номер строки, словарь значений или текст ошибки)"""
+    if fmt == "csv":
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, f"Некорректный JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Ожидался объект."
+            continue
+        yield line_number, row
+
+
+class LookupMap:
+    """Словарь название -> id, загружается одним запросом"""
+
+    def __init__(self, queryset, *key_fields):
+        self.ids = {}
+        for *key, pk in queryset.values_list(*key_fields, "pk"):
+            key = tuple(key) if len(key) > 1 else key[0]
+            self.ids[key] = AMBIGUOUS if key in self.ids else pk
+
+    def resolve(self, key, label):
+        """(id, текст ошибки)"""
+        pk = self.ids.get(key)
+        if pk is None:
+            return None, f"{label} не найден: {key}"
+        if pk is AMBIGUOUS:
+            return None, f"{label} с таким названием не один: {key}"
+        return pk, None
+
+
+class RowParser:
+    """Разбор значений строки с накоплением ошибок по полям"""
+
+    def __init__(self, row):
+        self.row = row
+        self.errors = {}
+
+    def error(self, field, message):
+        self.errors.setdefault(field, []).append(message)
+
+    def text(self, field, required=True, max_length=None):
+        value = self.row.get(field)
+        value = "" if value is None else str(value).strip()
+        if required and not value:
+            self.error(field, "Обязательное поле.")
+        if max_length and len(value) > max_length:
+            self.error(field, f"Не больше {max_length} символов.")
+        return value
+
+    def boolean(self, field):
+        value = self.row.get(field)
+        if isinstance(value, bool):
+            return value
+        value = "" if value is None else str(value).strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value not in FALSE_VALUES:
+            self.error(field, "Ожидалось да/нет.")
+        return False
+
+    def moment(self, field):
+        value = self.text(field, required=False)
+        if not value:
+            return None
+        try:
+            moment = parse_datetime(value)
+            if moment is None:
+                date = parse_date(value)
+                moment = date and datetime.datetime.combine(date, datetime.time())
+        except ValueError:
+            moment = None
+        if moment is None:
+            self.error(field, "Некорректная дата.")
+            return None
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+    def date(self, field):
+        value = self.text(field)
+        try:
+            date = parse_date(value) if value else None
+        except ValueError:
+            date = None
+        if value and date is None:
+            self.error(field, "Некорректная дата.")
+        return date
+
+    def lookup(self, field, lookup_map, label, key=None):
+        value = self.text(field, required=False)
+        if not value:
+            return None
+        pk, message = lookup_map.resolve(key or value, label)
+        if message:
+            self.error(field, message)
+        return pk
+
+
+class Importer:
+    """Общая часть: чтение, проверка строк и запись пачками"""
+
+    model = None
+
+    def __init__(self, batch_size=BATCH_SIZE, user=None):
+        self.batch_size = batch_size
+        self.user = user
+        self.load_maps()
+
+    def load_maps(self):
+        pass
+
+    def parse(self, parser):
+        raise NotImplementedError
+
+    def insert(self, objects):
+        # bulk_create не отправляет post_save - метки версий обновляем сами
+        self.model.objects.bulk_create(objects)
+        versions.bump(self.model, [obj.pk for obj in objects])
+
+    def run(self, file, fmt):
+        result = ImportResult()
+        batch = []
+        for line, row in read_rows(file, fmt):
+            result.read += 1
+            if isinstance(row, str):
+                result.add_error(line, {"non_field_errors": [row]})
+                continue
+            parser = RowParser(row)
+            obj = self.parse(parser)
+            if parser.errors:
+                result.add_error(line, parser.errors)
+                continue
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                self.flush(batch, result)
+                batch = []
+        if batch:
+            self.flush(batch, result)
+        result.finish()
+        return result
+
+    def flush(self, batch, result):
+        with transaction.atomic():
+            self.insert(batch)
+        result.imported += len(batch)
+
+
+class ProjectImporter(Importer):
+    model = Project
+
+    def parse(self, parser):
+        project = Project(
+            name=parser.text("name", max_length=50),
+            content=parser.text("content"),
+            is_complete=parser.boolean("is_complete"),
+        )
+        if project.is_complete:
+            project.timestamp_done = timezone.localtime()
+        return project
+
+    def insert(self, objects):
+        super().insert(objects)
+        bulk.rebuild_project_stats(project.pk for project in objects)
+
+
+class SprintImporter(Importer):
+    model = Sprint
+
+    def load_maps(self):
+        self.projects = LookupMap(Project.objects.all(), "name")
+
+    def parse(self, parser):
+        sprint = Sprint(
+            name=parser.text("name", max_length=50),
+            date_start=parser.date("date_start"),
+            date_end=parser.date("date_end"),
+            project_id=parser.lookup("project", self.projects, "Проект"),
+        )
+        if sprint.project_id is None and "project" not in parser.errors:
+            parser.error("project", "Обязательное поле.")
+        if sprint.date_start and sprint.date_end and sprint.date_start > sprint.date_end:
+            parser.error("date_end", "Окончание раньше начала.")
+        return sprint
+
+    def insert(self, objects):
+        super().insert(objects)
+        bulk.rebuild_project_stats(sprint.project_id for sprint in objects)
+
+
+class TaskImporter(Importer):
+    model = Task
+
+    def load_maps(self):
+        self.statuses = LookupMap(Status.objects.all(), "name")
+        self.executors = LookupMap(get_user_model().objects.all(), "username")
+        self.projects = LookupMap(Project.objects.all(), "name")
+        self.sprints = LookupMap(Sprint.objects.all(), "name")
+        self.project_sprints = LookupMap(Sprint.objects.all(), "project_id", "name")
+
+    def parse(self, parser):
+        task = Task(
+            name=parser.text("name", max_length=50),
+            content=parser.text("content"),
+            is_complete=parser.boolean("is_complete"),
+            timestamp_create=parser.moment("timestamp_create"),
+            timestamp_done=parser.moment("timestamp_done"),
+            status_id=parser.lookup("status", self.statuses, "Статус"),
+            executor_id=parser.lookup("executor", self.executors, "Исполнитель"),
+            project_id=parser.lookup("project", self.projects, "Проект"),
+        )
+        sprint_name = parser.text("sprint", required=False)
+        if task.project_id is not None and sprint_name:
+            task.sprint_id = parser.lookup(
+                "sprint", self.project_sprints, "Спринт",
+                key=(task.project_id, sprint_name),
+            )
+        else:
+            task.sprint_id = parser.lookup("sprint", self.sprints, "Спринт")
+        task.update_timestamp_done()
+        return task
+
+    def insert(self, tasks):
+        now = timezone.now()
+        imported_dates = any(task.timestamp_create for task in tasks)
+        created = [task.timestamp_create or now for task in tasks]
+
+        if connection.vendor == "postgresql":
+            ids = reserve_ids(Task, len(tasks))
+            for task, pk, timestamp in zip(tasks, ids, created):
+                task.pk, task.timestamp_create = pk, timestamp
+            copy_objects(Task, tasks)
+        else:
+            # bulk_create ставит auto_now_add-поле текущим временем,
+            # загруженное время записываем отдельным запросом
+            Task.objects.bulk_create(tasks)
+            for task, timestamp in zip(tasks, created):
+                task.timestamp_create = timestamp
+            if imported_dates:
+                Task.objects.bulk_update(tasks, ["timestamp_create"])
+
+        history = bulk.build_task_history(tasks, "+", self.user)
+        for row, task in zip(history, tasks):
+            row.history_date = task.timestamp_create
+        if connection.vendor == "postgresql":
+            copy_objects(Task.history.model, history)
+        else:
+            Task.history.model.objects.bulk_create(history)
+
+        bulk.rebuild_project_stats(task.project_id for task in tasks)
+        search.index_tasks([task.pk for task in tasks], created=True)
+        versions.bump(Task, [task.pk for task in tasks])
+        # Пачка импорта - одно событие: страницы все равно перечитываются
+        events.publish([("task.bulk", {"count": len(tasks)})])
+
+
+IMPORTERS = {
+    "projects": ProjectImporter,
+    "sprints": SprintImporter,
+    "tasks": TaskImporter,
+}
+
+
+def reserve_ids(model, count):
+    """id из последовательности таблицы - COPY их не возвращает"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_value(field, value):
+    """Значение в текстовом формате COPY"""
+    if value is None:
+        return "\\N"
+    if isinstance(field, models.JSONField):
+        value = json.dumps(value, ensure_ascii=False, cls=field.encoder)
+    elif isinstance(value, bool):
+        return "t" if value else "f"
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_objects(model, objects):
+    """Запись пачки объектов одной командой COPY (PostgreSQL)"""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and getattr(objects[0], field.attname) is None)
+    ]
+    buffer = io.StringIO()
+    for obj in objects:
+        buffer.write(
+            "\t".join(copy_value(field, getattr(obj, field.attname)) for field in fields)
+            + "\n"
+        )
+    buffer.seek(0)
+
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+            "FROM STDIN",
+            buffer,
+        )
+
+
+def import_file(kind, file, fmt, batch_size=BATCH_SIZE, user=None):
+    return IMPORTERS[kind](batch_size=batch_size, user=user).run(file, fmt)
@@ -0,0 +1,107 @@
+"""
+Канбан-доска.
+
+Колонки - статусы в порядке дерева (родительский, затем вложенные в
+него, как в справочнике статусов), первой идет колонка задач без
+статуса. В колонке выводятся первые TMAPP_KANBAN_CARDS задач в порядке
+списка задач (открытые, затем новые) и число задач в статусе.
+
+Все колонки загружаются одним запросом: номер задачи в колонке и размер
+колонки считаются оконными функциями по status_id, снаружи остаются
+строки с номером не больше лимита. Django 4.1 не фильтрует по оконным
+функциям, поэтому запрос ORM оборачивается в SELECT вручную. Индекс
+task_status_idx (status, is_complete, -id) отдает задачи уже в порядке
+окна.
+"""
+
+from django.conf import settings
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Status, Task
+
+# Поля задачи, которые нужны карточке
+CARD_FIELDS = ("id", "name", "is_complete", "status_id", "executor_id")
+
+
+def get_cards_limit():
+    return getattr(settings, "TMAPP_KANBAN_CARDS", 50)
+
+
+class Column:
+    """Колонка доски: статус (None - без статуса) и первые задачи"""
+
+    def __init__(self, status=None):
+        self.status = status
+        self.tasks = []
+        self.total = 0
+
+    @property
+    def status_id(self):
+        return self.status.pk if self.status else None
+
+    @property
+    def hidden(self):
+        """Сколько задач статуса не поместилось в колонку"""
+        return self.total - len(self.tasks)
+
+
+def column_tasks(queryset, limit):
+    """
+    Первые limit задач каждого статуса одним запросом.
+    У задач есть column_total - число задач в статусе
+    и executor_username - имя исполнителя.
+    """
+    window = {"partition_by": [F("status_id")]}
+    ranked = (
+        queryset.order_by()
+        .only(*CARD_FIELDS)
+        .annotate(
+            executor_username=F("executor__username"),
+            column_position=Window(
+                RowNumber(),
+                order_by=[F("is_complete").asc(), F("id").desc()],
+                **window,
+            ),
+            column_total=Window(Count("id"), **window),
+        )
+    )
+    sql, params = ranked.query.get_compiler(using=ranked.db).as_sql()
+    return Task.objects.db_manager(ranked.db).raw(
+        f"SELECT * FROM ({sql}) board WHERE column_position <= %s "
+        "ORDER BY column_position",
+        (*params, limit),
+    )
+
+
+def get_board(queryset=None, limit=None):
+    """Колонки доски для выборки задач (например, с фильтрами списка)"""
+    queryset = Task.objects.all() if queryset is None else queryset
+    limit = get_cards_limit() if limit is None else limit
+
+    columns = {None: Column()}
+    for status in Status.objects.order_by("path"):
+        columns[status.pk] = Column(status)
+
+    for task in column_tasks(queryset, limit):
+        column = columns.get(task.status_id)
+        if column is None:
+            # Статус создан после чтения справочника
+            continue
+        column.tasks.append(task)
+        column.total = task.column_total
+
+    board = list(columns.values())
+    if not board[0].total:
+        # Колонка без статуса нужна, только если в ней есть задачи
+        board = board[1:]
+    return board
+
+
+def move_task(task, status):
+    """Переводим задачу в статус, True - статус изменился"""
+    if task.status_id == (status.pk if status else None):
+        return False
+    task.status = status
+    task.save()
+    return True
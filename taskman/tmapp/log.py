@@ -0,0 +1,178 @@
+"""
+Неблокирующее логирование.
+
+Поток запроса только кладет запись в ограниченную очередь (QueueHandler),
+в файл пишет отдельный поток. Записи сбрасываются на диск пачками,
+файл ротируется по размеру или по времени, формат - текст или JSON lines.
+Подключается в settings.LOGGING через фабрику queue_file_handler.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import (QueueHandler, RotatingFileHandler,
+                              TimedRotatingFileHandler)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+# Атрибуты, которые есть у любой записи; все остальное пришло через extra
+STANDARD_RECORD_ATTRS = set(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime"}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON, поля из extra (task_id, changed_fields) тоже"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class BatchingMixin:
+    """
+    Файловый обработчик, который сбрасывает буфер не после каждой записи,
+    а раз в batch_size записей или раз в flush_interval секунд
+    """
+
+    def __init__(self, *args, batch_size=100, flush_interval=1.0, **kwargs):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._in_emit = False
+        super().__init__(*args, **kwargs)
+
+    def emit(self, record):
+        self._in_emit = True
+        try:
+            super().emit(record)
+        finally:
+            self._in_emit = False
+
+    def flush(self):
+        if self._in_emit:
+            self._pending += 1
+            if (
+                self._pending < self.batch_size
+                and time.monotonic() - self._last_flush < self.flush_interval
+            ):
+                return
+        super().flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+
+class BatchedRotatingFileHandler(BatchingMixin, RotatingFileHandler):
+    """Ротация по размеру файла"""
+
+
+class BatchedTimedRotatingFileHandler(BatchingMixin, TimedRotatingFileHandler):
+    """Ротация по времени"""
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Кладет запись в очередь и сразу возвращает управление.
+    Если очередь заполнена (диск не успевает) - запись отбрасывается,
+    а не блокирует запрос; количество отброшенных в dropped.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogListener(threading.Thread):
+    """Фоновый поток: достает записи из очереди и передает обработчикам"""
+
+    _sentinel = None
+
+    def __init__(self, log_queue, *handlers, flush_interval=1.0):
+        super().__init__(name="tmapp-log-listener", daemon=True)
+        self.queue = log_queue
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+
+    def run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Записей нет - сбрасываем накопленное на диск
+                self.flush()
+                continue
+            if record is self._sentinel:
+                break
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        self.flush()
+
+    def flush(self):
+        for handler in self.handlers:
+            handler.flush()
+
+    def stop(self):
+        self.queue.put(self._sentinel)
+        self.join()
+        for handler in self.handlers:
+            handler.close()
+
+
+def queue_file_handler(
+    filename,
+    rotation="size",
+    max_bytes=10 * 1024 * 1024,
+    backup_count=5,
+    when="midnight",
+    json_lines=False,
+    queue_size=10000,
+    batch_size=100,
+    flush_interval=1.0,
+):
+    """
+    Фабрика для settings.LOGGING ('()': 'tmapp.log.queue_file_handler').
+    Возвращает обработчик-очередь, файл пишет фоновый поток.
+    """
+    if rotation == "time":
+        target = BatchedTimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8",
+            batch_size=batch_size, flush_interval=flush_interval,
+        )
+    else:
+        target = BatchedRotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count,
+            encoding="utf-8", batch_size=batch_size, flush_interval=flush_interval,
+        )
+    target.setFormatter(
+        JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT)
+    )
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = LogListener(log_queue, target, flush_interval=flush_interval)
+    listener.start()
+    atexit.register(listener.stop)
+
+    handler = BoundedQueueHandler(log_queue)
+    handler.listener = listener
+    return handler
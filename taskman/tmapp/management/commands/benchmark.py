@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tmapp import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеры времени ответа, количества SQL-запросов и памяти "
+        "для основных страниц и API на наборах данных разного размера"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale", action="append", dest="scales",
+            help=f"Размер набора: {', '.join(benchmark.SCALES)} или число задач, "
+                 "можно указать несколько раз (по умолчанию 1k)",
+        )
+        parser.add_argument("--repeat", type=int, default=20,
+                            help="Запросов на каждый сценарий")
+        parser.add_argument("--scenario", action="append", dest="scenarios",
+                            choices=sorted(benchmark.SCENARIOS),
+                            help="Только указанные сценарии")
+        parser.add_argument("--baseline",
+                            help="JSON с базовыми замерами для сравнения")
+        parser.add_argument("--save-baseline",
+                            help="Сохранить результаты в JSON")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Допустимое замедление p90, доля (0.2 = 20%%)")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            baseline = benchmark.load_baseline(options["baseline"])
+
+        # Замеры идут на отдельной тестовой базе, рабочие данные не трогаем
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = {}
+            for scale in options["scales"] or ["1k"]:
+                self.stdout.write(f"Набор данных {scale}...")
+                results[scale] = self.run_scale(scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.report(results, options["verbosity"])
+        if options["save_baseline"]:
+            benchmark.save_baseline(options["save_baseline"], results)
+
+        if baseline is not None:
+            regressions = benchmark.compare(results, baseline, options["threshold"])
+            if regressions:
+                raise CommandError("Регрессии:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("Регрессий нет"))
+
+    def run_scale(self, scale, options):
+        # Каждый набор строится в транзакции и откатывается после замеров
+        with transaction.atomic():
+            data = benchmark.build_dataset(**benchmark.parse_scale(scale))
+            results = benchmark.run_scenarios(
+                data, options["repeat"], options["scenarios"]
+            )
+            transaction.set_rollback(True)
+        return results
+
+    def report(self, results, verbosity):
+        header = f"{'сценарий':<22}{'p50':>9}{'p90':>9}{'p99':>9}{'SQL':>6}{'КБ':>10}"
+        for scale, scenarios in results.items():
+            self.stdout.write(f"\n{scale}\n{header}")
+            for name, result in scenarios.items():
+                self.stdout.write(
+                    f"{name:<22}{result['p50_ms']:>9}{result['p90_ms']:>9}"
+                    f"{result['p99_ms']:>9}{result['queries']:>6}{result['peak_kb']:>10}"
+                )
+        if verbosity > 1:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,72 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tmapp import history
+
+
+class Command(BaseCommand):
+    help = (
+        "Сжимает историю задач: объединяет серии правок, удаляет записи "
+        "без изменений и переносит старые записи в архив"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Только показать, что будет сделано")
+        parser.add_argument("--window", type=int,
+                            help="Окно серии правок, секунд "
+                                 "(по умолчанию TMAPP_HISTORY_BURST_WINDOW)")
+        parser.add_argument("--days", type=int,
+                            help="Хранить записи, дней "
+                                 "(по умолчанию TMAPP_HISTORY_RETENTION_DAYS)")
+        parser.add_argument("--archive-file",
+                            help="Архивировать в файл NDJSON.gz, а не в таблицу")
+        parser.add_argument("--no-archive", action="store_true",
+                            help="Не архивировать старые записи")
+        parser.add_argument("--no-collapse", action="store_true",
+                            help="Не объединять серии правок")
+        parser.add_argument("--partition-sql", action="store_true",
+                            help="Вывести DDL секционирования таблицы истории "
+                                 "(PostgreSQL) и выйти")
+        parser.add_argument("--create-partitions", type=int, metavar="MONTHS",
+                            help="Создать секции на MONTHS месяцев вперед "
+                                 "(PostgreSQL, таблица уже секционирована)")
+
+    def handle(self, *args, **options):
+        if options["partition_sql"]:
+            self.stdout.write(history.partition_sql())
+            return
+
+        if options["create_partitions"] is not None:
+            if connection.vendor != "postgresql":
+                raise CommandError("Секционирование доступно только в PostgreSQL")
+            if not history.is_partitioned():
+                raise CommandError(
+                    "Таблица истории не секционирована, см. --partition-sql"
+                )
+            for statement in history.create_partitions(options["create_partitions"]):
+                self.stdout.write(statement)
+
+        archive = None
+        if not options["no_archive"]:
+            # При dry_run в архив ничего не пишется, файл не нужен
+            if options["archive_file"] and not options["dry_run"]:
+                archive = history.FileArchive(options["archive_file"])
+            else:
+                archive = history.TableArchive()
+
+        window = options["window"]
+        try:
+            report = history.compact(
+                dry_run=options["dry_run"],
+                window=datetime.timedelta(seconds=window) if window else None,
+                days=options["days"],
+                archive=archive,
+                collapse=not options["no_collapse"],
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+        self.stdout.write(str(report))
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tmapp import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает пропускную способность под одновременной нагрузкой: "
+        "синхронные вьюхи под WSGI и ASGI, асинхронные под ASGI"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", default="1k",
+                            help=f"Размер набора: {', '.join(benchmark.SCALES)} "
+                                 "или число задач")
+        parser.add_argument("--concurrency", type=int, default=50,
+                            help="Одновременных запросов")
+        parser.add_argument("--requests", type=int, default=500,
+                            help="Запросов на каждый замер")
+        parser.add_argument("--scenario", action="append", dest="scenarios",
+                            choices=sorted(benchmark.LOAD_SCENARIOS),
+                            help="Только указанные сценарии")
+        parser.add_argument("--conditional", action="store_true",
+                            help="Запросы с If-None-Match (ответы 304)")
+
+    def handle(self, *args, **options):
+        # Запросы идут из других потоков, поэтому набор данных сохраняется
+        # (без отката), а тестовая база удаляется целиком
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            data = benchmark.build_dataset(**benchmark.parse_scale(options["scale"]))
+            results = benchmark.run_load(
+                data,
+                concurrency=options["concurrency"],
+                total=options["requests"],
+                scenarios=options["scenarios"],
+                conditional=options["conditional"],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        header = (
+            f"{'сценарий':<20}{'режим':<12}{'rps':>9}{'p50':>9}"
+            f"{'p90':>9}{'p99':>9}{'ошибок':>8}"
+        )
+        self.stdout.write(header)
+        for name, runs in results.items():
+            for label, run in runs.items():
+                self.stdout.write(
+                    f"{name:<20}{label:<12}{run['rps']:>9}{run['p50_ms']:>9}"
+                    f"{run['p90_ms']:>9}{run['p99_ms']:>9}{run['errors']:>8}"
+                )
+        if options["verbosity"] > 1:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,46 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tmapp import export
+
+
+class Command(BaseCommand):
+    help = "Выгружает задачи, проекты, спринты или историю в CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(export.EXPORTS))
+        parser.add_argument("--format", dest="fmt", choices=export.FORMATS,
+                            default="csv")
+        parser.add_argument("--output", help="Файл, по умолчанию stdout")
+        parser.add_argument("--gzip", action="store_true",
+                            help="Сжимать выгрузку")
+        parser.add_argument(
+            "--filter", action="append", default=[], dest="filters",
+            help="Фильтр задач как в списке задач, например status=3 "
+                 "или created_after=2026-01-01",
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options["filters"]:
+            name, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Фильтр должен быть вида поле=значение: {item}")
+            params[name] = value
+
+        if options["output"]:
+            target = open(options["output"], "wb")
+        else:
+            target = sys.stdout.buffer
+        output = gzip.GzipFile(fileobj=target, mode="wb") if options["gzip"] else target
+
+        try:
+            for chunk in export.export(options["kind"], options["fmt"], params):
+                output.write(chunk)
+        finally:
+            if output is not target:
+                output.close()
+            if options["output"]:
+                target.close()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from tmapp import fragments
+
+
+class Command(BaseCommand):
+    help = "Показывает попадания и промахи кеша карточек задач и проектов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true",
+                            help="Обнулить счетчики после вывода")
+
+    def handle(self, *args, **options):
+        if fragments.get_cache() is None:
+            self.stdout.write("Кеш карточек выключен (TMAPP_FRAGMENT_CACHE)")
+            return
+        for name, stats in fragments.get_stats().items():
+            self.stdout.write(
+                f"{name}: попаданий {stats['hits']}, промахов {stats['misses']}, "
+                f"доля попаданий {stats['ratio']:.0%}"
+            )
+        if options["reset"]:
+            fragments.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счетчики обнулены"))
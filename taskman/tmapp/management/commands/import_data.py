@@ -0,0 +1,54 @@
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tmapp import importer
+
+FORMATS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class Command(BaseCommand):
+    help = "Загружает задачи, проекты или спринты из CSV или NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(importer.IMPORTERS))
+        parser.add_argument("path")
+        parser.add_argument("--format", dest="fmt", choices=("csv", "ndjson"),
+                            help="По умолчанию - по расширению файла")
+        parser.add_argument("--batch-size", type=int, default=importer.BATCH_SIZE)
+        parser.add_argument("--errors", help="Файл для ошибок (NDJSON)")
+        parser.add_argument("--user", help="Автор записей истории (username)")
+
+    def handle(self, *args, **options):
+        fmt = options["fmt"] or FORMATS.get(os.path.splitext(options["path"])[1])
+        if fmt is None:
+            raise CommandError("Не удалось определить формат, укажите --format")
+
+        user = None
+        if options["user"]:
+            User = get_user_model()
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь не найден: {options['user']}")
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as file:
+            result = importer.import_file(
+                options["kind"], file, fmt,
+                batch_size=options["batch_size"], user=user,
+            )
+
+        self.stdout.write(
+            f"Загружено {result.imported} из {result.read} за "
+            f"{result.seconds:.2f} с ({result.rate:.0f} строк/с)"
+        )
+        if options["errors"]:
+            with open(options["errors"], "w", encoding="utf-8") as file:
+                for error in result.errors:
+                    file.write(json.dumps(error, ensure_ascii=False) + "\n")
+        for error in result.errors[:10]:
+            self.stderr.write(f"Строка {error['line']}: {error['errors']}")
+        if len(result.errors) > 10:
+            self.stderr.write(f"... всего ошибок: {len(result.errors)}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from tmapp.models import ProjectStats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счетчики проектов (ProjectStats)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "project_ids", nargs="*", type=int,
+            help="id проектов, по умолчанию - все проекты",
+        )
+
+    def handle(self, *args, **options):
+        ProjectStats.rebuild(options["project_ids"] or None)
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано проектов: {ProjectStats.objects.count()}")
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tmapp import search
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает полнотекстовый индекс задач"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.index_tasks()
+        self.stdout.write(self.style.SUCCESS("Индекс поиска пересчитан"))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tmapp.notifications import claim_batch, deliver_batch
+
+
+class Command(BaseCommand):
+    help = "Отправляет письма из очереди уведомлений (outbox)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100,
+                            help="Писем за один проход")
+        parser.add_argument("--concurrency", type=int, default=4,
+                            help="Одновременных отправок")
+        parser.add_argument("--max-attempts", type=int, default=5,
+                            help="Попыток до отказа")
+        parser.add_argument("--backoff", type=int, default=60,
+                            help="Задержка перед первым повтором, секунд")
+        parser.add_argument("--loop", action="store_true",
+                            help="Не завершаться, а ждать новые письма")
+        parser.add_argument("--interval", type=float, default=5,
+                            help="Пауза при пустой очереди, секунд")
+
+    def handle(self, *args, **options):
+        while True:
+            notifications = claim_batch(options["batch_size"])
+            sent, failed = deliver_batch(
+                notifications,
+                concurrency=options["concurrency"],
+                max_attempts=options["max_attempts"],
+                backoff=options["backoff"],
+            )
+            if notifications:
+                self.stdout.write(f"Отправлено: {sent}, ошибок: {failed}")
+
+            if len(notifications) < options["batch_size"]:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
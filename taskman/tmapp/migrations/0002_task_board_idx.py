@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['is_complete', '-id'], name='task_board_idx'),
+        ),
+    ]
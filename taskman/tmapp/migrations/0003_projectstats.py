@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0002_task_board_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('project', models.OneToOneField(help_text='Проект', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='tmapp.project')),
+                ('tasks_total', models.IntegerField(default=0, help_text='Задач всего')),
+                ('tasks_complete', models.IntegerField(default=0, help_text='Задач завершено')),
+                ('sprints_total', models.IntegerField(default=0, help_text='Спринтов')),
+            ],
+            options={
+                'verbose_name': 'статистика проекта',
+                'verbose_name_plural': 'статистика проектов',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+def fill_status_paths(apps, schema_editor):
+    """Заполняем пути для уже существующих статусов"""
+    Status = apps.get_model('tmapp', 'Status')
+    parents = dict(Status.objects.values_list('id', 'parent_status_id'))
+    statuses = []
+    for status_id in parents:
+        path_ids = [status_id]
+        parent_id = parents[status_id]
+        while parent_id is not None and parent_id not in path_ids:
+            path_ids.insert(0, parent_id)
+            parent_id = parents.get(parent_id)
+        statuses.append(Status(
+            id=status_id,
+            path=''.join(f'{i:010d}/' for i in path_ids),
+            depth=len(path_ids) - 1,
+        ))
+    Status.objects.bulk_update(statuses, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0003_projectstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='status',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='status',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Путь от корневого статуса', max_length=1024),
+        ),
+        migrations.RunPython(fill_status_paths, migrations.RunPython.noop),
+    ]
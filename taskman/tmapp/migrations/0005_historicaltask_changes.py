@@ -0,0 +1,58 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:12
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+# Поле истории и его колонка
+TASK_HISTORY_FIELDS = (
+    ('name', 'name'),
+    ('content', 'content'),
+    ('is_complete', 'is_complete'),
+    ('status', 'status_id'),
+    ('executor', 'executor_id'),
+    ('project', 'project_id'),
+    ('sprint', 'sprint_id'),
+)
+
+
+def fill_history_changes(apps, schema_editor):
+    """Считаем изменения для уже существующих записей истории"""
+    HistoricalTask = apps.get_model('tmapp', 'HistoricalTask')
+    records = HistoricalTask.objects.order_by(
+        'id', 'history_date', 'history_id'
+    ).only(
+        'history_id', 'id', 'history_type',
+        *(attname for _, attname in TASK_HISTORY_FIELDS)
+    )
+
+    previous = None
+    batch = []
+    for record in records.iterator(chunk_size=2000):
+        if record.history_type == '~' and previous and previous.id == record.id:
+            record.changes = [
+                [name, getattr(previous, attname), getattr(record, attname)]
+                for name, attname in TASK_HISTORY_FIELDS
+                if getattr(previous, attname) != getattr(record, attname)
+            ]
+            batch.append(record)
+        previous = record
+        if len(batch) >= 500:
+            HistoricalTask.objects.bulk_update(batch, ['changes'])
+            batch = []
+    HistoricalTask.objects.bulk_update(batch, ['changes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0004_status_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicaltask',
+            name='changes',
+            field=models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Изменения относительно предыдущей версии'),
+        ),
+        migrations.RunPython(fill_history_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0005_historicaltask_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(help_text='Получатель', max_length=254)),
+                ('subject', models.CharField(help_text='Тема', max_length=200)),
+                ('body', models.TextField(help_text='Текст письма')),
+                ('state', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sending', 'Отправляется'), ('sent', 'Отправлено'), ('failed', 'Не отправлено')], default='pending', help_text='Состояние', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Попыток отправки')),
+                ('last_error', models.TextField(blank=True, help_text='Последняя ошибка')),
+                ('timestamp_create', models.DateTimeField(auto_now_add=True, help_text='Когда создано')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Когда пробовать отправить')),
+                ('timestamp_sent', models.DateTimeField(blank=True, help_text='Когда отправлено', null=True)),
+                ('task', models.ForeignKey(help_text='Задача', on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='tmapp.task')),
+            ],
+            options={
+                'verbose_name': 'уведомление',
+                'verbose_name_plural': 'уведомления',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['state', 'next_attempt_at'], name='notification_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """
+    tsvector с GIN-индексом в PostgreSQL или таблица FTS5 в SQLite.
+    SQL скопирован из tmapp/search.py на момент миграции, чтобы правки
+    модуля не меняли ее. Прежние названия из истории в индекс не
+    попадают - с TMAPP_SEARCH_HISTORY нужна команда rebuild_search_index
+    """
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            config = getattr(settings, "TMAPP_SEARCH_CONFIG", "russian")
+            cursor.execute(
+                "ALTER TABLE tmapp_task ADD COLUMN IF NOT EXISTS search_vector tsvector"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS tmapp_task_search_idx "
+                "ON tmapp_task USING GIN (search_vector)"
+            )
+            cursor.execute(
+                "UPDATE tmapp_task SET search_vector = "
+                "setweight(to_tsvector(%s, name), 'A') || "
+                "setweight(to_tsvector(%s, content), 'B') || "
+                "setweight(to_tsvector(%s, ''), 'C')",
+                [config] * 3,
+            )
+        elif vendor == "sqlite":
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tmapp_task_fts "
+                "USING fts5(name, content, history, tokenize='unicode61')"
+            )
+            cursor.execute(
+                "INSERT INTO tmapp_task_fts (rowid, name, content, history) "
+                "SELECT id, name, content, '' FROM tmapp_task"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS tmapp_task_search_idx")
+            cursor.execute("ALTER TABLE tmapp_task DROP COLUMN IF EXISTS search_vector")
+        elif vendor == "sqlite":
+            cursor.execute("DROP TABLE IF EXISTS tmapp_task_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0006_notification'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tmapp', '0007_task_search'),
+    ]
+
+    operations = [
+        # Сначала составные индексы, потом убираем индексы внешних ключей,
+        # которые они покрывают
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['executor', 'is_complete', 'id'], name='task_executor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'is_complete', 'id'], name='task_project_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['timestamp_create', 'id'], name='task_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='executor',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Исполнитель', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='project',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Проект', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='tmapp.project'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0008_task_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('route', models.CharField(help_text='Шаблон url или путь', max_length=255)),
+                ('method', models.CharField(help_text='HTTP-метод', max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField(help_text='Код ответа')),
+                ('total_ms', models.FloatField(help_text='Время ответа, мс')),
+                ('view_ms', models.FloatField(help_text='Python без SQL и шаблонов, мс')),
+                ('sql_ms', models.FloatField(help_text='Время SQL, мс')),
+                ('slowest_sql_ms', models.FloatField(help_text='Самый долгий запрос, мс')),
+                ('template_ms', models.FloatField(help_text='Рендеринг шаблонов, мс')),
+                ('queries', models.PositiveIntegerField(help_text='SQL-запросов')),
+                ('duplicate_queries', models.PositiveIntegerField(help_text='Повторов одного и того же SQL')),
+                ('timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now, help_text='Время запроса')),
+            ],
+            options={
+                'verbose_name': 'замер запроса',
+                'verbose_name_plural': 'замеры запросов',
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
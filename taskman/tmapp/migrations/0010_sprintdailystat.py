@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0009_requestsample'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SprintDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='День')),
+                ('total_tasks', models.PositiveIntegerField(help_text='Задач в спринте')),
+                ('open_tasks', models.PositiveIntegerField(help_text='Незавершенных задач')),
+                ('sprint', models.ForeignKey(help_text='Спринт', on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='tmapp.sprint')),
+            ],
+            options={
+                'verbose_name': 'итог дня спринта',
+                'verbose_name_plural': 'итоги дней спринтов',
+                'ordering': ['sprint', 'day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sprintdailystat',
+            constraint=models.UniqueConstraint(fields=('sprint', 'day'), name='sprint_daily_stat_unique'),
+        ),
+    ]
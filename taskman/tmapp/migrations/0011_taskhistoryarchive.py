@@ -0,0 +1,34 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0010_sprintdailystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskHistoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.IntegerField(help_text='id задачи')),
+                ('date_from', models.DateTimeField(help_text='Первая запись')),
+                ('date_to', models.DateTimeField(help_text='Последняя запись')),
+                ('revisions', models.PositiveIntegerField(help_text='Записей истории')),
+                ('data', models.BinaryField(help_text='Записи истории, JSON в zlib')),
+                ('timestamp_create', models.DateTimeField(auto_now_add=True, help_text='Когда заархивировано')),
+            ],
+            options={
+                'verbose_name': 'архив истории задачи',
+                'verbose_name_plural': 'архив истории задач',
+                'ordering': ['task_id', 'date_from'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='taskhistoryarchive',
+            index=models.Index(fields=['task_id', 'date_from'], name='history_archive_task_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0011_taskhistoryarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='status',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Статус', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='tmapp.status'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'is_complete', '-id'], name='task_status_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:57
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tmapp', '0012_task_status_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(help_text='Тип события', max_length=20)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Данные события')),
+                ('timestamp_create', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Когда произошло')),
+            ],
+            options={
+                'verbose_name': 'событие задачи',
+                'verbose_name_plural': 'события задач',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,14 +1,77 @@
+import json
 import logging
+import zlib
 
 from django.conf import settings
-from django.db import models
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Avg, Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Substr
 from django.utils import timezone
-from simple_history.models import HistoricalRecords
+from simple_history.models import HistoricalRecords, ModelChange
+
+from .tracking import TrackedFieldsMixin
 
 logger = logging.getLogger(__name__)
 
+# Поля задачи, изменения которых попадают в историю
+TASK_HISTORY_FIELDS = (
+    "name",
+    "content",
+    "is_complete",
+    "status",
+    "executor",
+    "project",
+    "sprint",
+)
+
+
+def get_task_changes(old_values, new_values):
+    """
+    Список изменений [поле, было, стало] между двумя состояниями задачи.
+    Значения - словари по attname, для внешних ключей хранятся id.
+    """
+    changes = []
+    for name in TASK_HISTORY_FIELDS:
+        attname = Task._meta.get_field(name).attname
+        old, new = old_values.get(attname), new_values.get(attname)
+        if old != new:
+            changes.append([name, old, new])
+    return changes
+
+
+class TaskHistoryChanges(models.Model):
+    """Изменения, сохраненные вместе с записью истории задачи"""
+
+    changes = models.JSONField(
+        default=list,
+        blank=True,
+        encoder=DjangoJSONEncoder,
+        help_text="Изменения относительно предыдущей версии",
+    )
+
+    def get_changes(self):
+        return [ModelChange(*change) for change in self.changes]
+
+    class Meta:
+        abstract = True
+
+
+class TaskHistoricalRecords(HistoricalRecords):
+    """
+    История задач. Задачи, удаляемые пачкой (bulk.bulk_delete_tasks,
+    отметка _bulk_deleted), пропускаются - их история пишется одним запросом
+    """
+
+    def post_delete(self, instance, using=None, **kwargs):
+        if getattr(instance, "_bulk_deleted", False):
+            return
+        super().post_delete(instance, using=using, **kwargs)
 
-class Task(models.Model):
+
+class Task(TrackedFieldsMixin, models.Model):
     """Задачи"""
 
     name = models.CharField(max_length=50, help_text="Название")
@@ -20,7 +83,7 @@ class Task(models.Model):
     timestamp_done = models.DateTimeField(
         null=True, blank=True, editable=False, help_text="Когда выполнена"
     )
-    history = HistoricalRecords()
+    history = TaskHistoricalRecords(bases=[TaskHistoryChanges])
 
     status = models.ForeignKey(
         to="tmapp.Status",
@@ -28,6 +91,8 @@ class Task(models.Model):
         related_name="tasks",
         blank=True,
         null=True,
+        # Индекс по внешнему ключу покрывает составной индекс из Meta
+        db_index=False,
         help_text="Статус",
     )
 
@@ -37,6 +102,8 @@ class Task(models.Model):
         related_name="tasks",
         blank=True,
         null=True,
+        # Индекс по внешнему ключу покрывает составной индекс из Meta
+        db_index=False,
         help_text="Исполнитель",
     )
 
@@ -46,6 +113,8 @@ class Task(models.Model):
         related_name="tasks",
         blank=True,
         null=True,
+        # Индекс по внешнему ключу покрывает составной индекс из Meta
+        db_index=False,
         help_text="Проект",
     )
 
@@ -61,37 +130,133 @@ class Task(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs) -> None:
-        """
-        Ставим время окончания, если задача сделана
-        """
-
-        logger.warning(f"Сработало сохранение у модели Task {str(timezone.now())}")
-
+    def update_timestamp_done(self):
+        """Ставим время окончания, если задача сделана"""
         if self.is_complete and self.timestamp_done is None:
             self.timestamp_done = timezone.localtime()
 
         if not self.is_complete and self.timestamp_done:
             self.timestamp_done = None
 
-        if self.pk is not None:
-            orig = Task.objects.get(id=self.id)
-            if orig.status != self.status:
-                if self.executor.email:
-                    ...
-                    # send_mail("Изменился статус задачи",
-                    #     f"У задачи {self.id} поменялся статус на {self.status}",
-                    #     "tessio@list.ru",
-                    #     [f"{self.executor.email}"],
-                    #     fail_silently=True,
-                    # )
+    def save(self, *args, **kwargs) -> None:
+        """
+        Ставим время окончания, если задача сделана
+        """
 
-        return super().save(*args, **kwargs)
+        self.update_timestamp_done()
+
+        old = None
+        status_changed = False
+        changed_fields = None
+        if self.pk is not None:
+            # Объект создан не из базы - берем сохраненные значения
+            if not self.is_tracked:
+                self.load_snapshot()
+            changed_fields = self.changed_fields
+            # Предыдущее состояние для записи изменений в историю
+            self._history_previous = self.get_history_values(previous=True)
+            old = (self.previous("project"), self.previous("is_complete"))
+            status_changed = self.previous("status") != self.status_id
+
+        with transaction.atomic():
+            result = super().save(*args, **kwargs)
+            ProjectStats.track_task(
+                old=old, new=(self.project_id, self.is_complete)
+            )
+            # Письмо о смене статуса отправит команда send_notifications,
+            # запись в outbox попадает в ту же транзакцию, что и задача
+            if status_changed:
+                Notification.enqueue_status_change(self)
+
+        logger.warning(
+            "Сработало сохранение у модели Task %s",
+            self.pk,
+            extra={"task_id": self.pk, "changed_fields": changed_fields},
+        )
+        return result
+
+    def get_history_values(self, previous=False):
+        """Значения отслеживаемых в истории полей, текущие или загруженные"""
+        values = {}
+        for name in TASK_HISTORY_FIELDS:
+            attname = Task._meta.get_field(name).attname
+            values[attname] = (
+                self.previous(attname) if previous else getattr(self, attname)
+            )
+        return values
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProjectStats.track_task(old=(self.project_id, self.is_complete))
+        return result
 
     class Meta:
         verbose_name = "задача"
         verbose_name_plural = "задачи"
         ordering = ["id"]
+        indexes = [
+            # Постраничный вывод доски задач в порядке (is_complete, -id)
+            models.Index(fields=["is_complete", "-id"], name="task_board_idx"),
+            # Фильтры API и доски по исполнителю и проекту (tmapp/filters.py)
+            models.Index(
+                fields=["executor", "is_complete", "id"], name="task_executor_idx"
+            ),
+            models.Index(
+                fields=["project", "is_complete", "id"], name="task_project_idx"
+            ),
+            # Фильтр и сортировка по дате создания
+            models.Index(fields=["timestamp_create", "id"], name="task_created_idx"),
+            # Колонки канбан-доски: задачи статуса в порядке доски
+            # (tmapp/kanban.py)
+            models.Index(
+                fields=["status", "is_complete", "-id"], name="task_status_idx"
+            ),
+        ]
+
+
+def count_by_project(model, **filters):
+    """Подзапрос с количеством связанных с проектом записей"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(project=OuterRef("pk"), **filters)
+            .order_by()
+            .values("project")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+class ProjectQuerySet(models.QuerySet):
+    def with_counts(self):
+        """
+        Количество задач (всего, открытых, завершенных), спринтов
+        и активных спринтов одним запросом.
+        Если включена таблица ProjectStats - счетчики задач и спринтов
+        берем из нее, а не считаем по таблицам задач и спринтов.
+        """
+        if ProjectStats.is_enabled():
+            queryset = self.annotate(
+                tasks_total=Coalesce(F("stats__tasks_total"), 0),
+                tasks_complete=Coalesce(F("stats__tasks_complete"), 0),
+                sprints_total=Coalesce(F("stats__sprints_total"), 0),
+            )
+        else:
+            queryset = self.annotate(
+                tasks_total=count_by_project(Task),
+                tasks_complete=count_by_project(Task, is_complete=True),
+                sprints_total=count_by_project(Sprint),
+            )
+
+        cur_date = timezone.localdate()
+        return queryset.annotate(
+            tasks_open=F("tasks_total") - F("tasks_complete"),
+            active_sprints=count_by_project(
+                Sprint, date_start__lte=cur_date, date_end__gte=cur_date
+            ),
+        )
 
 
 class Project(models.Model):
@@ -107,6 +272,8 @@ class Project(models.Model):
         null=True, blank=True, editable=False, help_text="Когда выполнен"
     )
 
+    objects = ProjectQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -144,12 +311,67 @@ class Sprint(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs) -> None:
+        """
+        Обновляем счетчик спринтов проекта
+        """
+        orig_project_id = None
+        if self.pk is not None and ProjectStats.is_enabled():
+            orig_project_id = (
+                Sprint.objects.filter(pk=self.pk)
+                .values_list("project_id", flat=True)
+                .first()
+            )
+
+        with transaction.atomic():
+            created = self._state.adding
+            result = super().save(*args, **kwargs)
+            if created:
+                ProjectStats.change(self.project_id, sprints_total=1)
+            elif orig_project_id and orig_project_id != self.project_id:
+                ProjectStats.change(orig_project_id, sprints_total=-1)
+                ProjectStats.change(self.project_id, sprints_total=1)
+        return result
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            ProjectStats.change(self.project_id, sprints_total=-1)
+        return result
+
     @property
     def is_active(self):
         lcdt = timezone.localdate()
         return self.date_start <= lcdt and lcdt <= self.date_end
 
 
+class SprintDailyStat(models.Model):
+    """
+    Задачи спринта на конец прошедшего дня (tmapp/analytics.py).
+    Прошедшие дни уже не меняются, поэтому считаются один раз
+    """
+
+    sprint = models.ForeignKey(
+        to="tmapp.Sprint",
+        on_delete=models.CASCADE,
+        related_name="daily_stats",
+        help_text="Спринт",
+    )
+    day = models.DateField(help_text="День")
+    total_tasks = models.PositiveIntegerField(help_text="Задач в спринте")
+    open_tasks = models.PositiveIntegerField(help_text="Незавершенных задач")
+
+    class Meta:
+        verbose_name = "итог дня спринта"
+        verbose_name_plural = "итоги дней спринтов"
+        ordering = ["sprint", "day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sprint", "day"], name="sprint_daily_stat_unique"
+            ),
+        ]
+
+
 class Status(models.Model):
     """Статус задачи"""
 
@@ -167,21 +389,143 @@ class Status(models.Model):
         help_text="Родительский статус",
     )
 
+    # Материализованный путь от корня, например "0000000001/0000000005/".
+    # id дополняем нулями, чтобы сортировка по пути давала порядок дерева
+    path = models.CharField(
+        max_length=1024,
+        db_index=True,
+        editable=False,
+        default="",
+        help_text="Путь от корневого статуса",
+    )
+    depth = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Уровень вложенности"
+    )
+
+    @staticmethod
+    def path_segment(status_id):
+        return f"{status_id:010d}/"
+
+    def get_path_ids(self):
+        """id статусов от корня до текущего включительно"""
+        return [int(segment) for segment in self.path.split("/") if segment]
+
+    def is_cycle(self, parent):
+        """Родитель - сам статус или его потомок"""
+        if parent is None or self.pk is None:
+            return False
+        return self.pk in parent.get_path_ids() or parent.pk == self.pk
+
+    def check_parent(self, parent):
+        """Родитель не может быть самим статусом или его потомком"""
+        if self.is_cycle(parent):
+            raise ValidationError("Статус не может быть вложен сам в себя!")
+
+    def clean(self):
+        super().clean()
+        if self.parent_status_id is not None:
+            parent = Status.objects.only("id", "path").get(pk=self.parent_status_id)
+            try:
+                self.check_parent(parent)
+            except ValidationError as error:
+                raise ValidationError({"parent_status": error.messages})
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Пересчитываем путь статуса и всех его потомков.
+        Проверка родителя для пользователя - в clean(), здесь только
+        защита дерева от цикла
+        """
+        parent_path = ""
+        if self.parent_status_id is not None:
+            parent = Status.objects.only("id", "path").get(pk=self.parent_status_id)
+            if self.is_cycle(parent):
+                raise ValueError(
+                    f"Статус {self.pk} не может быть вложен в свой подстатус {parent.pk}"
+                )
+            parent_path = parent.path
+
+        with transaction.atomic():
+            if self.pk is None:
+                result = super().save(*args, **kwargs)
+                self.path = parent_path + self.path_segment(self.pk)
+                self.depth = self.path.count("/") - 1
+                Status.objects.filter(pk=self.pk).update(
+                    path=self.path, depth=self.depth
+                )
+                return result
+
+            old_path = (
+                Status.objects.filter(pk=self.pk)
+                .values_list("path", flat=True)
+                .first()
+            )
+            self.path = parent_path + self.path_segment(self.pk)
+            self.depth = self.path.count("/") - 1
+            result = super().save(*args, **kwargs)
+
+            if old_path and old_path != self.path:
+                # Переносим поддерево одним запросом
+                Status.objects.filter(path__startswith=old_path).exclude(
+                    pk=self.pk
+                ).update(
+                    path=Concat(Value(self.path), Substr("path", len(old_path) + 1)),
+                    depth=F("depth") + (self.depth - old_path.count("/") + 1),
+                )
+        return result
+
+    def delete(self, *args, **kwargs):
+        """Дочерние статусы становятся корневыми"""
+        with transaction.atomic():
+            for child in self.substatus.all():
+                child.parent_status = None
+                child.save()
+            return super().delete(*args, **kwargs)
+
     def get_relative_name(self):
         """Вычисляемое поле для вывода древовидной структуры"""
-        str = self.name
-        parent_status_obj = self.parent_status
-        while parent_status_obj is not None:
-            str = "---" + str
-            parent_status_obj = parent_status_obj.parent_status
-        return str
+        return "---" * self.depth + self.name
 
     def get_parent_id(self):
         """id корневого элемента"""
-        parent_status_obj = self
-        while parent_status_obj.parent_status is not None:
-            parent_status_obj = parent_status_obj.parent_status
-        return parent_status_obj.id
+        path_ids = self.get_path_ids()
+        return path_ids[0] if path_ids else self.id
+
+    def get_root(self):
+        """Корневой статус"""
+        return Status.objects.get(pk=self.get_parent_id())
+
+    def get_ancestors(self):
+        """Родительские статусы, начиная с корневого"""
+        return Status.objects.filter(pk__in=self.get_path_ids()[:-1]).order_by("path")
+
+    def get_descendants(self):
+        """Все вложенные статусы в порядке дерева"""
+        return (
+            Status.objects.filter(path__startswith=self.path)
+            .exclude(pk=self.pk)
+            .order_by("path")
+        )
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Пересчитываем пути всех статусов, например после массового удаления"""
+        parents = dict(cls.objects.values_list("id", "parent_status_id"))
+        statuses = []
+        for status_id in parents:
+            path_ids = [status_id]
+            parent_id = parents[status_id]
+            while parent_id is not None and parent_id not in path_ids:
+                path_ids.insert(0, parent_id)
+                parent_id = parents.get(parent_id)
+            statuses.append(
+                cls(
+                    id=status_id,
+                    path="".join(cls.path_segment(i) for i in path_ids),
+                    depth=len(path_ids) - 1,
+                )
+            )
+        cls.objects.bulk_update(statuses, ["path", "depth"], batch_size=500)
 
     class Meta:
         verbose_name = "статус"
@@ -190,3 +534,300 @@ class Status(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ProjectStats(models.Model):
+    """
+    Денормализованные счетчики проекта для обзора проектов.
+    Включается настройкой TMAPP_PROJECT_STATS, обновляется при сохранении
+    и удалении задач и спринтов. Пересчитать заново - rebuild_project_stats.
+    """
+
+    project = models.OneToOneField(
+        to="tmapp.Project",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        help_text="Проект",
+    )
+    tasks_total = models.IntegerField(default=0, help_text="Задач всего")
+    tasks_complete = models.IntegerField(default=0, help_text="Задач завершено")
+    sprints_total = models.IntegerField(default=0, help_text="Спринтов")
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, "TMAPP_PROJECT_STATS", False)
+
+    @classmethod
+    def change(cls, project_id, **deltas):
+        """Сдвигаем счетчики проекта, например change(1, tasks_total=1)"""
+        if project_id is None or not cls.is_enabled():
+            return
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updated = cls.objects.filter(project_id=project_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+        if not updated:
+            # Строки еще нет - считаем проект целиком
+            cls.rebuild([project_id])
+
+    @classmethod
+    def track_task(cls, old=None, new=None):
+        """
+        Учитываем изменение задачи.
+        old и new - пары (project_id, is_complete) до и после изменения,
+        None для новой или удаленной задачи.
+        """
+        changes = {}
+        for pair, sign in ((old, -1), (new, 1)):
+            if pair is None:
+                continue
+            project_id, is_complete = pair
+            total, complete = changes.get(project_id, (0, 0))
+            changes[project_id] = (total + sign, complete + sign * int(is_complete))
+
+        for project_id, (total, complete) in changes.items():
+            cls.change(project_id, tasks_total=total, tasks_complete=complete)
+
+    @classmethod
+    def rebuild(cls, project_ids=None):
+        """Пересчитываем счетчики по таблицам задач и спринтов"""
+        projects = Project.objects.annotate(
+            count_tasks=count_by_project(Task),
+            count_complete=count_by_project(Task, is_complete=True),
+            count_sprints=count_by_project(Sprint),
+        ).values_list("id", "count_tasks", "count_complete", "count_sprints")
+        if project_ids is not None:
+            projects = projects.filter(id__in=project_ids)
+
+        with transaction.atomic():
+            for project_id, tasks_total, tasks_complete, sprints_total in projects:
+                cls.objects.update_or_create(
+                    project_id=project_id,
+                    defaults={
+                        "tasks_total": tasks_total,
+                        "tasks_complete": tasks_complete,
+                        "sprints_total": sprints_total,
+                    },
+                )
+
+    class Meta:
+        verbose_name = "статистика проекта"
+        verbose_name_plural = "статистика проектов"
+
+
+class Notification(models.Model):
+    """
+    Исходящие письма (outbox).
+    Записи создаются в транзакции сохранения задачи,
+    отправляет их команда send_notifications.
+    """
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATES = [
+        (PENDING, "Ожидает отправки"),
+        (SENDING, "Отправляется"),
+        (SENT, "Отправлено"),
+        (FAILED, "Не отправлено"),
+    ]
+
+    task = models.ForeignKey(
+        to="tmapp.Task",
+        on_delete=models.CASCADE,
+        related_name="notifications",
+        help_text="Задача",
+    )
+    recipient = models.EmailField(help_text="Получатель")
+    subject = models.CharField(max_length=200, help_text="Тема")
+    body = models.TextField(help_text="Текст письма")
+    state = models.CharField(
+        max_length=10, choices=STATES, default=PENDING, help_text="Состояние"
+    )
+    attempts = models.PositiveIntegerField(default=0, help_text="Попыток отправки")
+    last_error = models.TextField(blank=True, help_text="Последняя ошибка")
+    timestamp_create = models.DateTimeField(auto_now_add=True, help_text="Когда создано")
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now, help_text="Когда пробовать отправить"
+    )
+    timestamp_sent = models.DateTimeField(
+        null=True, blank=True, help_text="Когда отправлено"
+    )
+
+    def __str__(self):
+        return f"{self.recipient}: {self.subject}"
+
+    @classmethod
+    def enqueue_status_change(cls, task):
+        cls.enqueue_status_changes([task])
+
+    @classmethod
+    def enqueue_status_changes(cls, tasks):
+        """
+        Письма исполнителям о смене статуса.
+        Если по задаче уже ждет неотправленное письмо - обновляем его,
+        чтобы несколько смен статуса подряд дали одно письмо.
+        """
+        tasks = [task for task in tasks if task.executor_id]
+        if not tasks:
+            return
+
+        emails = dict(
+            get_user_model()
+            .objects.filter(id__in={task.executor_id for task in tasks})
+            .exclude(email="")
+            .values_list("id", "email")
+        )
+        statuses = Status.objects.in_bulk(
+            {task.status_id for task in tasks if task.status_id}
+        )
+        pending = {
+            (notification.task_id, notification.recipient): notification
+            for notification in cls.objects.filter(
+                task__in=[task.pk for task in tasks],
+                state=cls.PENDING,
+                attempts=0,
+            )
+        }
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for task in tasks:
+            recipient = emails.get(task.executor_id)
+            if not recipient:
+                continue
+            body = (
+                f"У задачи {task.id} поменялся статус на "
+                f"{statuses.get(task.status_id)}"
+            )
+            notification = pending.get((task.pk, recipient))
+            if notification is None:
+                notification = cls(
+                    task_id=task.pk,
+                    recipient=recipient,
+                    subject="Изменился статус задачи",
+                    body=body,
+                )
+                pending[(task.pk, recipient)] = notification
+                to_create.append(notification)
+            else:
+                notification.body = body
+                notification.next_attempt_at = now
+                if notification.pk is not None:
+                    to_update.append(notification)
+
+        cls.objects.bulk_create(to_create)
+        cls.objects.bulk_update(to_update, ["body", "next_attempt_at"])
+
+    class Meta:
+        verbose_name = "уведомление"
+        verbose_name_plural = "уведомления"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["state", "next_attempt_at"], name="notification_queue_idx"),
+        ]
+
+
+class RequestSample(models.Model):
+    """Замер одного запроса, записанный middleware tmapp.perf"""
+
+    route = models.CharField(max_length=255, help_text="Шаблон url или путь")
+    method = models.CharField(max_length=10, help_text="HTTP-метод")
+    status_code = models.PositiveSmallIntegerField(help_text="Код ответа")
+    total_ms = models.FloatField(help_text="Время ответа, мс")
+    view_ms = models.FloatField(help_text="Python без SQL и шаблонов, мс")
+    sql_ms = models.FloatField(help_text="Время SQL, мс")
+    slowest_sql_ms = models.FloatField(help_text="Самый долгий запрос, мс")
+    template_ms = models.FloatField(help_text="Рендеринг шаблонов, мс")
+    queries = models.PositiveIntegerField(help_text="SQL-запросов")
+    duplicate_queries = models.PositiveIntegerField(
+        help_text="Повторов одного и того же SQL"
+    )
+    timestamp = models.DateTimeField(
+        default=timezone.now, db_index=True, help_text="Время запроса"
+    )
+
+    def __str__(self):
+        return f"{self.method} {self.route} {self.total_ms:.0f} мс"
+
+    @classmethod
+    def slowest_endpoints(cls, since=None, limit=20):
+        """Сводка по адресам, самые медленные в среднем - первыми"""
+        samples = cls.objects.all()
+        if since is not None:
+            samples = samples.filter(timestamp__gte=since)
+        return (
+            samples.values("route", "method")
+            .annotate(
+                requests=Count("id"),
+                avg_ms=Avg("total_ms"),
+                max_ms=Max("total_ms"),
+                avg_sql_ms=Avg("sql_ms"),
+                avg_template_ms=Avg("template_ms"),
+                avg_queries=Avg("queries"),
+                max_duplicates=Max("duplicate_queries"),
+            )
+            .order_by("-avg_ms")[:limit]
+        )
+
+    class Meta:
+        verbose_name = "замер запроса"
+        verbose_name_plural = "замеры запросов"
+        ordering = ["-timestamp"]
+
+
+class TaskHistoryArchive(models.Model):
+    """
+    Старые записи истории одной задачи, сжатые в один объект
+    (команда compact_history, tmapp/history.py)
+    """
+
+    task_id = models.IntegerField(help_text="id задачи")
+    date_from = models.DateTimeField(help_text="Первая запись")
+    date_to = models.DateTimeField(help_text="Последняя запись")
+    revisions = models.PositiveIntegerField(help_text="Записей истории")
+    data = models.BinaryField(help_text="Записи истории, JSON в zlib")
+    timestamp_create = models.DateTimeField(
+        auto_now_add=True, help_text="Когда заархивировано"
+    )
+
+    def __str__(self):
+        return f"{self.task_id}: {self.revisions} записей"
+
+    def get_rows(self):
+        """Записи истории - словари значений полей HistoricalTask"""
+        return json.loads(zlib.decompress(self.data))
+
+    class Meta:
+        verbose_name = "архив истории задачи"
+        verbose_name_plural = "архив истории задач"
+        ordering = ["task_id", "date_from"]
+        indexes = [
+            models.Index(fields=["task_id", "date_from"], name="history_archive_task_idx"),
+        ]
+
+
+class TaskEvent(models.Model):
+    """
+    Журнал событий задач для потока на страницах (tmapp/events.py,
+    DatabaseBroker): общий для всех воркеров, хранится
+    TMAPP_EVENTS_RETENTION секунд
+    """
+
+    event_type = models.CharField(max_length=20, help_text="Тип события")
+    data = models.JSONField(encoder=DjangoJSONEncoder, help_text="Данные события")
+    timestamp_create = models.DateTimeField(
+        auto_now_add=True, db_index=True, help_text="Когда произошло"
+    )
+
+    def __str__(self):
+        return f"{self.pk}: {self.event_type}"
+
+    class Meta:
+        verbose_name = "событие задачи"
+        verbose_name_plural = "события задач"
+        ordering = ["id"]
@@ -0,0 +1,117 @@
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+
+# Сколько секунд запись принадлежит взявшему ее обработчику.
+# Если обработчик упал, по истечении срока запись заберет другой
+LEASE_SECONDS = 300
+
+
+def claim_batch(batch_size):
+    """
+    Забираем пачку писем на отправку.
+    На PostgreSQL параллельные обработчики пропускают чужие записи
+    (SKIP LOCKED), поэтому одно письмо не уйдет дважды.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(state=Notification.PENDING) | Q(state=Notification.SENDING),
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        Notification.objects.filter(id__in=ids).update(
+            state=Notification.SENDING,
+            next_attempt_at=now + datetime.timedelta(seconds=LEASE_SECONDS),
+        )
+    return list(Notification.objects.filter(id__in=ids))
+
+
+def send_one(notification, connection):
+    """Отправка одного письма, возвращает текст ошибки или None"""
+    try:
+        # Открытое соединение open() не трогает, после ошибки открывает заново
+        connection.open()
+        EmailMessage(
+            notification.subject,
+            notification.body,
+            settings.DEFAULT_FROM_EMAIL,
+            [notification.recipient],
+            connection=connection,
+        ).send()
+    except Exception as error:
+        # Соединение после ошибки могло остаться разорванным
+        try:
+            connection.close()
+        except Exception:
+            pass
+        return f"{type(error).__name__}: {error}"
+    return None
+
+
+def send_chunk(notifications):
+    """Письма одного потока через одно SMTP-соединение, ошибки по письмам"""
+    connection = get_connection()
+    try:
+        return [send_one(notification, connection) for notification in notifications]
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def deliver_batch(notifications, concurrency=4, max_attempts=5, backoff=60):
+    """
+    Отправляем письма в несколько потоков, результат пишем в базу.
+    Неудачную отправку повторяем с экспоненциальной задержкой,
+    после max_attempts попыток письмо помечается как неотправленное.
+    Возвращает пару (отправлено, ошибок).
+    """
+    if not notifications:
+        return 0, 0
+
+    # Каждый поток отправляет свою часть пачки через одно соединение
+    size = -(-len(notifications) // concurrency)
+    chunks = [
+        notifications[start:start + size]
+        for start in range(0, len(notifications), size)
+    ]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        errors = [error for chunk in executor.map(send_chunk, chunks) for error in chunk]
+
+    sent = failed = 0
+    now = timezone.now()
+    for notification, error in zip(notifications, errors):
+        notification.attempts += 1
+        if error is None:
+            notification.state = Notification.SENT
+            notification.timestamp_sent = now
+            notification.last_error = ""
+            sent += 1
+        else:
+            notification.last_error = error
+            if notification.attempts >= max_attempts:
+                notification.state = Notification.FAILED
+            else:
+                notification.state = Notification.PENDING
+                delay = backoff * 2 ** (notification.attempts - 1)
+                notification.next_attempt_at = now + datetime.timedelta(seconds=delay)
+            failed += 1
+
+    Notification.objects.bulk_update(
+        notifications,
+        ["state", "attempts", "last_error", "next_attempt_at", "timestamp_sent"],
+    )
+    return sent, failed
@@ -0,0 +1,92 @@
+import re
+
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+TASK_PAGE_SIZE = 40
+
+
+class KeysetPage:
+    """Страница задач, полученная "поиском" по ключу (is_complete, -id)"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def encode_task_cursor(task):
+    """Курсор - ключ последней задачи на странице, например '0-125'"""
+    return f'{int(task.is_complete)}-{task.id}'
+
+
+def decode_task_cursor(cursor):
+    """Разбираем курсор, некорректный курсор означает первую страницу"""
+    match = re.fullmatch('([01])-([0-9]+)', cursor or '')
+    if match is None:
+        return None
+    return bool(int(match[1])), int(match[2])
+
+
+def keyset_queryset(queryset, cursor, per_page=TASK_PAGE_SIZE):
+    """
+    Выборка страницы задач в порядке (is_complete, -id).
+
+    Вместо OFFSET продолжаем с места, где закончилась предыдущая страница,
+    поэтому стоимость запроса не зависит от номера страницы.
+    Берем на одну запись больше, чтобы понять, есть ли следующая страница.
+    """
+
+    queryset = queryset.order_by('is_complete', '-id')
+
+    key = decode_task_cursor(cursor)
+    if key is not None:
+        is_complete, last_id = key
+        queryset = queryset.filter(
+            Q(is_complete=is_complete, id__lt=last_id)
+            | Q(is_complete__gt=is_complete)
+        )
+
+    return queryset[:per_page + 1]
+
+
+def keyset_page(tasks, per_page=TASK_PAGE_SIZE):
+    """Страница из задач, выбранных keyset_queryset"""
+    next_cursor = None
+    if len(tasks) > per_page:
+        tasks = tasks[:per_page]
+        next_cursor = encode_task_cursor(tasks[-1])
+
+    return KeysetPage(tasks, next_cursor)
+
+
+def keyset_paginate_tasks(queryset, cursor, per_page=TASK_PAGE_SIZE):
+    """Постраничная выборка задач, см. keyset_queryset"""
+    return keyset_page(list(keyset_queryset(queryset, cursor, per_page)), per_page)
+
+
+async def akeyset_paginate_tasks(queryset, cursor, per_page=TASK_PAGE_SIZE):
+    """То же для асинхронных вьюх"""
+    tasks = [task async for task in keyset_queryset(queryset, cursor, per_page)]
+    return keyset_page(tasks, per_page)
+
+
+class ApiCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация для API: без COUNT(*) и OFFSET,
+    следующая страница продолжает выборку с последнего id.
+    Размер страницы задает клиент (?page_size=), но не больше max_page_size.
+    """
+
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,213 @@
+"""
+Замеры отдельных запросов: SQL, шаблоны и остальной Python.
+
+RequestTimingMiddleware включается settings.TMAPP_PERF_ENABLED и меряет
+долю запросов TMAPP_PERF_SAMPLE_RATE, а также любой запрос сотрудника
+(is_staff) с заголовком X-Perf: 1 или параметром ?_perf=1.
+Результат - заголовок Server-Timing (виден в инструментах браузера),
+запись в лог tmapp.perf (JSON lines) и строка RequestSample, из которых
+в админке строится отчет о самых медленных адресах.
+"""
+
+import contextvars
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+
+from .models import RequestSample
+
+logger = logging.getLogger("tmapp.perf")
+
+# Замер текущего запроса, его дополняют обертки SQL и шаблонов
+current_recorder = contextvars.ContextVar("tmapp_perf_recorder", default=None)
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+class RequestRecorder:
+    """Запросы к базе и время рендеринга шаблонов за один HTTP-запрос"""
+
+    def __init__(self):
+        self.queries = []
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, elapsed_ms(start)))
+
+    @property
+    def sql_ms(self):
+        return sum(duration for _, duration in self.queries)
+
+    @property
+    def slowest_sql_ms(self):
+        return max((duration for _, duration in self.queries), default=0.0)
+
+    @property
+    def duplicate_queries(self):
+        """
+        Повторы одного и того же SQL (параметры не учитываются) -
+        обычно это запросы в цикле, N+1
+        """
+        counts = Counter(sql for sql, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+
+def instrument_templates():
+    """
+    Оборачиваем рендеринг шаблонов Django: штатного сигнала с временем
+    рендеринга нет (template_rendered отправляется только в тестах).
+    Вложенные шаблоны не считаются повторно.
+    """
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, "tmapp_perf", False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, context=None, request=None):
+        recorder = current_recorder.get()
+        if recorder is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        recorder.template_depth += 1
+        try:
+            return original(self, context, request)
+        finally:
+            recorder.template_depth -= 1
+            if recorder.template_depth == 0:
+                recorder.template_ms += elapsed_ms(start)
+
+    render.tmapp_perf = True
+    Template.render = render
+
+
+def server_timing(timing):
+    """Значение заголовка Server-Timing"""
+    return ", ".join([
+        f'sql;dur={timing["sql_ms"]:.1f};desc="{timing["queries"]} queries, '
+        f'{timing["duplicate_queries"]} duplicates"',
+        f'sql-max;dur={timing["slowest_sql_ms"]:.1f}',
+        f'tpl;dur={timing["template_ms"]:.1f}',
+        f'view;dur={timing["view_ms"]:.1f}',
+        f'total;dur={timing["total_ms"]:.1f}',
+    ])
+
+
+class RequestTimingMiddleware:
+    """
+    Ставится после AuthenticationMiddleware:
+    принудительный замер доступен только сотрудникам.
+    Работает и под ASGI, не заставляя асинхронные вьюхи становиться
+    синхронными.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        instrument_templates()
+
+    def is_enabled(self):
+        return getattr(settings, "TMAPP_PERF_ENABLED", False)
+
+    def should_measure(self, request):
+        if not self.is_enabled():
+            return False
+        forced = (
+            request.headers.get("X-Perf") == "1" or request.GET.get("_perf") == "1"
+        )
+        user = getattr(request, "user", None)
+        if forced and user is not None and user.is_staff:
+            return True
+        return random.random() < getattr(settings, "TMAPP_PERF_SAMPLE_RATE", 0.01)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        if not self.should_measure(request):
+            return self.get_response(request)
+
+        recorder = RequestRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                wrap_connections(stack, recorder)
+                response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder, elapsed_ms(start))
+
+    async def __acall__(self, request):
+        if not self.is_enabled() or not await sync_to_async(self.should_measure)(request):
+            return await self.get_response(request)
+
+        # Запросы асинхронного ORM выполняются в потоке, общем для всех
+        # sync_to_async одного HTTP-запроса, - обертки ставим там же
+        recorder = RequestRecorder()
+        token = current_recorder.set(recorder)
+        stack = ExitStack()
+        start = time.perf_counter()
+        try:
+            await sync_to_async(wrap_connections)(stack, recorder)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_recorder.reset(token)
+        total_ms = elapsed_ms(start)
+        return await sync_to_async(self.finish)(request, response, recorder, total_ms)
+
+    def finish(self, request, response, recorder, total_ms):
+        timing = {
+            "total_ms": total_ms,
+            "sql_ms": recorder.sql_ms,
+            "slowest_sql_ms": recorder.slowest_sql_ms,
+            "template_ms": recorder.template_ms,
+            "view_ms": max(0.0, total_ms - recorder.sql_ms - recorder.template_ms),
+            "queries": len(recorder.queries),
+            "duplicate_queries": recorder.duplicate_queries,
+        }
+        response["Server-Timing"] = server_timing(timing)
+
+        match = request.resolver_match
+        route = match.route if match is not None and match.route else request.path
+        logger.info(
+            "%s %s %.1f мс, SQL: %s",
+            request.method, route, total_ms, timing["queries"],
+            extra={"route": route, "method": request.method,
+                   "status_code": response.status_code, **timing},
+        )
+        RequestSample.objects.create(
+            route=route[:255],
+            method=request.method,
+            status_code=response.status_code,
+            **timing,
+        )
+        return response
+
+
+def wrap_connections(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
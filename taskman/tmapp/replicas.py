@@ -0,0 +1,220 @@
+"""
+Чтение с реплик базы данных.
+
+ReplicaRoutingMiddleware отмечает запросы на чтение (GET, HEAD, OPTIONS),
+и ReplicaRouter отправляет их SELECT на одну из реплик из
+settings.TMAPP_READ_REPLICAS. Запись и все запросы вне HTTP (команды,
+фоновые задачи) идут в основную базу 'default'.
+
+После изменяющего запроса клиент TMAPP_REPLICA_PIN_SECONDS секунд читает
+из основной базы (cookie), чтобы сразу видеть свои изменения, пока они
+не дошли до реплики. Реплики периодически проверяются (раз в
+TMAPP_REPLICA_CHECK_INTERVAL секунд): недоступная или отставшая больше
+TMAPP_REPLICA_MAX_LAG секунд реплика пропускается, если подходящих
+реплик нет - читаем из основной базы.
+
+Метки версий (tmapp/versions.py) обновляются сразу после коммита, а до
+реплики изменение доходит позже. Если метки страницы моложе
+TMAPP_REPLICA_MAX_LAG, страница читается из основной базы (conditional),
+а карточки не сохраняются в кеш (tmapp/fragments.py) - иначе устаревшие
+данные попали бы под новый ETag или ключ кеша.
+"""
+
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+PIN_COOKIE = "tmapp_primary"
+
+# Текущий запрос можно читать с реплики
+read_from_replica = contextvars.ContextVar("tmapp_read_from_replica", default=False)
+
+
+def get_replicas():
+    return getattr(settings, "TMAPP_READ_REPLICAS", [])
+
+
+def get_pin_seconds():
+    return getattr(settings, "TMAPP_REPLICA_PIN_SECONDS", 5)
+
+
+def get_max_lag():
+    return getattr(settings, "TMAPP_REPLICA_MAX_LAG", 30)
+
+
+class ReplicaHealth:
+    """Состояние реплик, проверка не чаще раза в интервал на процесс"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked = {}
+        self.healthy = {}
+
+    def reset(self):
+        with self.lock:
+            self.checked.clear()
+            self.healthy.clear()
+
+    def mark(self, alias, healthy):
+        with self.lock:
+            if self.healthy.get(alias, True) != healthy:
+                if healthy:
+                    logger.warning("Реплика %s снова доступна", alias)
+                else:
+                    logger.warning("Реплика %s недоступна, чтение идет мимо нее", alias)
+            self.healthy[alias] = healthy
+            self.checked[alias] = time.monotonic()
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, "TMAPP_REPLICA_CHECK_INTERVAL", 10)
+        checked = self.checked.get(alias)
+        if checked is None or time.monotonic() - checked > interval:
+            self.mark(alias, check_replica(alias))
+        return self.healthy[alias]
+
+
+def replica_lag(connection):
+    """Отставание реплики в секундах, None - не известно"""
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_is_in_recovery() THEN "
+            "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        lag = cursor.fetchone()[0]
+    return float(lag) if lag is not None else None
+
+
+def check_replica(alias):
+    try:
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        lag = replica_lag(connection)
+    except Exception:
+        logger.exception("Ошибка проверки реплики %s", alias)
+        try:
+            connections[alias].close()
+        except Exception:
+            pass
+        return False
+    return lag is None or lag <= get_max_lag()
+
+
+health = ReplicaHealth()
+
+# Реплики выбираются по очереди
+counter = itertools.count()
+
+
+def choose_replica():
+    """Следующая доступная реплика, None - читать из основной базы"""
+    replicas = get_replicas()
+    if not replicas:
+        return None
+    start = next(counter)
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if health.is_healthy(alias):
+            return alias
+    return None
+
+
+def may_be_stale(*stamps):
+    """
+    Чтение с реплики в этом запросе может не видеть изменений
+    с такими метками версий (время изменения)
+    """
+    if not read_from_replica.get() or not get_replicas():
+        return False
+    return max(stamps, default=0) > time.time() - get_max_lag()
+
+
+def use_primary():
+    """Дальше текущий запрос читает из основной базы"""
+    read_from_replica.set(False)
+
+
+class ReplicaRouter:
+    """Подключается в settings.DATABASE_ROUTERS"""
+
+    def db_for_read(self, model, **hints):
+        if not read_from_replica.get():
+            return None
+        # Запрос на чтение, который что-то записал в транзакции,
+        # дальше читает оттуда же
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему репликацией
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Ставится первым: сессия и пользователь тоже читаются с реплики.
+    Работает и под ASGI - contextvar виден в потоках sync_to_async
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def use_replica(self, request):
+        return request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+
+    def pin(self, request, response):
+        """После изменений читаем из основной базы"""
+        if request.method not in SAFE_METHODS and get_replicas():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=get_pin_seconds(),
+                httponly=True, samesite="Lax",
+            )
+        return response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = read_from_replica.set(self.use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = read_from_replica.set(self.use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        return self.pin(request, response)
@@ -0,0 +1,207 @@
+"""
+Полнотекстовый поиск по задачам.
+
+PostgreSQL: колонка tmapp_task.search_vector (tsvector) с GIN-индексом,
+словарь settings.TMAPP_SEARCH_CONFIG (по умолчанию russian - со стеммингом).
+SQLite: виртуальная таблица FTS5 tmapp_task_fts, rowid = id задачи;
+стемминга нет, слова ищутся по префиксу.
+Если settings.TMAPP_SEARCH_HISTORY включен, в индекс попадают и прежние
+названия и описания задачи из истории (с меньшим весом).
+
+Индекс обновляется на сохранение и удаление задачи (tmapp/signals.py),
+массовые операции обновляют его сами. Схему создает миграция 0007,
+полностью пересчитать индекс - команда rebuild_search_index.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Task
+
+SEARCH_PAGE_SIZE = 20
+
+# Сколько id задач обновляем одним запросом
+INDEX_BATCH_SIZE = 500
+
+FTS_TABLE = "tmapp_task_fts"
+
+
+def get_config():
+    return getattr(settings, "TMAPP_SEARCH_CONFIG", "russian")
+
+
+def history_enabled():
+    return getattr(settings, "TMAPP_SEARCH_HISTORY", False)
+
+
+def get_backend(conn=None):
+    """postgresql, sqlite или None - тогда поиск через LIKE без индекса"""
+    vendor = (conn or connection).vendor
+    return vendor if vendor in ("postgresql", "sqlite") else None
+
+
+def history_sql(conn):
+    """Прежние названия и описания задачи одной строкой"""
+    if not history_enabled():
+        return "''"
+    if get_backend(conn) == "postgresql":
+        aggregate = "string_agg(DISTINCT h.name || ' ' || h.content, ' ')"
+    else:
+        aggregate = "group_concat(DISTINCT h.name || ' ' || h.content)"
+    return (
+        f"COALESCE((SELECT {aggregate} FROM tmapp_historicaltask h "
+        "WHERE h.id = tmapp_task.id), '')"
+    )
+
+
+def batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), INDEX_BATCH_SIZE):
+        yield ids[start:start + INDEX_BATCH_SIZE]
+
+
+def index_tasks(ids=None, conn=None, created=False):
+    """
+    Пересчитываем индекс для задач с перечисленными id, None - для всех.
+    created - задачи только что созданы, старых записей в индексе у них нет
+    """
+    conn = conn or connection
+    backend = get_backend(conn)
+    if backend is None:
+        return
+
+    if ids is None:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM tmapp_task")
+            ids = [row[0] for row in cursor.fetchall()]
+        if backend == "sqlite":
+            with conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    history = history_sql(conn)
+    with conn.cursor() as cursor:
+        for batch in batches(ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            if backend == "postgresql":
+                cursor.execute(
+                    "UPDATE tmapp_task SET search_vector = "
+                    "setweight(to_tsvector(%s, name), 'A') || "
+                    "setweight(to_tsvector(%s, content), 'B') || "
+                    f"setweight(to_tsvector(%s, {history}), 'C') "
+                    f"WHERE id IN ({placeholders})",
+                    [get_config()] * 3 + batch,
+                )
+            else:
+                if not created:
+                    cursor.execute(
+                        f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})",
+                        batch,
+                    )
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, name, content, history) "
+                    f"SELECT id, name, content, {history} FROM tmapp_task "
+                    f"WHERE id IN ({placeholders})",
+                    batch,
+                )
+
+
+def remove_tasks(ids, conn=None):
+    """Удаленные задачи убираем из индекса (в PostgreSQL уходят вместе со строкой)"""
+    conn = conn or connection
+    if get_backend(conn) != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for batch in batches(ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch
+            )
+
+
+def fts_query(query):
+    """Запрос пользователя для FTS5: все слова, каждое по префиксу"""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+
+def filter_search(queryset, query):
+    """Задачи, подходящие под запрос, с релевантностью в rank"""
+    backend = get_backend()
+
+    if backend == "postgresql":
+        tsquery = "websearch_to_tsquery(%s, %s)"
+        params = [get_config(), query]
+        return queryset.filter(
+            RawSQL(
+                f"tmapp_task.search_vector @@ {tsquery}",
+                params,
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            rank=RawSQL(
+                f"ts_rank(tmapp_task.search_vector, {tsquery})",
+                params,
+                output_field=FloatField(),
+            )
+        )
+
+    if backend == "sqlite":
+        match = fts_query(query)
+        if not match:
+            return queryset.none()
+        # bm25 тем меньше, чем лучше совпадение; веса колонок name, content, history
+        return queryset.filter(
+            RawSQL(
+                f"tmapp_task.id IN (SELECT rowid FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s)",
+                [match],
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = tmapp_task.id)",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    return queryset.filter(
+        Q(name__icontains=query) | Q(content__icontains=query)
+    ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+class SearchPage:
+    """Страница результатов поиска, без подсчета общего количества"""
+
+    def __init__(self, object_list, number, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.has_next = has_next
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def search_tasks(query, page=1, per_page=SEARCH_PAGE_SIZE, queryset=None):
+    """Страница задач по запросу, от более релевантных к менее"""
+    query = (query or "").strip()
+    if not query:
+        return SearchPage([], 1, False)
+
+    queryset = Task.objects.all() if queryset is None else queryset
+    queryset = filter_search(queryset, query).order_by("-rank", "-id")
+
+    offset = (page - 1) * per_page
+    tasks = list(queryset[offset:offset + per_page + 1])
+    return SearchPage(tasks[:per_page], page, len(tasks) > per_page)
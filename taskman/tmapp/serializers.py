@@ -1,27 +1,81 @@
+from django.core.exceptions import ValidationError
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 from .models import Project, Sprint, Status, Task
 
 
-class TaskSerializer(serializers.ModelSerializer):
+def get_requested_fields(request):
+    """
+    Поля из ?fields=id,name для запросов на чтение, иначе None.
+    id отдаем всегда - по нему работает курсорная пагинация.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = request.query_params.get("fields")
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(",") if name.strip()} | {"id"}
+
+
+class SparseFieldsMixin:
+    """Сериализатор отдает только поля, запрошенные в ?fields="""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get("request"))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связанный объект по id.
+    Если в контексте есть заранее загруженные объекты (context["preloaded"]
+    - словарь модель -> {id: объект}), берем оттуда без запроса к базе.
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get("preloaded", {}).get(self.queryset.model)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        try:
+            return preloaded[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
     class Meta:
         model = Task
         fields = "__all__"
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Project
         fields = "__all__"
 
 
-class SprintSerializer(serializers.ModelSerializer):
+class SprintSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Sprint
         fields = "__all__"
 
 
-class StatusSerializer(serializers.ModelSerializer):
+class StatusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    def validate_parent_status(self, value):
+        try:
+            (self.instance or Status()).check_parent(value)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        return value
+
     class Meta:
         model = Status
         fields = "__all__"
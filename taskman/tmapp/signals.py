@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from simple_history.signals import pre_create_historical_record
+
+from . import events, search, versions
+from .models import (Project, Sprint, Status, Task, TaskHistoryChanges,
+                     get_task_changes)
+
+# Модели, изменения которых отмечаются метками версий
+VERSIONED_MODELS = (Task, Project, Sprint, Status, get_user_model())
+
+
+@receiver(pre_create_historical_record)
+def store_task_history_changes(sender, instance, history_instance, **kwargs):
+    """
+    Считаем изменения в момент записи истории, чтобы при чтении
+    не сравнивать соседние версии.
+    Предыдущее состояние кладет Task.save, иначе берем последнюю версию.
+    """
+    if not isinstance(history_instance, TaskHistoryChanges):
+        return
+    if history_instance.history_type != "~":
+        history_instance.changes = []
+        return
+
+    previous = getattr(instance, "_history_previous", None)
+    if previous is None:
+        previous = (
+            sender.objects.filter(id=instance.pk)
+            .order_by("-history_date", "-history_id")
+            .values(*instance.get_history_values())
+            .first()
+        ) or {}
+    history_instance.changes = get_task_changes(
+        previous, instance.get_history_values()
+    )
+    instance._history_previous = None
+
+
+def bump_version(sender, instance, update_fields=None, **kwargs):
+    """Обновляем метку версии объекта и коллекции"""
+    if getattr(instance, "_bulk_deleted", False):
+        return
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        # Вход пользователя не меняет ничего, что выводится на страницах
+        return
+    versions.bump(sender, [instance.pk])
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_version, sender=model, dispatch_uid=f"version-save-{model.__name__}")
+    post_delete.connect(bump_version, sender=model, dispatch_uid=f"version-delete-{model.__name__}")
+
+
+@receiver(post_save, sender=Task, dispatch_uid="search-index-save")
+def index_task(sender, instance, created=False, update_fields=None, **kwargs):
+    """Обновляем поисковый индекс, если поменялся текст задачи"""
+    if (
+        update_fields is not None
+        and not {"name", "content"} & set(update_fields)
+        and not search.history_enabled()
+    ):
+        return
+    search.index_tasks([instance.pk], created=created)
+
+
+@receiver(post_delete, sender=Task, dispatch_uid="search-index-delete")
+def remove_task_from_index(sender, instance, **kwargs):
+    if getattr(instance, "_bulk_deleted", False):
+        return
+    search.remove_tasks([instance.pk])
+
+
+@receiver(post_save, sender=Task, dispatch_uid="events-save")
+def publish_task_saved(sender, instance, created=False, **kwargs):
+    """Событие для открытых страниц (tmapp/events.py)"""
+    events.publish_task_saved(instance, created)
+
+
+@receiver(post_delete, sender=Task, dispatch_uid="events-delete")
+def publish_task_deleted(sender, instance, **kwargs):
+    if getattr(instance, "_bulk_deleted", False):
+        return
+    events.publish([("task.deleted", {"id": instance.pk})])
@@ -0,0 +1,37 @@
+// Поиск по большим спискам выбора (tmapp/choices.py, ChoiceSearchInput):
+// варианты подгружаются с сервера по мере ввода, выбранный id
+// записывается в скрытое поле формы.
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("input[data-choice-url]").forEach(function (input) {
+        var target = document.getElementById(input.dataset.choiceTarget);
+        var list = document.getElementById(input.getAttribute("list"));
+        var found = {};
+        var timer = null;
+
+        function load() {
+            var url = input.dataset.choiceUrl + "?q=" + encodeURIComponent(input.value);
+            fetch(url, {credentials: "same-origin"})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    found = {};
+                    list.innerHTML = "";
+                    data.results.forEach(function (item) {
+                        found[item.label] = item.id;
+                        var option = document.createElement("option");
+                        option.value = item.label;
+                        list.appendChild(option);
+                    });
+                });
+        }
+
+        input.addEventListener("input", function () {
+            if (input.value in found) {
+                target.value = found[input.value];
+                return;
+            }
+            target.value = "";
+            clearTimeout(timer);
+            timer = setTimeout(load, 250);
+        });
+    });
+});
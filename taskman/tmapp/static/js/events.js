@@ -0,0 +1,23 @@
+// Поток изменений задач (tmapp/events.py): после изменения показываем
+// предложение обновить страницу. Событие reset - клиент отстал или
+// пропущенные события уже не хранятся, без перезагрузки не обойтись.
+document.addEventListener("DOMContentLoaded", function () {
+    var notice = document.querySelector("[data-event-stream]");
+    if (notice === null || !window.EventSource) {
+        return;
+    }
+    var source = new EventSource(notice.dataset.eventStream);
+
+    function show() {
+        notice.hidden = false;
+    }
+
+    ["task.created", "task.updated", "task.status", "task.deleted", "task.bulk"]
+        .forEach(function (type) {
+            source.addEventListener(type, show);
+        });
+    source.addEventListener("reset", function () {
+        source.close();
+        show();
+    });
+});
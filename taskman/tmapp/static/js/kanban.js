@@ -0,0 +1,99 @@
+// Канбан-доска (tmapp/kanban.py): перевод задачи в другой статус
+// кнопками на карточке или перетаскиванием в колонку, без перезагрузки.
+// Ответ сервера говорит, в каком статусе задача оказалась.
+document.addEventListener("DOMContentLoaded", function () {
+    var dragged = null;
+
+    // Токен из cookie csrftoken: страница могла прийти из кеша браузера
+    // (304) со старым токеном в форме, а после входа секрет уже другой
+    function csrfToken(card) {
+        var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        if (match !== null) {
+            return decodeURIComponent(match[1]);
+        }
+        return card.querySelector("input[name=csrfmiddlewaretoken]").value;
+    }
+
+    function column(statusId) {
+        return document.querySelector(
+            '[data-kanban-column="' + (statusId === null ? "" : statusId) + '"]'
+        );
+    }
+
+    function changeTotal(columnElement, delta) {
+        var total = columnElement.querySelector("[data-kanban-total]");
+        total.textContent = parseInt(total.textContent, 10) + delta;
+    }
+
+    function move(card, data) {
+        var form = card.querySelector("form[data-kanban-move]");
+        data.append("csrfmiddlewaretoken", csrfToken(card));
+        fetch(form.action, {
+            method: "POST",
+            body: data,
+            credentials: "same-origin",
+            headers: {"Accept": "application/json"},
+        })
+            .then(function (response) {
+                if (response.status === 400) {
+                    // Переход не разрешен или нужно выбрать ветку
+                    return response.json().then(function (result) {
+                        window.alert(result.detail);
+                        return {moved: false};
+                    });
+                }
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function (result) {
+                if (!result.moved) {
+                    return;
+                }
+                var target = column(result.status);
+                if (target === null) {
+                    // Колонки нет на странице (новый статус) - перерисуем доску
+                    window.location.reload();
+                    return;
+                }
+                changeTotal(card.closest("[data-kanban-column]"), -1);
+                changeTotal(target, 1);
+                target.querySelector("[data-kanban-cards]").prepend(card);
+            })
+            .catch(function () {
+                window.location.reload();
+            });
+    }
+
+    document.querySelectorAll("form[data-kanban-move]").forEach(function (form) {
+        form.addEventListener("submit", function (event) {
+            event.preventDefault();
+            var data = new FormData();
+            data.append("direction", event.submitter.value);
+            move(form.closest("[data-kanban-task]"), data);
+        });
+    });
+
+    document.querySelectorAll("[data-kanban-task]").forEach(function (card) {
+        card.addEventListener("dragstart", function () {
+            dragged = card;
+        });
+    });
+
+    document.querySelectorAll("[data-kanban-column]").forEach(function (columnElement) {
+        columnElement.addEventListener("dragover", function (event) {
+            event.preventDefault();
+        });
+        columnElement.addEventListener("drop", function (event) {
+            event.preventDefault();
+            if (dragged === null || dragged.closest("[data-kanban-column]") === columnElement) {
+                return;
+            }
+            var data = new FormData();
+            data.append("status", columnElement.dataset.kanbanColumn);
+            move(dragged, data);
+            dragged = null;
+        });
+    });
+});
@@ -0,0 +1,14 @@
+from django import template
+
+from tmapp import events
+
+register = template.Library()
+
+
+@register.inclusion_tag("eventstream.html")
+def event_stream(task_id=None):
+    """Подписка страницы на изменения задач, если поток событий включен"""
+    url = None
+    if events.is_enabled():
+        url = events.get_path() + (f"?task={task_id}" if task_id else "")
+    return {"url": url}
@@ -0,0 +1,55 @@
+"""
+{% fragment cards task %}...{% endfragment %} - разметка карточки из кеша.
+
+Первый аргумент - пачка карточек страницы (fragments.prefetch) или
+название карточки ("task_card"), тогда метки читаются по одной.
+"""
+
+import hashlib
+
+from django import template
+from django.template.base import Node
+
+from tmapp import fragments
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, batch, obj, nodelist):
+        self.batch = batch
+        self.obj = obj
+        self.nodelist = nodelist
+        # Текст шаблона карточки: правка разметки меняет ключ кеша
+        source = "".join(
+            node.token.contents
+            for node in nodelist.get_nodes_by_type(Node)
+            if getattr(node, "token", None) is not None
+        )
+        self.signature = hashlib.md5(source.encode()).hexdigest()
+
+    def render(self, context):
+        obj = self.obj.resolve(context)
+        batch = self.batch.resolve(context)
+        if isinstance(batch, str):
+            batch = fragments.prefetch(batch, [obj])
+
+        html = batch.get(self.signature, obj)
+        if html is None:
+            html = self.nodelist.render(context)
+            batch.set(self.signature, obj, html)
+        return html
+
+
+@register.tag
+def fragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"Тег {bits[0]} принимает пачку карточек и объект"
+        )
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(
+        parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), nodelist
+    )
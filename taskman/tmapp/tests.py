@@ -1,7 +1,47 @@
+import asyncio
+import collections
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import queue
+import tempfile
+import time
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock, skipUnless
+
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (AsyncClient, AsyncRequestFactory, Client,
+                         RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from tmapp.models import Project, Sprint, Status, Task
+from tmapp import (analytics, async_views, benchmark, bulk, events, fragments,
+                   history, importer, kanban, replicas, versions, workflow)
+from tmapp.choices import ChoiceSearchInput, get_cache, get_choices
+from tmapp.filters import filter_tasks
+from tmapp.forms import StatusForm, TaskForm
+from tmapp.log import BoundedQueueHandler, queue_file_handler
+from tmapp.models import (Notification, Project, ProjectStats, RequestSample,
+                          Sprint, SprintDailyStat, Status, Task, TaskEvent,
+                          TaskHistoryArchive)
+from tmapp.notifications import claim_batch, deliver_batch
+from tmapp.perf import RequestRecorder
+from tmapp.search import search_tasks
 
 
 class SigninTest(TestCase):
@@ -99,3 +139,1888 @@ class AllTasksViewTest(TestCase):
         self.task.save()
         response = self.client.get("/api/task/")
         self.assertEqual(response.data["results"][0]["name"], "Тестовое название")
+
+
+class TaskListPaginationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.status = Status.objects.create(name="Новая")
+        self.project = Project.objects.create(name="Проект", content="Описание")
+
+    def create_tasks(self, count, **kwargs):
+        for i in range(count):
+            Task(
+                name=f"Задача {i}",
+                content="Описание",
+                is_complete=i % 3 == 0,
+                status=self.status,
+                executor=self.user,
+                **kwargs,
+            ).save()
+
+    def test_pages_cover_all_tasks_in_order(self):
+        self.create_tasks(95)
+        expected = list(
+            Task.objects.order_by("is_complete", "-id").values_list("id", flat=True)
+        )
+        seen = []
+        url = "/"
+        while url:
+            response = self.client.get(url)
+            seen += [task.id for task in response.context["tasks"]]
+            next_query = response.context["next_query"]
+            url = f"/?{next_query}" if next_query else None
+        self.assertEqual(seen, expected)
+
+    def test_query_count_does_not_depend_on_table_size(self):
+        self.create_tasks(5)
+        with self.assertNumQueries(3):
+            self.client.get("/")
+        self.create_tasks(100)
+        with self.assertNumQueries(3):
+            response = self.client.get("/")
+        self.assertContains(response, "Далее")
+
+    def test_filter_by_project(self):
+        self.create_tasks(3)
+        self.create_tasks(2, project=self.project)
+        response = self.client.get(f"/?project={self.project.id}&status=abc")
+        self.assertEqual(len(response.context["tasks"]), 2)
+
+
+class ProjectListViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+
+    def create_project(self, open_tasks, complete_tasks):
+        project = Project.objects.create(name="Проект", content="Описание")
+        today = timezone.localdate()
+        sprint = Sprint.objects.create(
+            name="Спринт",
+            date_start=today - datetime.timedelta(days=1),
+            date_end=today + datetime.timedelta(days=1),
+            project=project,
+        )
+        for i in range(open_tasks + complete_tasks):
+            Task(
+                name=f"Задача {i}",
+                content="Описание",
+                is_complete=i >= open_tasks,
+                project=project,
+                sprint=sprint,
+            ).save()
+        return project
+
+    def check_counts(self):
+        self.create_project(open_tasks=2, complete_tasks=1)
+        with self.assertNumQueries(4):
+            response = self.client.get("/project/list/")
+        self.create_project(open_tasks=4, complete_tasks=3)
+        with self.assertNumQueries(4):
+            response = self.client.get("/project/list/")
+
+        projects = response.context["projects"]
+        self.assertEqual(
+            [(p.tasks_total, p.tasks_open, p.tasks_complete) for p in projects],
+            [(3, 2, 1), (7, 4, 3)],
+        )
+        self.assertEqual([p.sprints_total for p in projects], [1, 1])
+        self.assertEqual([p.active_sprints for p in projects], [1, 1])
+        self.assertEqual(len(response.context["sprints"]), 2)
+
+    def test_annotated_counts(self):
+        self.check_counts()
+
+    @override_settings(TMAPP_PROJECT_STATS=True)
+    def test_denormalized_counts(self):
+        self.check_counts()
+
+    @override_settings(TMAPP_PROJECT_STATS=True)
+    def test_stats_follow_task_changes(self):
+        project = self.create_project(open_tasks=2, complete_tasks=0)
+        other = Project.objects.create(name="Другой", content="Описание")
+
+        task = Task.objects.filter(project=project).first()
+        task.is_complete = True
+        task.save()
+        stats = ProjectStats.objects.get(project=project)
+        self.assertEqual((stats.tasks_total, stats.tasks_complete), (2, 1))
+
+        task.project = other
+        task.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.tasks_total, stats.tasks_complete), (1, 0))
+        self.assertEqual(ProjectStats.objects.get(project=other).tasks_total, 1)
+
+        Task.objects.filter(project=project).first().delete()
+        project.sprints.first().delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.tasks_total, stats.sprints_total), (0, 0))
+
+
+class StatusTreeTest(TestCase):
+    def setUp(self):
+        self.root = Status.objects.create(name="Новая")
+        self.work = Status.objects.create(name="В работе", parent_status=self.root)
+        self.review = Status.objects.create(name="Ревью", parent_status=self.work)
+        self.other = Status.objects.create(name="Другой процесс")
+
+    def test_paths(self):
+        self.assertEqual(self.review.depth, 2)
+        self.assertEqual(self.review.get_parent_id(), self.root.id)
+        self.assertEqual(self.review.get_relative_name(), "------Ревью")
+        self.assertEqual(list(self.review.get_ancestors()), [self.root, self.work])
+        self.assertEqual(list(self.root.get_descendants()), [self.work, self.review])
+
+    def test_move_subtree(self):
+        self.work.parent_status = self.other
+        self.work.save()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.get_parent_id(), self.other.id)
+        self.assertEqual(self.review.depth, 2)
+        self.assertEqual(list(self.root.get_descendants()), [])
+
+    def test_cycle_is_rejected(self):
+        form = StatusForm(
+            {"name": "Новая", "parent_status": self.review.id}, instance=self.root
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("parent_status", form.errors)
+
+    def test_cycle_in_model_validation(self):
+        self.root.parent_status = self.review
+        with self.assertRaises(ValidationError) as error:
+            self.root.full_clean()
+        self.assertIn("parent_status", error.exception.message_dict)
+        with self.assertRaises(ValueError):
+            self.root.save()
+
+    def test_delete_makes_children_roots(self):
+        self.work.delete()
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.depth, 0)
+        self.assertEqual(self.review.get_parent_id(), self.review.id)
+
+    def test_status_list_query_count(self):
+        get_user_model().objects.create_user(username="test", password="12test12")
+        self.client.login(username="test", password="12test12")
+        with self.assertNumQueries(3):
+            response = self.client.get("/status/list/")
+        self.assertEqual(
+            list(response.context["statuses"]),
+            [self.root, self.work, self.review, self.other],
+        )
+
+
+class TaskHistoryChangesTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.status = Status.objects.create(name="Новая")
+        self.task = Task(name="Задача", content="Описание")
+        self.task.save()
+
+    def test_changes_are_stored_on_save(self):
+        self.task.name = "Новое название"
+        self.task.status = self.status
+        self.task.save()
+        record = self.task.history.first()
+        self.assertEqual(
+            sorted(record.changes),
+            [["name", "Задача", "Новое название"], ["status", None, self.status.id]],
+        )
+
+    def test_task_detail_query_count_does_not_depend_on_history(self):
+        # Таблица переходов строится один раз на процесс
+        workflow.get_workflow()
+        with self.assertNumQueries(4):
+            self.client.get(f"/task/{self.task.id}/")
+        for i in range(20):
+            self.task.content = f"Описание {i}"
+            self.task.save()
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/task/{self.task.id}/")
+        self.assertEqual(len(response.context["tasks_history"]), 21)
+        self.assertIn("содеражине", response.context["tasks_history"][0]["change_list"])
+
+
+class TaskFieldTrackingTest(TestCase):
+    def setUp(self):
+        Task(name="Задача", content="Описание").save()
+        self.task = Task.objects.get()
+
+    def test_changed_fields(self):
+        self.assertEqual(self.task.changed_fields, [])
+        self.task.name = "Новое название"
+        self.assertEqual(self.task.changed_fields, ["name"])
+        self.assertEqual(self.task.previous("name"), "Задача")
+
+    def test_single_field_update(self):
+        self.task.content = "Новое описание"
+        with CaptureQueriesContext(connection) as queries:
+            self.task.save()
+        statements = [q["sql"] for q in queries.captured_queries]
+        self.assertFalse(
+            [sql for sql in statements if sql.startswith('SELECT') and '"tmapp_task"' in sql]
+        )
+        update = [sql for sql in statements if sql.startswith('UPDATE "tmapp_task"')]
+        self.assertEqual(len(update), 1)
+        self.assertNotIn('"name"', update[0])
+        self.assertEqual(self.task.changed_fields, [])
+        self.assertEqual(Task.objects.get().content, "Новое описание")
+
+    def test_save_without_changes_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.task.save()
+        statements = [q["sql"] for q in queries.captured_queries]
+        self.assertFalse([sql for sql in statements if "SAVEPOINT" not in sql])
+        self.assertEqual(self.task.history.count(), 1)
+
+    def test_task_not_loaded_from_db(self):
+        task = Task(id=self.task.id, name="Задача", content="Другое описание")
+        task.save()
+        self.assertEqual(task.history.first().changes, [
+            ["content", "Описание", "Другое описание"]
+        ])
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException("Сервер недоступен")
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    connections = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        CountingEmailBackend.connections += 1
+
+
+class NotificationOutboxTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.new = Status.objects.create(name="Новая")
+        self.work = Status.objects.create(name="В работе", parent_status=self.new)
+        self.task = Task(name="Задача", content="Описание", executor=self.user)
+        self.task.save()
+
+    def test_status_changes_are_deduplicated(self):
+        self.task.status = self.new
+        self.task.save()
+        self.task.status = self.work
+        self.task.save()
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertIn("В работе", Notification.objects.get().body)
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command("send_notifications", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["test@example.com"])
+        self.assertEqual(Notification.objects.get().state, Notification.SENT)
+
+    @override_settings(EMAIL_BACKEND="tmapp.tests.FailingEmailBackend")
+    def test_failed_send_is_retried_later(self):
+        self.task.status = self.new
+        self.task.save()
+        call_command("send_notifications", "--max-attempts=2", stdout=StringIO())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.state, Notification.PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertIn("Сервер недоступен", notification.last_error)
+
+        # До истечения задержки письмо повторно не берется
+        self.assertEqual(claim_batch(10), [])
+        Notification.objects.update(next_attempt_at=timezone.now())
+        call_command("send_notifications", "--max-attempts=2", stdout=StringIO())
+        self.assertEqual(Notification.objects.get().state, Notification.FAILED)
+
+    @override_settings(EMAIL_BACKEND="tmapp.tests.CountingEmailBackend")
+    def test_connection_per_worker(self):
+        notifications = [
+            Notification.objects.create(
+                task=self.task, recipient="test@example.com",
+                subject=f"Тема {i}", body="Текст",
+            )
+            for i in range(5)
+        ]
+        CountingEmailBackend.connections = 0
+        self.assertEqual(deliver_batch(notifications, concurrency=2), (5, 0))
+        self.assertEqual(CountingEmailBackend.connections, 2)
+        self.assertEqual(
+            sorted(message.subject for message in mail.outbox),
+            [f"Тема {i}" for i in range(5)],
+        )
+
+
+class QueueLoggingTest(TestCase):
+    def test_records_are_written_by_listener(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "test.log")
+            handler = queue_file_handler(filename, json_lines=True, batch_size=10)
+            test_logger = logging.getLogger("tmapp.tests.queue")
+            test_logger.addHandler(handler)
+            try:
+                test_logger.warning(
+                    "Задача %s", 1, extra={"task_id": 1, "changed_fields": ["name"]}
+                )
+            finally:
+                test_logger.removeHandler(handler)
+                handler.listener.stop()
+
+            with open(filename, encoding="utf-8") as log_file:
+                record = json.loads(log_file.readline())
+        self.assertEqual(record["message"], "Задача 1")
+        self.assertEqual(record["task_id"], 1)
+        self.assertEqual(record["changed_fields"], ["name"])
+
+    def test_full_queue_drops_records(self):
+        handler = BoundedQueueHandler(queue.Queue(maxsize=1))
+        record = logging.LogRecord("test", logging.WARNING, "", 0, "текст", (), None)
+        handler.emit(record)
+        handler.emit(record)
+        self.assertEqual(handler.dropped, 1)
+
+
+class TaskBulkApiTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.status = Status.objects.create(name="Новая")
+
+    def test_bulk_create_reports_item_errors(self):
+        items = [
+            {"name": f"Задача {i}", "content": "Описание", "status": self.status.id}
+            for i in range(50)
+        ]
+        items.append({"name": "Без описания"})
+        items.append({"name": "Плохой статус", "content": "Описание", "status": 999})
+        # + запись в поисковый индекс одним запросом
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                "/api/task/bulk/", items, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["created"]), 50)
+        self.assertEqual([e["index"] for e in response.data["errors"]], [50, 51])
+        self.assertEqual(Task.objects.count(), 50)
+        self.assertEqual(Task.history.filter(history_type="+").count(), 50)
+
+    def test_atomic_mode_rejects_whole_batch(self):
+        items = [{"name": "Задача", "content": "Описание"}, {"name": "Ошибка"}]
+        response = self.client.post(
+            "/api/task/bulk/?atomic=1", items, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_bulk_update_and_delete(self):
+        tasks = [Task(name=f"Задача {i}", content="Описание") for i in range(3)]
+        for task in tasks:
+            task.save()
+
+        response = self.client.patch(
+            "/api/task/bulk/",
+            [{"id": task.id, "is_complete": True} for task in tasks],
+            content_type="application/json",
+        )
+        self.assertEqual(len(response.data["updated"]), 3)
+        self.assertEqual(Task.objects.filter(is_complete=True).count(), 3)
+        self.assertFalse(Task.objects.filter(timestamp_done=None).exists())
+        self.assertEqual(
+            tasks[0].history.first().changes, [["is_complete", False, True]]
+        )
+
+        Notification.objects.create(
+            task=tasks[0], recipient="test@example.com", subject="Тема", body="Текст"
+        )
+        response = self.client.delete(
+            "/api/task/bulk/",
+            [tasks[0].id, tasks[1].id, 999],
+            content_type="application/json",
+        )
+        self.assertEqual(response.data["deleted"], [tasks[0].id, tasks[1].id])
+        self.assertEqual(len(response.data["errors"]), 1)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(Task.history.filter(history_type="-").count(), 2)
+        self.assertFalse(Notification.objects.exists())
+
+
+class ApiPaginationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        for i in range(12):
+            Task(name=f"Задача {i}", content="Длинное описание").save()
+
+    def test_cursor_pages(self):
+        ids = []
+        url = "/api/task/?page_size=5"
+        while url:
+            response = self.client.get(url)
+            ids += [task["id"] for task in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, list(Task.objects.values_list("id", flat=True)))
+        self.assertNotIn("count", response.data)
+
+    def test_page_size_is_limited(self):
+        response = self.client.get("/api/task/?page_size=100000")
+        self.assertEqual(len(response.data["results"]), 12)
+
+    def test_sparse_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/task/?fields=name")
+        self.assertEqual(set(response.data["results"][0]), {"id", "name"})
+        select = [q["sql"] for q in queries.captured_queries if "tmapp_task" in q["sql"]]
+        self.assertNotIn('"content"', select[0])
+        self.assertNotIn("COUNT", select[0])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.task = Task(name="Задача", content="Описание")
+        self.task.save()
+
+    def check_not_modified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        # Повторный запрос не трогает таблицы - только сессия и пользователь
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.name = "Другое название"
+            self.task.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_task_detail(self):
+        self.check_not_modified(f"/task/{self.task.id}/")
+
+    def test_task_list(self):
+        self.check_not_modified("/")
+
+    def test_api_list(self):
+        self.check_not_modified("/api/task/")
+
+    def test_api_list_depends_on_status_tree(self):
+        root = Status.objects.create(name="Корень")
+        child = Status.objects.create(name="Вложенный", parent_status=root)
+        self.task.status = child
+        self.task.save()
+        for url in (
+            f"/api/task/?status_tree={root.id}",
+            f"/api/async/task/?status_tree={root.id}",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+            with self.captureOnCommitCallbacks(execute=True):
+                child.parent_status = None
+                child.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            child.parent_status = root
+            child.save()
+
+    def test_api_retrieve(self):
+        self.check_not_modified(f"/api/task/{self.task.id}/")
+
+    def test_project_detail_depends_on_date(self):
+        # Активность спринта на странице проекта считается от текущей даты
+        project = Project.objects.create(name="Проект", content="Описание")
+        url = f"/project/{project.id}/"
+        response = self.client.get(url)
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        with mock.patch.object(timezone, "localdate", return_value=tomorrow):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_keeps_versions(self):
+        response = self.client.get("/")
+        get_user_model().objects.create_user(username="other", password="12test12")
+        with self.captureOnCommitCallbacks(execute=True):
+            Client().login(username="other", password="12test12")
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_relogin_refreshes_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username="test", password="12test12")
+        url = f"/task/{self.task.id}/"
+        response = client.get(url)
+        etag = response["ETag"]
+
+        client.logout()
+        client.login(username="test", password="12test12")
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "csrfmiddlewaretoken")
+
+    def test_if_modified_since(self):
+        def modified_since(stamp):
+            return RequestFactory().get(
+                "/", HTTP_IF_MODIFIED_SINCE=stamp.apply(HttpResponse())["Last-Modified"]
+            )
+
+        old = versions.Stamp([time.time() - 10])
+        self.assertEqual(old.not_modified(modified_since(old)).status_code, 304)
+
+        # Изменение в ту же секунду не должно дать 304 по дате
+        first = versions.Stamp([time.time()])
+        second = versions.Stamp([time.time()])
+        self.assertIsNone(second.not_modified(modified_since(first)))
+
+
+class ChoiceCacheTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.status = Status(name="Новый")
+        self.status.save()
+        self.project = Project(name="Проект", content="Описание")
+        self.project.save()
+        get_cache().clear()
+
+    def test_form_reads_cache(self):
+        str(TaskForm())
+
+        # Второй показ формы не читает таблицы, проверка - один запрос
+        # на каждый выбранный внешний ключ
+        with self.assertNumQueries(0):
+            self.assertIn("Новый", str(TaskForm()))
+        with self.assertNumQueries(3):
+            form = TaskForm(data={
+                "name": "Задача",
+                "content": "Описание",
+                "status": self.status.id,
+                "executor": self.user.id,
+                "project": self.project.id,
+            })
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["status"].id, self.status.id)
+
+        form = TaskForm(data={"name": "Задача", "content": "Описание", "status": 999})
+        self.assertFalse(form.is_valid())
+        self.assertIn("status", form.errors)
+
+    def test_stale_cache_gives_field_error(self):
+        str(TaskForm())
+        # Метка версии меняется после коммита - в кеше остается удаленный статус
+        status_id = self.status.id
+        self.status.delete()
+        form = TaskForm(
+            data={"name": "Задача", "content": "Описание", "status": status_id}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("status", form.errors)
+
+    def test_invalidated_on_change(self):
+        str(TaskForm())
+        with self.captureOnCommitCallbacks(execute=True):
+            Status(name="В работе").save()
+        self.assertIn("В работе", str(TaskForm()))
+
+    def test_status_form_checks_cycles(self):
+        child = Status(name="Дочерний", parent_status=self.status)
+        child.save()
+        form = StatusForm(
+            data={"name": self.status.name, "parent_status": child.id},
+            instance=self.status,
+        )
+        self.assertFalse(form.is_valid())
+
+    @override_settings(TMAPP_CHOICES_INLINE_LIMIT=1)
+    def test_large_set_uses_search(self):
+        Status(name="В работе").save()
+        form = TaskForm()
+        self.assertIsInstance(form.fields["status"].widget, ChoiceSearchInput)
+        self.assertIn("data-choice-url", str(form["status"]))
+
+        response = self.client.get("/choices/status/", {"q": "раб"})
+        self.assertEqual(
+            [item["label"] for item in response.json()["results"]], ["В работе"]
+        )
+        self.assertEqual(self.client.get("/choices/unknown/").status_code, 404)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                    },
+                    "choices": {
+                        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": directory,
+                    },
+                },
+                TMAPP_CHOICES_CACHE="choices",
+            ):
+                str(TaskForm())
+                with self.assertNumQueries(0):
+                    self.assertIn("Проект", str(TaskForm()))
+                caches["choices"].clear()
+
+
+class TaskSearchTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.bug = Task(name="Ошибка авторизации", content="Не пускает в систему")
+        self.bug.save()
+        self.docs = Task(name="Документация", content="Описать ошибка API")
+        self.docs.save()
+
+    def found(self, query, **kwargs):
+        return [task.id for task in search_tasks(query, **kwargs)]
+
+    def test_ranked(self):
+        # Совпадение в названии весит больше, чем в описании
+        self.assertEqual(self.found("ошибка"), [self.bug.id, self.docs.id])
+        self.assertEqual(self.found("документ"), [self.docs.id])
+        self.assertEqual(self.found("   "), [])
+
+    def test_index_follows_changes(self):
+        self.bug.name = "Вход в систему"
+        self.bug.save()
+        self.assertEqual(self.found("авторизации"), [])
+        self.assertEqual(self.found("вход"), [self.bug.id])
+
+        self.bug.delete()
+        self.assertEqual(self.found("систему"), [])
+
+    @override_settings(TMAPP_SEARCH_HISTORY=True)
+    def test_history(self):
+        self.bug.name = "Вход в систему"
+        self.bug.save()
+        self.assertEqual(self.found("авторизации"), [self.bug.id])
+
+    def test_pages(self):
+        page = search_tasks("ошибка", per_page=1)
+        self.assertTrue(page.has_next)
+        page = search_tasks("ошибка", page=2, per_page=1)
+        self.assertEqual([task.id for task in page], [self.docs.id])
+        self.assertFalse(page.has_next)
+
+    def test_views(self):
+        response = self.client.get("/search/", {"q": "ошибка"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["tasks"]), 2)
+
+        response = self.client.get("/api/task/search/", {"q": "ошибка", "page_size": 1})
+        self.assertEqual(response.json()["results"][0]["id"], self.bug.id)
+        self.assertIsNotNone(response.json()["next"])
+
+    def test_bulk(self):
+        response = self.client.post(
+            "/api/task/bulk/",
+            [{"name": "Релиз", "content": "Собрать релиз"}],
+            content_type="application/json",
+        )
+        task_id = response.json()["created"][0]["id"]
+        self.assertEqual(self.found("релиз"), [task_id])
+
+        self.client.delete(
+            "/api/task/bulk/", [task_id], content_type="application/json"
+        )
+        self.assertEqual(self.found("релиз"), [])
+
+
+class TaskApiFilterTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.root = Status(name="В работе")
+        self.root.save()
+        self.child = Status(name="Ревью", parent_status=self.root)
+        self.child.save()
+        self.other = Status(name="Готово")
+        self.other.save()
+        self.project = Project(name="Проект", content="Описание")
+        self.project.save()
+
+        self.first = Task(
+            name="Б", content="Описание", status=self.root, executor=self.user
+        )
+        self.first.save()
+        self.second = Task(
+            name="А", content="Описание", status=self.child,
+            project=self.project, is_complete=True,
+        )
+        self.second.save()
+        self.third = Task(name="В", content="Описание", status=self.other)
+        self.third.save()
+
+    def get_ids(self, **params):
+        response = self.client.get("/api/task/", params)
+        self.assertEqual(response.status_code, 200)
+        return [task["id"] for task in response.json()["results"]]
+
+    def test_filters(self):
+        self.assertEqual(
+            self.get_ids(status_tree=self.root.id), [self.first.id, self.second.id]
+        )
+        self.assertEqual(self.get_ids(status=self.root.id), [self.first.id])
+        self.assertEqual(self.get_ids(executor=self.user.id), [self.first.id])
+        self.assertEqual(self.get_ids(project=self.project.id), [self.second.id])
+        self.assertEqual(
+            self.get_ids(is_complete="false"), [self.first.id, self.third.id]
+        )
+        # Некорректные значения игнорируются
+        self.assertEqual(len(self.get_ids(status="abc", is_complete="maybe")), 3)
+
+    def test_date_ranges(self):
+        Task.objects.filter(pk=self.first.pk).update(
+            timestamp_create=timezone.now() - datetime.timedelta(days=10)
+        )
+        today = timezone.localdate().isoformat()
+        self.assertEqual(
+            self.get_ids(created_after=today), [self.second.id, self.third.id]
+        )
+        self.assertEqual(self.get_ids(created_before=today), [self.first.id, self.second.id, self.third.id])
+        self.assertEqual(self.get_ids(done_after=today), [self.second.id])
+        # Граница за пределами дат игнорируется, а не дает ошибку
+        self.assertEqual(len(self.get_ids(created_before="9999-12-31")), 3)
+        self.assertEqual(
+            len(self.get_ids(created_before="9999-12-31T23:00:00-05:00")), 3
+        )
+        response = self.client.get("/", {"created_before": "9999-12-31"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_ordering(self):
+        self.assertEqual(
+            self.get_ids(ordering="name"),
+            [self.second.id, self.first.id, self.third.id],
+        )
+        # Поля вне списка разрешенных не влияют на порядок
+        self.assertEqual(
+            self.get_ids(ordering="content"),
+            [self.first.id, self.second.id, self.third.id],
+        )
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_explain(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Планы запросов проверяются на SQLite")
+        tasks = Task.objects.all()
+        self.assertUsesIndex(
+            filter_tasks(tasks, {"executor": "1", "is_complete": "0"}).order_by("id"),
+            "task_executor_idx",
+        )
+        self.assertUsesIndex(
+            filter_tasks(tasks, {"project": "1", "is_complete": "1"}).order_by("id"),
+            "task_project_idx",
+        )
+        self.assertUsesIndex(
+            filter_tasks(tasks, {"created_after": "2026-01-01"}).order_by("timestamp_create", "id"),
+            "task_created_idx",
+        )
+
+
+class BenchmarkTest(TestCase):
+    def test_scenarios(self):
+        data = benchmark.build_dataset(tasks=30, status_depth=3, history_length=5)
+        self.assertEqual(Task.objects.count(), 30)
+        self.assertEqual(Status.objects.filter(depth=2).count(), 5)
+
+        results = {"30": benchmark.run_scenarios(data, repeat=2)}
+        self.assertEqual(set(results["30"]), set(benchmark.SCENARIOS))
+        self.assertGreater(results["30"]["task_detail"]["queries"], 0)
+
+        self.assertEqual(benchmark.compare(results, results, 0.2), [])
+        slower = json.loads(json.dumps(results))
+        slower["30"]["task_list"]["p90_ms"] = results["30"]["task_list"]["p90_ms"] * 2 + 1
+        slower["30"]["status_list"]["queries"] += 1
+        self.assertEqual(len(benchmark.compare(slower, results, 0.2)), 2)
+
+
+class RequestTimingTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        Task(name="Задача", content="Описание").save()
+
+    def test_disabled_by_default(self):
+        response = self.client.get("/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertFalse(RequestSample.objects.exists())
+
+    @override_settings(TMAPP_PERF_ENABLED=True, TMAPP_PERF_SAMPLE_RATE=1)
+    def test_sampled(self):
+        with self.assertLogs("tmapp.perf", "INFO") as logs:
+            response = self.client.get("/")
+        self.assertIn("sql;dur=", response["Server-Timing"])
+        self.assertIn("tpl;dur=", response["Server-Timing"])
+        self.assertEqual(logs.records[0].route, "/")
+
+        sample = RequestSample.objects.get()
+        self.assertEqual(sample.status_code, 200)
+        self.assertGreater(sample.queries, 0)
+        self.assertGreater(sample.template_ms, 0)
+
+    @override_settings(TMAPP_PERF_ENABLED=True, TMAPP_PERF_SAMPLE_RATE=0)
+    def test_forced_for_staff_only(self):
+        response = self.client.get("/", HTTP_X_PERF="1")
+        self.assertNotIn("Server-Timing", response)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get("/?_perf=1")
+        self.assertIn("Server-Timing", response)
+
+    def test_duplicate_queries(self):
+        recorder = RequestRecorder()
+        execute = lambda sql, params, many, context: None
+        for task_id in (1, 2, 3):
+            recorder(execute, "SELECT * FROM tmapp_task WHERE id = %s", [task_id], False, {})
+        recorder(execute, "SELECT * FROM tmapp_status", [], False, {})
+        self.assertEqual(len(recorder.queries), 4)
+        self.assertEqual(recorder.duplicate_queries, 2)
+
+    @override_settings(TMAPP_PERF_ENABLED=True, TMAPP_PERF_SAMPLE_RATE=1)
+    def test_admin_report(self):
+        self.client.get("/project/list/")
+        self.user.is_staff = True
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get("/admin/tmapp/requestsample/report/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "project/list/")
+
+
+class SprintAnalyticsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.today = timezone.localdate()
+        self.project = Project(name="Проект", content="Описание")
+        self.project.save()
+        self.sprint = Sprint(
+            name="Спринт",
+            project=self.project,
+            date_start=self.day(-3),
+            date_end=self.day(-1),
+        )
+        self.sprint.save()
+
+        # A - в спринте с самого начала, закрыта на второй день
+        self.task_a = self.make_task("A", [(-5, {}), (-2, {"is_complete": True})])
+        # B - добавлена в первый день и не закрыта
+        self.task_b = self.make_task("B", [(-3, {})])
+        # C - добавлена на второй день, убрана из спринта на третий
+        self.task_c = self.make_task("C", [(-2, {}), (-1, {"sprint": None})])
+
+    def day(self, offset):
+        return self.today + datetime.timedelta(days=offset)
+
+    def make_task(self, name, revisions):
+        """Задача с историей: (смещение дня, изменения) на полдень этого дня"""
+        task = Task(name=name, content="Описание", project=self.project, sprint=self.sprint)
+        for index, (offset, changes) in enumerate(revisions):
+            for field, value in changes.items():
+                setattr(task, field, value)
+            task.save()
+            moment = timezone.make_aware(
+                datetime.datetime.combine(self.day(offset), datetime.time(12))
+            )
+            history = task.history.order_by("-history_id").first()
+            task.history.filter(history_id=history.history_id).update(history_date=moment)
+            if task.is_complete:
+                Task.objects.filter(pk=task.pk).update(timestamp_done=moment)
+        return task
+
+    def test_burndown(self):
+        days = analytics.burndown(self.sprint)
+        self.assertEqual(
+            [(day["day"], day["total"], day["open"]) for day in days],
+            [(self.day(-3), 2, 2), (self.day(-2), 3, 2), (self.day(-1), 2, 1)],
+        )
+
+        # Прошедшие дни сохранены и повторно не считаются
+        self.assertEqual(SprintDailyStat.objects.count(), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(analytics.burndown(self.sprint), days)
+
+    def test_current_day_not_stored(self):
+        self.sprint.date_end = self.today
+        self.sprint.save()
+        days = analytics.burndown(self.sprint)
+        self.assertEqual(days[-1]["day"], self.today)
+        self.assertEqual(days[-1]["open"], 1)
+        self.assertFalse(SprintDailyStat.objects.filter(day=self.today).exists())
+
+    def test_velocity(self):
+        current = Sprint(
+            name="Текущий", project=self.project,
+            date_start=self.today, date_end=self.day(7),
+        )
+        current.save()
+        rows = analytics.velocity(self.project.id)
+        self.assertEqual(
+            [(row["name"], row["completed"], row["carried_over"]) for row in rows],
+            [("Спринт", 1, 1), ("Текущий", 0, None)],
+        )
+
+    def test_views(self):
+        response = self.client.get(f"/sprint/{self.sprint.id}/analytics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["burndown"]), 3)
+
+        response = self.client.get(f"/api/sprint/{self.sprint.id}/analytics/")
+        self.assertEqual(response.json()["burndown"][-1]["open"], 1)
+        self.assertEqual(response.json()["velocity"][0]["carried_over"], 1)
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.status = Status(name="Новый")
+        self.status.save()
+        for i in range(5):
+            Task(
+                name=f"Задача {i}", content="Описание, с запятой",
+                status=self.status if i % 2 else None,
+            ).save()
+
+    def read(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response = self.client.get("/export/tasks.csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.reader(StringIO(self.read(response))))
+        self.assertEqual(rows[0][:3], ["id", "name", "content"])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][2], "Описание, с запятой")
+
+    def test_ndjson_with_filters(self):
+        response = self.client.get(f"/export/tasks.ndjson?status={self.status.id}")
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual({line["status_id"] for line in lines}, {self.status.id})
+
+        response = self.client.get(f"/export/history.ndjson?status={self.status.id}")
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["history_type"], "+")
+
+    def test_gzip(self):
+        response = self.client.get("/export/projects.csv", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertTrue(content.startswith("id,name"))
+
+    def test_unknown(self):
+        self.assertEqual(self.client.get("/export/users.csv").status_code, 404)
+        self.assertEqual(self.client.get("/export/tasks.xml").status_code, 404)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tasks.ndjson.gz")
+            call_command(
+                "export", "tasks", "--format", "ndjson", "--gzip",
+                "--output", path, "--filter", f"status={self.status.id}",
+            )
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                self.assertEqual(len(file.readlines()), 2)
+
+
+class ImportTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.status = Status(name="Новый")
+        self.status.save()
+        self.project = Project(name="Проект", content="Описание")
+        self.project.save()
+        self.sprint = Sprint(
+            name="Спринт 1", project=self.project,
+            date_start=datetime.date(2026, 1, 1), date_end=datetime.date(2026, 1, 14),
+        )
+        self.sprint.save()
+
+    def test_csv(self):
+        data = StringIO(
+            "name,content,status,executor,project,sprint,is_complete,timestamp_create\n"
+            "Первая,Описание,Новый,test,Проект,Спринт 1,да,2026-01-02 10:00\n"
+            "Вторая,Описание,,,,,нет,\n"
+        )
+        result = importer.import_file("tasks", data, "csv")
+        self.assertEqual((result.read, result.imported, result.errors), (2, 2, []))
+
+        task = Task.objects.get(name="Первая")
+        self.assertEqual(task.status, self.status)
+        self.assertEqual(task.executor, self.user)
+        self.assertEqual(task.sprint, self.sprint)
+        self.assertTrue(task.is_complete)
+        self.assertIsNotNone(task.timestamp_done)
+        self.assertEqual(task.timestamp_create.date(), datetime.date(2026, 1, 2))
+
+        history = task.history.get()
+        self.assertEqual(history.history_type, "+")
+        self.assertEqual(history.history_date, task.timestamp_create)
+        self.assertEqual(len(search_tasks("Вторая").object_list), 1)
+
+    def test_errors_are_collected(self):
+        Status(name="Новый").save()
+        data = StringIO("\n".join([
+            json.dumps({"name": "Хорошая", "content": "Описание"}),
+            "{не json",
+            json.dumps({"name": "", "content": "Описание", "executor": "nobody"}),
+            json.dumps({"name": "Статус", "content": "Описание", "status": "Новый"}),
+        ]))
+        result = importer.import_file("tasks", data, "ndjson", batch_size=1)
+        self.assertEqual((result.read, result.imported), (4, 1))
+        self.assertEqual([error["line"] for error in result.errors], [2, 3, 4])
+        self.assertEqual(set(result.errors[1]["errors"]), {"name", "executor"})
+        self.assertIn("status", result.errors[2]["errors"])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sprints.csv")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(
+                    "name,project,date_start,date_end\n"
+                    "Спринт 2,Проект,2026-01-15,2026-01-28\n"
+                    "Спринт 3,Нет такого,2026-01-29,2026-02-11\n"
+                )
+            errors = os.path.join(directory, "errors.ndjson")
+            out, err = StringIO(), StringIO()
+            call_command("import_data", "sprints", path, "--errors", errors,
+                         stdout=out, stderr=err)
+            self.assertIn("Загружено 1 из 2", out.getvalue())
+            with open(errors, encoding="utf-8") as file:
+                self.assertEqual(json.loads(file.readline())["line"], 3)
+        self.assertTrue(Sprint.objects.filter(name="Спринт 2").exists())
+
+    def test_versions_bumped(self):
+        get_choices("project")
+        (project_version,) = versions.get_versions(Project)
+        (sprint_version,) = versions.get_versions(Sprint)
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_file(
+                "projects", StringIO("name,content\nНовый проект,Описание\n"), "csv"
+            )
+            importer.import_file(
+                "sprints",
+                StringIO(
+                    "name,project,date_start,date_end\n"
+                    "Спринт 2,Новый проект,2026-01-15,2026-01-28\n"
+                ),
+                "csv",
+            )
+        self.assertGreater(versions.get_versions(Project)[0], project_version)
+        self.assertGreater(versions.get_versions(Sprint)[0], sprint_version)
+        self.assertIn("Новый проект", [item["name"] for item in get_choices("project")])
+
+
+class HistoryCompactTest(TestCase):
+    def setUp(self):
+        self.task = Task(name="Задача", content="Описание")
+        self.task.save()
+        for name in ("Задача 1", "Задача 2"):
+            self.task.name = name
+            self.task.save()
+        # Сохранение без изменений, такие записи остались от прежних версий
+        bulk.bulk_task_history([self.task], "~")
+
+    def revisions(self):
+        return list(
+            self.task.history.order_by("history_date", "history_id")
+            .values_list("history_type", "changes")
+        )
+
+    def test_dry_run(self):
+        report = history.compact(dry_run=True, archive=history.TableArchive())
+        self.assertEqual((report.collapsed, report.noop, report.archived), (2, 1, 0))
+        self.assertEqual(len(self.revisions()), 4)
+
+    def test_collapse_and_noop(self):
+        report = history.compact()
+        self.assertEqual((report.collapsed, report.noop), (2, 0))
+        self.assertEqual(self.revisions(), [
+            ("+", []),
+            ("~", [["name", "Задача", "Задача 2"]]),
+        ])
+
+    def test_revert_is_dropped(self):
+        self.task.name = "Задача"
+        self.task.save()
+        history.compact()
+        self.assertEqual(self.revisions(), [("+", [])])
+
+    def test_archive(self):
+        old = timezone.now() - datetime.timedelta(days=400)
+        self.task.history.update(history_date=old)
+        self.task.name = "Новое название"
+        self.task.save()
+
+        report = history.compact(collapse=False, days=365,
+                                 archive=history.TableArchive())
+        self.assertEqual((report.noop, report.archived), (1, 2))
+        # Последняя запись до границы нужна аналитике
+        self.assertEqual(len(self.revisions()), 2)
+        archive = TaskHistoryArchive.objects.get()
+        self.assertEqual((archive.task_id, archive.revisions), (self.task.id, 2))
+        self.assertEqual([row["history_type"] for row in archive.get_rows()], ["+", "~"])
+
+    def test_archive_keeps_burndown(self):
+        project = Project(name="Проект", content="Описание")
+        project.save()
+        today = timezone.localdate()
+        sprint = Sprint(
+            name="Спринт", project=project,
+            date_start=today - datetime.timedelta(days=402),
+            date_end=today - datetime.timedelta(days=395),
+        )
+        sprint.save()
+        self.task.sprint = sprint
+        self.task.save()
+        self.task.is_complete = True
+        self.task.save()
+        revisions = self.task.history.order_by("-history_date", "-history_id")
+        done, added = revisions[0], revisions[1]
+        # Задача добавлена в спринт в первый день, закрыта во второй
+        first_day_end = analytics.end_of_day(sprint.date_start)
+        hour = datetime.timedelta(hours=1)
+        HistoricalTask = Task.history.model
+        HistoricalTask.objects.filter(history_date__lt=added.history_date).update(
+            history_date=first_day_end - datetime.timedelta(days=2)
+        )
+        HistoricalTask.objects.filter(pk=added.pk).update(
+            history_date=first_day_end - hour
+        )
+        HistoricalTask.objects.filter(pk=done.pk).update(
+            history_date=first_day_end + hour
+        )
+
+        before = analytics.burndown(sprint)
+        self.assertEqual([point["open"] for point in before[:3]], [1, 0, 0])
+        SprintDailyStat.objects.all().delete()
+        history.compact(collapse=False, noop=False, days=365,
+                        archive=history.TableArchive())
+        self.assertEqual(analytics.burndown(sprint), before)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.ndjson.gz")
+            self.task.history.update(
+                history_date=timezone.now() - datetime.timedelta(days=400)
+            )
+            out = StringIO()
+            call_command("compact_history", "--dry-run", stdout=out)
+            self.assertIn("Будет", out.getvalue())
+            self.assertEqual(len(self.revisions()), 4)
+
+            call_command("compact_history", "--archive-file", path, "--days", "30",
+                         stdout=out)
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                self.assertEqual(json.loads(file.readline())["history_type"], "+")
+        self.assertEqual(len(self.revisions()), 1)
+        self.assertFalse(TaskHistoryArchive.objects.exists())
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.async_client.force_login(self.user)
+        self.status = Status(name="Новый")
+        self.status.save()
+        self.project = Project(name="Проект", content="Описание")
+        self.project.save()
+        self.tasks = []
+        for i in range(3):
+            task = Task(name=f"Задача {i}", content="Описание", project=self.project,
+                        status=self.status, executor=self.user if i else None)
+            task.save()
+            self.tasks.append(task)
+
+    def get_request(self, path="/", user=None):
+        request = AsyncRequestFactory().get(path)
+        request.user = user or self.user
+        return request
+
+    async def test_pages(self):
+        pages = [
+            (async_views.task_list, (), "Задача 2"),
+            (async_views.task_detail, (self.tasks[0].id,), "Задача создана"),
+            (async_views.project_list, (), "Проект"),
+            (async_views.project_detail, (self.project.id,), "Задача 1"),
+            (async_views.status_list, (), "Новый"),
+        ]
+        for view, args, text in pages:
+            response = await view(self.get_request(), *args)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, text)
+            self.assertIn("ETag", response)
+
+    async def test_login_required(self):
+        response = await async_views.task_list(self.get_request(user=AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_api_list(self):
+        response = await self.async_client.get("/api/async/task/?page_size=2")
+        data = response.json()
+        self.assertEqual(
+            [task["id"] for task in data["results"]],
+            [self.tasks[0].id, self.tasks[1].id],
+        )
+        response = await self.async_client.get(data["next"])
+        data = response.json()
+        self.assertEqual([task["id"] for task in data["results"]], [self.tasks[2].id])
+        self.assertIsNone(data["next"])
+
+        response = await self.async_client.get(
+            f"/api/async/task/?executor={self.user.id}&fields=name"
+        )
+        self.assertEqual(response.json()["results"], [
+            {"id": self.tasks[1].id, "name": "Задача 1"},
+            {"id": self.tasks[2].id, "name": "Задача 2"},
+        ])
+
+    async def test_api_detail(self):
+        url = f"/api/async/project/{self.project.id}/"
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()["name"], "Проект")
+
+        request = self.get_request(url)
+        request.META["HTTP_IF_NONE_MATCH"] = response["ETag"]
+        response = await async_views.api_detail(request, "project", self.project.id)
+        self.assertEqual(response.status_code, 304)
+
+        response = await self.async_client.get("/api/async/project/0/")
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get("/api/async/user/")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_api_login_required(self):
+        response = await AsyncClient().get("/api/async/task/")
+        self.assertEqual(response.status_code, 403)
+
+
+class LoadCompareTest(TransactionTestCase):
+    """Нагрузка идет из других потоков - данные должны быть сохранены"""
+
+    def test_run_load(self):
+        user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        task = Task(name="Задача", content="Описание")
+        task.save()
+        data = {"executor_id": user.id, "long_history_task_id": task.id}
+        runs = benchmark.run_load(
+            data, concurrency=2, total=4, scenarios=["api_task_detail"]
+        )["api_task_detail"]
+        self.assertEqual(set(runs), {"wsgi_sync", "asgi_sync", "asgi_async"})
+        for run in runs.values():
+            self.assertEqual((run["requests"], run["errors"]), (4, 0))
+
+
+@override_settings(TMAPP_READ_REPLICAS=["replica"])
+class ReplicaRouterTest(TransactionTestCase):
+    # Внутри транзакции TestCase роутер всегда читал бы из основной базы
+    databases = "__all__"
+
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+        replicas.health.reset()
+        replicas.health.mark("replica", True)
+        self.addCleanup(replicas.health.reset)
+
+    def read_alias(self, request):
+        """Куда пошло бы чтение во время обработки запроса"""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Task))
+            return HttpResponse()
+
+        response = replicas.ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_routing(self):
+        factory = RequestFactory()
+        alias, response = self.read_alias(factory.get("/"))
+        self.assertEqual(alias, "replica")
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+        alias, response = self.read_alias(factory.post("/task/"))
+        self.assertIsNone(alias)
+        self.assertEqual(
+            response.cookies[replicas.PIN_COOKIE]["max-age"],
+            settings.TMAPP_REPLICA_PIN_SECONDS,
+        )
+
+        # Сразу после изменения читаем свои данные из основной базы
+        request = factory.get("/")
+        request.COOKIES[replicas.PIN_COOKIE] = "1"
+        self.assertIsNone(self.read_alias(request)[0])
+
+        # Вне HTTP-запроса и на запись - основная база
+        self.assertIsNone(self.router.db_for_read(Task))
+        self.assertEqual(self.router.db_for_write(Task), "default")
+        self.assertFalse(self.router.allow_migrate("replica", "tmapp"))
+
+    def test_failover(self):
+        replicas.health.mark("replica", False)
+        self.assertIsNone(self.read_alias(RequestFactory().get("/"))[0])
+
+        # Недоступная реплика проверяется заново после интервала
+        with override_settings(TMAPP_READ_REPLICAS=["missing"],
+                               TMAPP_REPLICA_CHECK_INTERVAL=0):
+            self.assertIsNone(replicas.choose_replica())
+            self.assertFalse(replicas.health.healthy["missing"])
+
+    def set_version_age(self, seconds):
+        versions.get_cache().set_many({
+            versions.version_key(model): time.time() - seconds
+            for model in (Task, Status, get_user_model())
+        }, timeout=None)
+
+    def test_recent_changes_read_from_primary(self):
+        seen = []
+
+        @versions.conditional(lambda request: [Task])
+        def view(request):
+            seen.append(self.router.db_for_read(Task))
+            return HttpResponse()
+
+        def get(request):
+            request.user = AnonymousUser()
+            return replicas.ReplicaRoutingMiddleware(view)(request)
+
+        self.set_version_age(3600)
+        get(RequestFactory().get("/"))
+        # Задачи менялись недавно - реплика могла их еще не получить
+        self.set_version_age(1)
+        get(RequestFactory().get("/"))
+        self.assertEqual(seen, ["replica", None])
+
+    def test_recent_cards_are_not_cached(self):
+        task = Task(name="Задача", content="Описание")
+        task.save()
+        batch = fragments.prefetch("task_card", [task])
+        token = replicas.read_from_replica.set(True)
+        try:
+            batch.set("signature", task, "<div></div>")
+        finally:
+            replicas.read_from_replica.reset(token)
+        self.assertIsNone(fragments.get_cache().get(batch.key("signature", task)))
+
+        batch.set("signature", task, "<div></div>")
+        self.assertEqual(
+            fragments.get_cache().get(batch.key("signature", task)), "<div></div>"
+        )
+
+    @skipUnless("replica" in settings.DATABASES,
+                "нужна реплика в DATABASES (taskman.settings_replica)")
+    def test_recent_choices_are_not_cached(self):
+        Status.objects.create(name="Новый")
+        (version,) = versions.get_versions(Status)
+        key = f"tmapp:choices:status:{version}"
+        token = replicas.read_from_replica.set(True)
+        try:
+            self.assertEqual(
+                [item["name"] for item in get_choices("status")], ["Новый"]
+            )
+        finally:
+            replicas.read_from_replica.reset(token)
+        self.assertIsNone(get_cache().get(key))
+
+        get_choices("status")
+        self.assertIsNotNone(get_cache().get(key))
+
+    @skipUnless("replica" in settings.DATABASES,
+                "нужна реплика в DATABASES (taskman.settings_replica)")
+    def test_list_reads_from_replica(self):
+        user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.force_login(user)
+        replicas.health.reset()
+        self.set_version_age(3600)
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            self.assertEqual(self.client.get("/").status_code, 200)
+        self.assertTrue(queries)
+
+
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragments",
+    },
+}, TMAPP_FRAGMENT_CACHE="fragments")
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.status = Status(name="Новый")
+        self.status.save()
+        self.project = Project(name="Проект", content="Описание")
+        self.project.save()
+        self.tasks = []
+        for i in range(3):
+            task = Task(name=f"Задача {i}", content="Описание", project=self.project,
+                        status=self.status, executor=self.user)
+            task.save()
+            self.tasks.append(task)
+        caches["fragments"].clear()
+        self.addCleanup(caches["fragments"].clear)
+
+    def stats(self, name):
+        stats = fragments.get_stats()[name]
+        return stats["hits"], stats["misses"]
+
+    def test_task_cards(self):
+        self.assertContains(self.client.get("/"), "Задача 2")
+        self.assertEqual(self.stats("task_card"), (0, 3))
+        self.assertContains(self.client.get("/"), "Задача 2")
+        self.assertEqual(self.stats("task_card"), (3, 3))
+
+        # Новое имя статуса меняет ключи всех карточек с этим статусом,
+        # новое имя задачи - только ее карточки
+        with self.captureOnCommitCallbacks(execute=True):
+            self.status.name = "В работе"
+            self.status.save()
+        self.assertContains(self.client.get("/"), "Статус: В работе", count=3)
+        self.assertEqual(self.stats("task_card"), (3, 6))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tasks[0].name = "Переименована"
+            self.tasks[0].save()
+        self.assertContains(self.client.get("/"), "Переименована")
+        self.assertEqual(self.stats("task_card"), (5, 7))
+
+    def test_project_cards(self):
+        self.client.get("/project/list/")
+        self.assertContains(self.client.get("/project/list/"), "Задач в проекте: 3")
+        self.assertEqual(self.stats("project_card"), (1, 1))
+
+        # Счетчики входят в ключ карточки
+        with self.captureOnCommitCallbacks(execute=True):
+            Task(name="Еще задача", content="Описание", project=self.project).save()
+        self.assertContains(self.client.get("/project/list/"), "Задач в проекте: 4")
+        self.assertEqual(self.stats("project_card"), (1, 2))
+
+    def test_stats_command(self):
+        self.client.get("/")
+        out = StringIO()
+        call_command("fragment_stats", "--reset", stdout=out)
+        self.assertIn("task_card: попаданий 0, промахов 3", out.getvalue())
+        self.assertEqual(self.stats("task_card"), (0, 0))
+
+    @override_settings(TMAPP_FRAGMENT_CACHE=None)
+    def test_disabled(self):
+        self.assertContains(self.client.get("/"), "Задача 2")
+        self.assertEqual(self.stats("task_card"), (0, 0))
+
+
+@override_settings(TMAPP_KANBAN_CARDS=2)
+class KanbanTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.new = Status(name="Новый")
+            self.new.save()
+            self.work = Status(name="В работе", parent_status=self.new)
+            self.work.save()
+            self.done = Status(name="Готово", parent_status=self.work)
+            self.done.save()
+        self.tasks = []
+        for i in range(5):
+            task = Task(name=f"Задача {i}", content="Описание", status=self.new,
+                        executor=self.user if i % 2 else None)
+            task.save()
+            self.tasks.append(task)
+        self.tasks[0].status = self.work
+        self.tasks[0].save()
+
+    def test_board(self):
+        with self.assertNumQueries(2):
+            board = kanban.get_board()
+        self.assertEqual(
+            [column.status for column in board], [self.new, self.work, self.done]
+        )
+        new, work, done = board
+        # Первые задачи колонки - самые новые открытые
+        self.assertEqual(
+            [task.id for task in new.tasks], [self.tasks[4].id, self.tasks[3].id]
+        )
+        self.assertEqual((new.total, new.hidden), (4, 2))
+        self.assertEqual(new.tasks[1].executor_username, "test")
+        self.assertEqual((work.total, len(work.tasks)), (1, 1))
+        self.assertEqual((done.total, done.tasks), (0, []))
+
+        Task(name="Без статуса", content="Описание").save()
+        self.assertIsNone(kanban.get_board()[0].status)
+
+    def test_board_filters(self):
+        # Завершенные задачи - после открытых
+        self.tasks[3].is_complete = True
+        self.tasks[3].save()
+        board = kanban.get_board(
+            filter_tasks(Task.objects.all(), {"executor": str(self.user.id)})
+        )
+        self.assertEqual(
+            [task.id for task in board[0].tasks], [self.tasks[1].id, self.tasks[3].id]
+        )
+
+    def test_page(self):
+        response = self.client.get("/board/")
+        self.assertContains(response, "Задача 4")
+        self.assertContains(response, "Еще задач: 2")
+        self.assertNotContains(response, "Задача 1")
+
+    def test_move(self):
+        task = self.tasks[1]
+        headers = {"HTTP_ACCEPT": "application/json"}
+        response = self.client.post(
+            f"/board/move/{task.id}/", {"direction": "next"}, **headers
+        )
+        self.assertEqual(response.json(), {
+            "id": task.id, "status": self.work.id, "status_name": "В работе",
+            "moved": True,
+        })
+        response = self.client.post(
+            f"/board/move/{task.id}/", {"status": self.done.id}, **headers
+        )
+        self.assertEqual(response.json()["status"], self.done.id)
+        response = self.client.post(
+            f"/board/move/{task.id}/", {"direction": "next"}, **headers
+        )
+        self.assertEqual(response.json(), {"detail": "Следующего статуса нет."})
+        self.assertEqual(Task.history.filter(id=task.id).count(), 3)
+
+        response = self.client.post(f"/board/move/{task.id}/", {"status": ""})
+        self.assertRedirects(response, "/board/")
+        task.refresh_from_db()
+        self.assertIsNone(task.status)
+
+        response = self.client.post(
+            f"/board/move/{task.id}/", {"status": 999}, **headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/board/move/{task.id}/").status_code, 405)
+
+
+@override_settings(TMAPP_EVENTS_ENABLED=True, TMAPP_EVENTS_HEARTBEAT=0.05)
+class EventStreamTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        self.cookie = f"sessionid={self.client.cookies['sessionid'].value}".encode()
+        self.new = Status(name="Новый")
+        self.new.save()
+        self.work = Status(name="В работе", parent_status=self.new)
+        self.work.save()
+        # Брокер - один на процесс, каждому тесту нужен чистый
+        events.broker = None
+        self.broker = events.get_broker()
+
+    def published(self, last_id=0):
+        return [
+            (event.event_type, event.data.get("old_status"))
+            for event in self.broker.history(last_id)
+        ]
+
+    def test_task_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task(name="Задача", content="Описание", status=self.new)
+            task.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = self.work
+            task.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            task.name = "Новое имя"
+            task.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk.bulk_update_tasks([{"id": task.id, "status": self.new.id}])
+        with self.captureOnCommitCallbacks(execute=True):
+            task.delete()
+        self.assertEqual(self.published(), [
+            ("task.created", None),
+            ("task.status", self.new.id),
+            ("task.updated", None),
+            ("task.status", self.work.id),
+            ("task.deleted", None),
+        ])
+        self.assertEqual(self.published(3), self.published()[3:])
+
+    def test_resume_window(self):
+        self.broker.buffer = collections.deque(maxlen=2)
+        self.broker.emit([("task.deleted", {"id": i}) for i in range(4)])
+        self.assertEqual(len(self.broker.history(2)), 2)
+        # События 1 и 2 уже не хранятся, id 10 - из другого запуска
+        self.assertIsNone(self.broker.history(1))
+        self.assertIsNone(self.broker.history(10))
+
+    @override_settings(TMAPP_EVENTS_BROKER="tmapp.events.DatabaseBroker")
+    def test_database_broker(self):
+        broker = events.get_broker()
+        broker.publish([("task.deleted", {"id": 1})])
+        received = []
+
+        class Client:
+            offer = received.extend
+
+        broker.hub.add(Client())
+        broker.fetch()
+        broker.publish([("task.deleted", {"id": 2}), ("task.bulk", {"count": 5})])
+        broker.fetch()
+        self.assertEqual([event.data for event in received], [{"id": 2}, {"count": 5}])
+
+        # Транзакция с меньшим id закоммитилась позже: событие не теряется
+        late = TaskEvent.objects.get(data={"id": 2})
+        late.delete()
+        broker.publish([("task.deleted", {"id": 3})])
+        broker.fetch()
+        TaskEvent.objects.create(id=late.id, event_type="task.deleted", data={"id": 2})
+        broker.fetch()
+        broker.fetch()
+        self.assertEqual(
+            [event.data for event in received],
+            [{"id": 2}, {"count": 5}, {"id": 3}, {"id": 2}],
+        )
+
+        first = TaskEvent.objects.first().id
+        with override_settings(TMAPP_EVENTS_RESCAN=0):
+            self.assertEqual(len(broker.history(first)), 3)
+        # Недавние события с меньшими id тоже отдаются при продолжении
+        self.assertEqual(len(broker.history(first)), 4)
+        TaskEvent.objects.filter(id=first).delete()
+        self.assertIsNone(broker.history(first - 1))
+
+    async def read_stream(self, headers=(), query=b""):
+        """Тело ответа потока до первых событий или ответа целиком"""
+        messages = []
+        done = asyncio.Event()
+
+        async def receive():
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            body = message.get("body", b"")
+            if b"data:" in body or not message.get("more_body", True):
+                done.set()
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/events/",
+            "query_string": query, "headers": [(b"cookie", self.cookie), *headers],
+        }
+        await asyncio.wait_for(events.stream(scope, receive, send), 5)
+        self.messages = messages
+        return (
+            messages[0]["status"],
+            b"".join(message.get("body", b"") for message in messages[1:]).decode(),
+        )
+
+    async def test_stream(self):
+        self.broker.emit([("task.deleted", {"id": 1}), ("task.deleted", {"id": 2})])
+        status, body = await self.read_stream([(b"last-event-id", b"1")])
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            body, 'retry: 3000\n\nid: 2\nevent: task.deleted\ndata: {"id": 2}\n\n'
+        )
+
+        # Новые события приходят после подключения, с фильтром по задаче
+        stream = asyncio.ensure_future(self.read_stream(query=b"task=4"))
+        await asyncio.sleep(0.1)
+        self.broker.emit([("task.deleted", {"id": 3}), ("task.deleted", {"id": 4})])
+        status, body = await stream
+        self.assertIn(": ping", body)
+        self.assertIn('id: 4\nevent: task.deleted\ndata: {"id": 4}', body)
+        self.assertNotIn('"id": 3', body)
+
+    @override_settings(TMAPP_EVENTS_QUEUE_SIZE=1)
+    async def test_stream_backpressure(self):
+        self.broker = events.get_broker()
+        self.broker.emit([("task.deleted", {"id": i}) for i in range(3)])
+        status, body = await self.read_stream([(b"last-event-id", b"0")])
+        self.assertTrue(body.endswith("event: reset\ndata: {}\n\n"))
+        self.assertNotIn("task.deleted", body)
+        self.assertEqual(
+            self.messages[-1],
+            {"type": "http.response.body", "body": b"", "more_body": False},
+        )
+
+    async def test_stream_access(self):
+        self.cookie = b""
+        status, body = await self.read_stream()
+        self.assertEqual(status, 403)
+        with override_settings(TMAPP_EVENTS_ENABLED=False):
+            status, body = await self.read_stream()
+        self.assertEqual(status, 404)
+
+
+class WorkflowTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="test", password="12test12", email="test@example.com"
+        )
+        self.client.login(username="test", password="12test12")
+        # Новый -> В работе -> (Проверка | Готово).
+        # Метка версии статусов меняется после коммита - без нее таблица
+        # переходов осталась бы от прошлого теста
+        with self.captureOnCommitCallbacks(execute=True):
+            self.new = Status.objects.create(name="Новый")
+            self.work = Status.objects.create(name="В работе", parent_status=self.new)
+            self.review = Status.objects.create(
+                name="Проверка", parent_status=self.work
+            )
+            self.done = Status.objects.create(name="Готово", parent_status=self.work)
+        self.tasks = []
+        for i in range(4):
+            task = Task(name=f"Задача {i}", content="Описание",
+                        status=self.new if i < 3 else self.work)
+            task.save()
+            self.tasks.append(task)
+
+    def test_transition_table(self):
+        table = workflow.get_workflow()
+        with self.assertNumQueries(0):
+            self.assertIs(workflow.get_workflow(), table)
+
+        self.assertEqual(table.resolve(None, "next"), self.new.id)
+        self.assertEqual(table.resolve(self.new.id, "next"), self.work.id)
+        self.assertEqual(table.resolve(self.work.id, "prev"), self.new.id)
+        self.assertEqual(
+            table.resolve(self.work.id, "next", self.done.id), self.done.id
+        )
+        self.assertTrue(table.can_move(self.done.id, self.work.id))
+        self.assertFalse(table.can_move(self.new.id, self.done.id))
+        for args, message in [
+            ((self.work.id, "next"), "Выберите следующий статус: Проверка, Готово."),
+            ((self.new.id, "next", self.done.id), "Переход в статус Готово не разрешен."),
+            ((self.done.id, "next"), "Следующего статуса нет."),
+            ((self.new.id, "prev"), "Предыдущего статуса нет."),
+        ]:
+            with self.assertRaisesMessage(workflow.TransitionError, message):
+                table.resolve(*args)
+
+        # Правка статусов сбрасывает таблицу
+        with self.captureOnCommitCallbacks(execute=True):
+            Status.objects.create(name="Архив", parent_status=self.done)
+        self.assertIsNot(workflow.get_workflow(), table)
+        self.assertEqual(len(workflow.get_workflow().next_options(self.done.id)), 1)
+
+    def test_task_detail(self):
+        task = self.tasks[3]
+        response = self.client.get(f"/task/{task.id}/")
+        self.assertContains(response, f'name="_next-status" value="{self.review.id}"')
+        self.assertEqual(
+            [option["id"] for option in response.context["next_statuses"]],
+            [self.review.id, self.done.id],
+        )
+
+        response = self.client.post(f"/task/{task.id}/", {"_next-status": ""})
+        self.assertContains(response, "Выберите следующий статус")
+        response = self.client.post(
+            f"/task/{task.id}/", {"_next-status": self.done.id}
+        )
+        task.refresh_from_db()
+        self.assertEqual(task.status, self.done)
+        self.client.post(f"/task/{task.id}/", {"_prev-status": ""})
+        task.refresh_from_db()
+        self.assertEqual(task.status, self.work)
+
+    def test_advance(self):
+        ids = [task.id for task in self.tasks[:3]]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/task/advance/", {"ids": ids, "direction": "next"},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["moved"],
+            [{"id": task_id, "status": self.work.id} for task_id in ids],
+        )
+        updates = [
+            query for query in queries.captured_queries
+            if query["sql"].startswith('UPDATE "tmapp_task"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            Task.history.filter(id__in=ids, history_type="~").count(), 3
+        )
+        self.assertEqual(
+            Task.history.filter(id=ids[0]).first().get_changes()[0].new, self.work.id
+        )
+
+        # Все задачи теперь в ветвлении: без выбора - ошибки
+        ids = [task.id for task in self.tasks]
+        response = self.client.post(
+            "/api/task/advance/?atomic=1",
+            {"ids": ids + [999], "direction": "next"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()["errors"]), 5)
+        self.assertEqual(Task.objects.filter(status=self.work).count(), 4)
+
+        response = self.client.post(
+            "/api/task/advance/",
+            {"ids": ids, "direction": "next", "status": self.review.id},
+            content_type="application/json",
+        )
+        self.assertEqual(len(response.json()["moved"]), 4)
+        self.assertEqual(Task.objects.filter(status=self.review).count(), 4)
+
+        response = self.client.post(
+            "/api/task/advance/", {"ids": ids, "direction": "up"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
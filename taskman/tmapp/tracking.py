@@ -0,0 +1,93 @@
+class TrackedFieldsMixin:
+    """
+    Отслеживание измененных полей модели.
+
+    При загрузке из базы запоминаем значения полей, поэтому
+    можно узнать, что поменялось (changed_fields, previous), не перечитывая
+    запись, и сохранить только измененные колонки.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _snapshot_fields(self, attnames=None):
+        """Запоминаем текущие значения загруженных полей"""
+        if attnames is None or getattr(self, "_loaded_values", None) is None:
+            self._loaded_values = {}
+        for field in self._meta.concrete_fields:
+            if attnames is not None and field.attname not in attnames:
+                continue
+            if field.attname in self.__dict__:
+                self._loaded_values[field.attname] = self.__dict__[field.attname]
+
+    @property
+    def is_tracked(self):
+        return getattr(self, "_loaded_values", None) is not None
+
+    def load_snapshot(self):
+        """Для объекта, созданного не из базы, берем значения из базы"""
+        values = (
+            type(self)._base_manager.filter(pk=self.pk)
+            .values(*[field.attname for field in self._meta.concrete_fields])
+            .get()
+        )
+        self._loaded_values = values
+
+    @property
+    def changed_fields(self):
+        """Имена полей, значения которых отличаются от загруженных"""
+        if not self.is_tracked:
+            return [field.name for field in self._meta.concrete_fields]
+        changed = []
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue
+            if field.attname not in self._loaded_values or (
+                self._loaded_values[field.attname] != self.__dict__[field.attname]
+            ):
+                changed.append(field.name)
+        return changed
+
+    def previous(self, field):
+        """Значение поля на момент загрузки (имя поля или attname)"""
+        attname = self._meta.get_field(field).attname
+        if not self.is_tracked:
+            return None
+        return self._loaded_values.get(attname)
+
+    def save(self, *args, **kwargs):
+        """
+        Для загруженного объекта обновляем только измененные колонки,
+        если ничего не менялось - запрос в базу не отправляем
+        """
+        if (
+            self.is_tracked
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not args
+        ):
+            kwargs["update_fields"] = self.changed_fields
+
+        result = super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self._snapshot_fields()
+        else:
+            self._snapshot_fields(
+                {self._meta.get_field(name).attname for name in update_fields}
+            )
+        return result
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None:
+            self._snapshot_fields()
+        else:
+            self._snapshot_fields(
+                {self._meta.get_field(name).attname for name in fields}
+            )
@@ -0,0 +1,189 @@
+"""
+Метки версий для условных запросов (ETag / Last-Modified).
+
+Для каждой модели хранится версия всей коллекции и версии отдельных
+объектов - время последнего изменения. Метки лежат в кеше
+settings.TMAPP_VERSION_CACHE и обновляются сигналами при сохранении
+и удалении (tmapp/signals.py), массовые операции обновляют их сами.
+Если метки в кеше нет, выдается новая - это дает лишний полный ответ,
+но никогда не устаревший 304.
+"""
+
+import hashlib
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import replicas
+
+
+def get_cache():
+    return caches[getattr(settings, "TMAPP_VERSION_CACHE", "default")]
+
+
+def version_key(model, pk=None):
+    key = f"tmapp:version:{model._meta.label_lower}"
+    if pk is not None:
+        key += f":{pk}"
+    return key
+
+
+def bump(model, pks=()):
+    """
+    Отмечаем изменение коллекции и перечисленных объектов.
+    Метка меняется после коммита: иначе параллельный запрос мог бы
+    прочитать старые данные под новой меткой.
+    """
+    keys = [version_key(model)] + [version_key(model, pk) for pk in pks]
+
+    def set_versions():
+        now = time.time()
+        get_cache().set_many({key: now for key in keys}, timeout=None)
+
+    transaction.on_commit(set_versions)
+
+
+def get_versions(*keys):
+    """
+    Версии для пар (модель, pk) или моделей целиком,
+    отсутствующие в кеше метки создаются
+    """
+    keys = [
+        version_key(*key) if isinstance(key, tuple) else version_key(key)
+        for key in keys
+    ]
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+class Stamp:
+    """ETag и Last-Modified для набора версий и дополнительных параметров"""
+
+    def __init__(self, versions, *extra):
+        self.last_modified = max(versions) if versions else time.time()
+        digest = hashlib.md5(repr((versions, extra)).encode()).hexdigest()
+        self.etag = quote_etag(digest)
+
+    @classmethod
+    def for_request(cls, request, *keys, extra=()):
+        """
+        Метка ответа, который зависит от пользователя и строки запроса.
+        В метку входит и секрет CSRF: он меняется при входе, и страница
+        с формой из кеша браузера пришла бы со старым {% csrf_token %}
+        """
+        return cls._for_request(request, get_versions(*keys), extra)
+
+    @classmethod
+    def _for_request(cls, request, versions, extra):
+        stamp = cls(
+            versions,
+            request.user.pk,
+            request.get_full_path(),
+            request.META.get("CSRF_COOKIE"),
+            *extra,
+        )
+        stamp.request_versions = versions
+        stamp.request_extra = extra
+        return stamp
+
+    def after_render(self, request):
+        """
+        Метка для отданной страницы: если секрета CSRF еще не было,
+        {% csrf_token %} создал его при рендеринге, и ETag должен
+        учитывать уже новый секрет. Версии остаются прежними
+        """
+        return self._for_request(
+            request, self.request_versions, self.request_extra
+        )
+
+    def apply(self, response):
+        """Заголовки, по которым клиент пришлет условный запрос"""
+        response["ETag"] = self.etag
+        # Last-Modified - в целых секундах. Пока секунда версии не
+        # закончилась, отдаем время с округлением вниз: по нему 304 не будет,
+        # а изменение в ту же секунду иначе дало бы устаревший 304
+        last_modified = math.ceil(self.last_modified)
+        if last_modified > time.time():
+            last_modified = math.floor(self.last_modified)
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def not_modified(self, request):
+        """Ответ 304, если у клиента актуальная версия, иначе None"""
+        return get_conditional_response(
+            request, etag=self.etag, last_modified=math.ceil(self.last_modified)
+        )
+
+
+def conditional(get_keys, get_extra=None):
+    """
+    Декоратор вьюхи: на GET с актуальными If-None-Match/If-Modified-Since
+    отвечаем 304 без запросов к данным и рендеринга шаблона.
+    get_keys(request, *args, **kwargs) - модели и пары (модель, pk),
+    от которых зависит страница, get_extra(request, *args, **kwargs) -
+    прочие значения, например текущая дата.
+    """
+
+    def get_stamp(request, *args, **kwargs):
+        stamp = Stamp.for_request(
+            request,
+            *get_keys(request, *args, **kwargs),
+            extra=get_extra(request, *args, **kwargs) if get_extra else (),
+        )
+        if replicas.may_be_stale(stamp.last_modified):
+            # Изменение могло еще не дойти до реплики, и устаревшая
+            # страница получила бы новый ETag
+            replicas.use_primary()
+        return stamp
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            # Асинхронная вьюха: кеш меток и request.user - синхронные
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+
+                stamp = await sync_to_async(get_stamp)(request, *args, **kwargs)
+                response = stamp.not_modified(request)
+                if response is not None:
+                    return response
+
+                response = await view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    stamp.after_render(request).apply(response)
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+
+            stamp = get_stamp(request, *args, **kwargs)
+            response = stamp.not_modified(request)
+            if response is not None:
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                stamp.after_render(request).apply(response)
+            return response
+
+        return wrapper
+
+    return decorator
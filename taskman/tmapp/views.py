@@ -1,18 +1,33 @@
 import re
 
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
-from rest_framework import mixins, viewsets
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
 from tmapp.models import Project, Sprint, Status, Task
 
+from . import analytics, bulk, export, fragments, kanban, workflow
+from .choices import CHOICE_SOURCES
+from .filters import (TASK_ORDERING_FIELDS, TaskFilterBackend, filter_tasks,
+                      get_task_filters)
 from .forms import (EditSprintForm, NewSprintForm, ProjectForm, SignupForm,
                     StatusForm, TaskForm)
+from .pagination import ApiCursorPagination, keyset_paginate_tasks
+from .search import search_tasks
+from .versions import Stamp, conditional
 from .serializers import (ProjectSerializer, SprintSerializer,
-                          StatusSerializer, TaskSerializer)
+                          StatusSerializer, TaskSerializer,
+                          get_requested_fields)
 
 
 # Задачи
@@ -57,24 +72,58 @@ def task_edit(request, id):
 
 
 @login_required
+@conditional(lambda request, id: [
+    (Task, id), Status, Project, Sprint, get_user_model()
+])
 def task_detail(request, id):
 
     task = get_object_or_404(Task, id=id)
 
+    # Кнопки следующего статуса передают выбранный статус (ветвление)
+    transition_error = None
+    direction = None
     if "_next-status" in request.POST:
-        next_status = Status.objects.filter(parent_status=task.status).first()
-        if next_status:
-            task.status = next_status
-            task.save()
+        direction = workflow.NEXT
+        choice = request.POST["_next-status"]
+    elif "_prev-status" in request.POST:
+        direction, choice = workflow.PREVIOUS, None
+    if direction:
+        try:
+            workflow.move_task(
+                task, direction, int(choice) if choice and choice.isdigit() else None
+            )
+        except workflow.TransitionError as error:
+            transition_error = str(error)
+
+    return render(request, 'taskdetail.html', {
+        'task': task,
+        'tasks_history': task_detail_history(task_history_queryset(id)),
+        **task_transitions(task),
+        'transition_error': transition_error,
+    })
+
+
+def task_transitions(task):
+    """Кнопки переходов на странице задачи - по таблице переходов"""
+    table = workflow.get_workflow()
+    return {
+        'next_statuses': [
+            {'id': status_id, 'name': table.names[status_id]}
+            for status_id in table.next_options(task.status_id)
+        ],
+        'has_previous_status': table.previous.get(task.status_id) is not None,
+    }
 
-    if "_prev-status" in request.POST:
-        if task.status.parent_status:
-            task.status = task.status.parent_status
-            task.save()
 
-    # Отображение истории задачи
-    # из стороннего пакета django simple history
-    tasks_history_original = Task.history.filter(id=id)
+def task_history_queryset(id):
+    # изменения посчитаны при записи истории (поле changes)
+    return Task.history.filter(id=id).only(
+        'history_date', 'history_type', 'changes'
+    )
+
+
+def task_detail_history(tasks_history_original):
+    """Отображение истории задачи"""
     tasks_history = []
     tasks_history_type = {
         '+': 'Задача создана',
@@ -82,23 +131,18 @@ def task_detail(request, id):
         '~': 'Задача изменена',
     }
     for task_h_o in tasks_history_original:
-        if task_h_o.prev_record:
-            delta = task_h_o.diff_against(task_h_o.prev_record)
-            change_list = ''
-            for change in delta.changes:
-                change_list += task_detail_history_to_text(change)
-            if not delta.changes:
-                change_list = 'Сохранение без изменений.'
+        change_list = ' '
+        if task_h_o.history_type == '~':
+            change_list = ''.join(
+                task_detail_history_to_text(change)
+                for change in task_h_o.get_changes()
+            ) or 'Сохранение без изменений.'
         tasks_history.append({
             'history_date': task_h_o.history_date,
             'type': tasks_history_type[task_h_o.history_type],
-            'change_list': change_list if task_h_o.history_type == '~' else ' '
+            'change_list': change_list,
         })
-
-    return render(request, 'taskdetail.html', {
-        'task': task,
-        'tasks_history': tasks_history,
-    })
+    return tasks_history
 
 
 def task_detail_history_to_text(change):
@@ -123,7 +167,7 @@ def task_detail_history_to_text(change):
             f"Задача добавлена в проект №{change.new}. "
     elif change.field == 'sprint' and not change.new:
         change_list +=\
-            f"Задача удалена из спринта №{change.new}. "
+            f"Задача удалена из спринта №{change.old}. "
     elif change.field == 'sprint' and change.new:
         change_list +=\
             f"Задача добавлена в спринт №{change.new}. "
@@ -138,12 +182,60 @@ def task_detail_history_to_text(change):
 
 
 @login_required
+@conditional(lambda request: [Task, Status, get_user_model()])
 def task_list(request):
 
-    tasks = Task.objects.all().order_by('is_complete', '-id')
+    tasks = filter_tasks(
+        Task.objects.select_related('status', 'executor'), request.GET
+    )
 
-    return render(request, 'tasklist.html', {
-        'tasks': tasks,
+    page = keyset_paginate_tasks(tasks, request.GET.get('after'))
+
+    return render(request, 'tasklist.html', task_list_context(request, page))
+
+
+def task_list_context(request, page):
+    # Ссылки на страницы сохраняют фильтры из строки запроса
+    next_query = None
+    if page.has_next:
+        next_query = request.GET.copy()
+        next_query['after'] = page.next_cursor
+        next_query = next_query.urlencode()
+
+    first_query = None
+    if 'after' in request.GET:
+        first_query = request.GET.copy()
+        del first_query['after']
+        first_query = first_query.urlencode()
+
+    return {
+        'tasks': page,
+        'cards': fragments.prefetch('task_card', page),
+        'next_query': next_query,
+        'first_query': first_query,
+        'filters': get_task_filters(request.GET),
+    }
+
+
+def get_page_number(value):
+    """Номер страницы из строки запроса, некорректный - первая страница"""
+    return int(value) if value and value.isdigit() and int(value) > 0 else 1
+
+
+@login_required
+@conditional(lambda request: [Task, Status, get_user_model()])
+def task_search(request):
+
+    query = request.GET.get('q', '').strip()
+    page = search_tasks(
+        query,
+        get_page_number(request.GET.get('page')),
+        queryset=Task.objects.select_related('status', 'executor'),
+    )
+
+    return render(request, 'tasksearch.html', {
+        'query': query,
+        'tasks': page,
     })
 
 
@@ -158,22 +250,32 @@ def task_delete(request, id):
 
 # Проеткы
 @login_required
+@conditional(
+    lambda request: [Project, Sprint, Task],
+    lambda request: [timezone.localdate()],
+)
 def project_list(request):
 
-    projects = Project.objects.all()
-
-    cur_date = timezone.localdate()
-
-    sprints = Sprint.objects.filter(
-            Q(date_end__gte=cur_date) & Q(date_start__lte=cur_date)
-        ).filter(tasks__is_complete=False).distinct()
+    # Счетчики задач и спринтов считаются в том же запросе
+    projects = Project.objects.with_counts()
 
     return render(request, 'projectlist.html', {
         'projects': projects,
-        'sprints': sprints,
+        'cards': fragments.prefetch('project_card', projects),
+        'sprints': active_sprints(),
     })
 
 
+def active_sprints():
+    """Идущие сейчас спринты, в которых есть незавершенные задачи"""
+    cur_date = timezone.localdate()
+
+    open_tasks = Task.objects.filter(sprint=OuterRef('pk'), is_complete=False)
+    return Sprint.objects.filter(
+            Q(date_end__gte=cur_date) & Q(date_start__lte=cur_date)
+        ).filter(Exists(open_tasks))
+
+
 @login_required
 def project_edit(request, id):
 
@@ -201,6 +303,10 @@ def project_delete(request, id):
 
 
 @login_required
+@conditional(
+    lambda request, id: [(Project, id), Sprint, Task, get_user_model()],
+    lambda request, id: [timezone.localdate()],
+)
 def project_detail(request, id):
 
     project = get_object_or_404(Project, id=id)
@@ -290,13 +396,30 @@ def sprint_edit(request, id):
             return render(request, 'sprintedit.html', {'form': form, 'id': id})
 
 
+@login_required
+def sprint_analytics(request, id):
+
+    sprint = get_object_or_404(Sprint, id=id)
+
+    days = analytics.burndown(sprint)
+    max_total = max((day['total'] for day in days), default=0)
+    for day in days:
+        day['percent'] = round(100 * day['open'] / max_total) if max_total else 0
+
+    return render(request, 'sprintanalytics.html', {
+        'sprint': sprint,
+        'burndown': days,
+        'velocity': analytics.velocity(sprint.project_id),
+    })
+
+
 # Статусы
 @login_required
+@conditional(lambda request: [Status])
 def status_list(request):
 
-    unsorted_statuses = Status.objects.all()
-
-    statuses = sorted(unsorted_statuses, key=lambda t: t.get_parent_id())
+    # Порядок дерева дает сортировка по материализованному пути
+    statuses = Status.objects.select_related('parent_status').order_by('path')
 
     return render(request, 'statuslist.html', {
         'statuses': statuses,
@@ -350,6 +473,111 @@ def status_delete(request, id):
     return render(request, "statusdelete.html", {'status': status})
 
 
+# Выгрузка
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+@login_required
+def task_export(request, kind, fmt):
+    """
+    /export/tasks.csv, /export/history.ndjson и т.п. - потоком,
+    с фильтрами списка задач; сжимается gzip, если клиент его принимает
+    """
+    if kind not in export.EXPORTS or fmt not in export.FORMATS:
+        raise Http404
+
+    content = export.export(kind, fmt, request.GET)
+    response = StreamingHttpResponse(content_type=EXPORT_CONTENT_TYPES[fmt])
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        content = compress_sequence(content)
+        response['Content-Encoding'] = 'gzip'
+    response.streaming_content = content
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+# Канбан-доска
+@login_required
+@conditional(lambda request: [Task, Status, get_user_model()])
+def kanban_board(request):
+
+    tasks = filter_tasks(Task.objects.all(), request.GET)
+
+    return render(request, 'kanban.html', {
+        'columns': kanban.get_board(tasks),
+        'filters': get_task_filters(request.GET),
+    })
+
+
+@login_required
+def task_move(request, id):
+    """
+    Перевод задачи в другой статус с доски: status=<id> (пустой - без
+    статуса) или шаг direction=next/prev по таблице переходов (при
+    ветвлении status - выбранный следующий). На запрос из скрипта
+    (Accept: application/json) отвечаем JSON, на форму - возвратом на доску.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': 'Ожидался POST.'}, status=405)
+
+    task = get_object_or_404(Task.objects.select_related('status'), id=id)
+
+    direction = request.POST.get('direction')
+    status_id = request.POST.get('status', '')
+    if direction:
+        # Шаг по таблице переходов, status - выбор при ветвлении
+        try:
+            workflow.move_task(
+                task, direction, int(status_id) if status_id.isdigit() else None
+            )
+        except workflow.TransitionError as error:
+            return JsonResponse({'detail': str(error)}, status=400)
+        moved = True
+    elif status_id.isdigit():
+        new_status = Status.objects.filter(id=int(status_id)).first()
+        if new_status is None:
+            return JsonResponse({'detail': 'Статус не найден.'}, status=400)
+        moved = kanban.move_task(task, new_status)
+    elif 'status' in request.POST:
+        moved = kanban.move_task(task, None)
+    else:
+        return JsonResponse(
+            {'detail': 'Укажите status или direction.'}, status=400
+        )
+
+    if 'application/json' not in request.headers.get('Accept', ''):
+        return redirect('kanban')
+    return JsonResponse({
+        'id': task.id,
+        'status': task.status_id,
+        'status_name': task.status.name if task.status else None,
+        'moved': moved,
+    })
+
+
+# Варианты выбора для больших списков в формах (choices.ChoiceSearchInput)
+@login_required
+def choice_search(request, source):
+    choice_source = CHOICE_SOURCES.get(source)
+    if choice_source is None:
+        raise Http404
+
+    label_field = choice_source.label_field
+    query = request.GET.get('q', '').strip()
+    queryset = choice_source.model.objects.order_by(label_field)
+    if query:
+        queryset = queryset.filter(**{f'{label_field}__icontains': query})
+
+    return JsonResponse({'results': [
+        {'id': pk, 'label': label}
+        for pk, label in queryset.values_list('pk', label_field)[:20]
+    ]})
+
+
 # Регистрация
 def signup(request):
     if request.method == 'POST':
@@ -368,7 +596,55 @@ def signup(request):
 
 
 # DRF
+class SparseFieldsViewMixin:
+    """С ?fields= из базы читаем только запрошенные колонки"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = get_requested_fields(self.request)
+        if requested:
+            model_fields = {
+                field.name for field in queryset.model._meta.concrete_fields
+            }
+            queryset = queryset.only(*(requested & model_fields))
+        return queryset
+
+
+class ConditionalViewMixin:
+    """
+    ETag и Last-Modified для list и retrieve: если данные не менялись,
+    отвечаем 304 без запросов к таблице и сериализации.
+    list_version_keys - другие модели, от которых зависит список,
+    например через фильтры
+    """
+
+    list_version_keys = ()
+
+    def get_stamp(self, request, *keys):
+        return Stamp.for_request(request, *keys)
+
+    def list(self, request, *args, **kwargs):
+        stamp = self.get_stamp(
+            request, self.queryset.model, *self.list_version_keys
+        )
+        return (
+            stamp.not_modified(request)
+            or stamp.apply(super().list(request, *args, **kwargs))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        model = self.queryset.model
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        stamp = self.get_stamp(request, (model, pk))
+        return (
+            stamp.not_modified(request)
+            or stamp.apply(super().retrieve(request, *args, **kwargs))
+        )
+
+
 class TaskDRFViewSet(
+        ConditionalViewMixin,
+        SparseFieldsViewMixin,
         mixins.ListModelMixin,
         mixins.CreateModelMixin,
         mixins.RetrieveModelMixin,
@@ -378,9 +654,134 @@ class TaskDRFViewSet(
     permission_classes = [IsAuthenticated]
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    # ?status=, ?status_tree=, ?executor=, ?is_complete=, ?created_after=...
+    # и ?ordering= по полям из TASK_ORDERING_FIELDS
+    filter_backends = [TaskFilterBackend, OrderingFilter]
+    ordering_fields = TASK_ORDERING_FIELDS
+    # ?status_tree= отбирает задачи по Status.path
+    list_version_keys = [Status]
+    ordering = ['id']
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """
+        Массовые операции, тело запроса - список:
+        POST - задачи для создания, PATCH - изменения с id задачи,
+        DELETE - id задач.
+        Ошибочные элементы попадают в errors, остальные сохраняются;
+        с ?atomic=1 любая ошибка отменяет всю пачку.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Ожидался список.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > bulk.get_max_items():
+            return Response(
+                {'detail': f'Не больше {bulk.get_max_items()} элементов.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        atomic = request.query_params.get('atomic') in ('1', 'true')
+        if request.method == 'POST':
+            tasks, errors = bulk.bulk_create_tasks(items, request.user, atomic)
+            data = {'created': TaskSerializer(tasks, many=True).data}
+            ok_status = status.HTTP_201_CREATED
+        elif request.method == 'PATCH':
+            tasks, errors = bulk.bulk_update_tasks(items, request.user, atomic)
+            data = {'updated': TaskSerializer(tasks, many=True).data}
+            ok_status = status.HTTP_200_OK
+        else:
+            ids, errors = bulk.bulk_delete_tasks(items, request.user, atomic)
+            data = {'deleted': ids}
+            ok_status = status.HTTP_200_OK
+
+        data['errors'] = errors
+        if errors and atomic:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=ok_status)
+
+    @action(detail=False, methods=['post'])
+    def advance(self, request):
+        """
+        Перевод пачки задач на шаг по таблице переходов:
+        {"ids": [...], "direction": "next" | "prev", "status": <id>},
+        status - выбранный следующий статус при ветвлении.
+        Ошибки и ?atomic=1 - как у bulk.
+        """
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list):
+            return Response(
+                {'detail': 'Ожидался список ids.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(ids) > bulk.get_max_items():
+            return Response(
+                {'detail': f'Не больше {bulk.get_max_items()} элементов.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        direction = request.data.get('direction')
+        if direction not in workflow.DIRECTIONS:
+            return Response(
+                {'detail': 'Направление перехода - next или prev.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        choice = request.data.get('status')
+        if choice is not None and not isinstance(choice, int):
+            return Response(
+                {'detail': 'status - id статуса.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        atomic = request.query_params.get('atomic') in ('1', 'true')
+        tasks, errors = workflow.advance_tasks(
+            ids, direction, choice, request.user, atomic
+        )
+        data = {
+            'moved': [{'id': task.id, 'status': task.status_id} for task in tasks],
+            'errors': errors,
+        }
+        if errors and atomic:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Полнотекстовый поиск: ?q=, страницы ?page= и ?page_size=,
+        задачи от более релевантных к менее
+        """
+        page_size = request.query_params.get('page_size')
+        page_size = (
+            get_page_number(page_size) if page_size else self.paginator.page_size
+        )
+        page = search_tasks(
+            request.query_params.get('q'),
+            get_page_number(request.query_params.get('page')),
+            min(page_size, ApiCursorPagination.max_page_size),
+            queryset=TaskFilterBackend().filter_queryset(
+                request, self.get_queryset(), self
+            ),
+        )
+
+        def page_url(number):
+            query = request.query_params.copy()
+            query['page'] = number
+            return request.build_absolute_uri(
+                f'{request.path}?{query.urlencode()}'
+            )
+
+        return Response({
+            'next': page_url(page.number + 1) if page.has_next else None,
+            'previous': page_url(page.number - 1) if page.has_previous else None,
+            'results': self.get_serializer(page.object_list, many=True).data,
+        })
 
 
 class ProjectDRFViewSet(
+        ConditionalViewMixin,
+        SparseFieldsViewMixin,
         mixins.ListModelMixin,
         mixins.CreateModelMixin,
         mixins.RetrieveModelMixin,
@@ -393,6 +794,8 @@ class ProjectDRFViewSet(
 
 
 class SprintDRFViewSet(
+        ConditionalViewMixin,
+        SparseFieldsViewMixin,
         mixins.ListModelMixin,
         mixins.CreateModelMixin,
         mixins.RetrieveModelMixin,
@@ -403,8 +806,19 @@ class SprintDRFViewSet(
     queryset = Sprint.objects.all()
     serializer_class = SprintSerializer
 
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """Burndown спринта и скорость по всем спринтам его проекта"""
+        sprint = self.get_object()
+        return Response({
+            'burndown': analytics.burndown(sprint),
+            'velocity': analytics.velocity(sprint.project_id),
+        })
+
 
 class StatusDRFViewSet(
+        ConditionalViewMixin,
+        SparseFieldsViewMixin,
         mixins.ListModelMixin,
         mixins.CreateModelMixin,
         mixins.RetrieveModelMixin,
@@ -0,0 +1,172 @@
+"""
+Переходы задач между статусами.
+
+Справочник статусов - дерево: следующие статусы - вложенные в текущий,
+предыдущий - родительский, задача без статуса переходит в корневые.
+Дерево один раз читается из базы и компилируется в таблицу переходов
+(Workflow), которая хранится в памяти процесса под меткой версии модели
+Status (tmapp/versions.py): правка статуса в любом воркере меняет метку,
+и таблица пересобирается при следующем обращении.
+
+Если следующих статусов несколько (ветвление), нужно явно выбрать
+один - раньше молча брался первый по id. Недопустимый переход
+(TransitionError) не выполняется.
+"""
+
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+from . import bulk, events, search, versions
+from .models import Notification, Status, Task
+
+
+class TransitionError(Exception):
+    """Переход в статус невозможен, текст - для пользователя"""
+
+
+NEXT = "next"
+PREVIOUS = "prev"
+DIRECTIONS = (NEXT, PREVIOUS)
+
+
+class Workflow:
+    """Таблица переходов, построенная по справочнику статусов"""
+
+    def __init__(self, statuses):
+        """statuses - тройки (id, название, id родителя)"""
+        self.names = {}
+        self.previous = {}
+        self.next = defaultdict(list)
+        for status_id, name, parent_id in sorted(statuses):
+            self.names[status_id] = name
+            self.previous[status_id] = parent_id
+            self.next[parent_id].append(status_id)
+        self.next = {
+            status_id: tuple(children) for status_id, children in self.next.items()
+        }
+
+    @classmethod
+    def load(cls):
+        return cls(Status.objects.values_list("id", "name", "parent_status_id"))
+
+    def next_options(self, status_id):
+        """Статусы, в которые можно перейти дальше"""
+        return self.next.get(status_id, ())
+
+    def can_move(self, status_id, target_id):
+        return (
+            target_id in self.next_options(status_id)
+            or (status_id is not None and target_id == self.previous.get(status_id))
+        )
+
+    def resolve(self, status_id, direction, choice=None):
+        """
+        Статус, в который перейдет задача из status_id.
+        choice - выбранный следующий статус, обязателен при ветвлении
+        """
+        if direction == PREVIOUS:
+            target = self.previous.get(status_id)
+            if status_id is None or target is None:
+                raise TransitionError("Предыдущего статуса нет.")
+            return target
+
+        if direction != NEXT:
+            raise TransitionError("Направление перехода - next или prev.")
+        options = self.next_options(status_id)
+        if not options:
+            raise TransitionError("Следующего статуса нет.")
+        if choice is None:
+            if len(options) > 1:
+                names = ", ".join(self.names[option] for option in options)
+                raise TransitionError(f"Выберите следующий статус: {names}.")
+            return options[0]
+        if choice not in options:
+            raise TransitionError(
+                f"Переход в статус {self.names.get(choice, choice)} не разрешен."
+            )
+        return choice
+
+
+compiled = None
+compiled_lock = threading.Lock()
+
+
+def get_workflow():
+    """Таблица переходов для текущей версии справочника статусов"""
+    global compiled
+    (version,) = versions.get_versions(Status)
+    current = compiled
+    if current is not None and current[0] == version:
+        return current[1]
+    with compiled_lock:
+        if compiled is None or compiled[0] != version:
+            compiled = (version, Workflow.load())
+        return compiled[1]
+
+
+def advance_tasks(ids, direction, choice=None, user=None, atomic=False):
+    """
+    Переводим пачку задач на шаг вперед или назад.
+    Один UPDATE на каждый целевой статус, история - одним запросом.
+    Возвращает (переведенные задачи, ошибки).
+    """
+    workflow = get_workflow()
+    errors = []
+    valid_ids = []
+    for index, task_id in enumerate(ids):
+        if isinstance(task_id, int):
+            valid_ids.append(task_id)
+        else:
+            errors.append(bulk.item_error(index, "id", "Ожидался id задачи."))
+
+    with transaction.atomic():
+        # Задачи блокируем до UPDATE: параллельный переход не должен
+        # смениться переходом, проверенным по старому статусу
+        tasks = Task.objects.select_for_update().in_bulk(valid_ids)
+        targets = defaultdict(list)
+        for index, task_id in enumerate(ids):
+            if not isinstance(task_id, int):
+                continue
+            task = tasks.get(task_id)
+            if task is None:
+                errors.append(bulk.item_error(index, "id", "Задача не найдена."))
+                continue
+            try:
+                target = workflow.resolve(task.status_id, direction, choice)
+            except TransitionError as error:
+                errors.append(bulk.item_error(index, "status", str(error)))
+                continue
+            targets[target].append(task)
+        if errors and atomic:
+            return [], errors
+
+        moved = [task for group in targets.values() for task in group]
+        if not moved:
+            return [], errors
+
+        for target, group in targets.items():
+            Task.objects.filter(id__in=[task.id for task in group]).update(
+                status_id=target
+            )
+            for task in group:
+                task.status_id = target
+        bulk.bulk_task_history(moved, "~", user)
+        if search.history_enabled():
+            search.index_tasks([task.pk for task in moved])
+        Notification.enqueue_status_changes(moved)
+        events.publish([events.task_change(task) for task in moved])
+    versions.bump(Task, [task.pk for task in moved])
+
+    for task in moved:
+        task._snapshot_fields()
+    return sorted(moved, key=lambda task: task.pk), errors
+
+
+def move_task(task, direction, choice=None):
+    """Один шаг для одной задачи (страница задачи, доска)"""
+    target = get_workflow().resolve(task.status_id, direction, choice)
+    task.status_id = target
+    task.save()
+    return target